@@ -0,0 +1,110 @@
+"""Batch Agent — submits many tasks in one request with dedupe and bounded fan-out."""
+
+import logging
+
+import restate
+from restate import Context, Service, TerminalError
+
+from src.infra.fingerprint import task_fingerprint
+
+batch = Service("batch")
+
+log = logging.getLogger(__name__)
+
+
+@batch.handler()
+async def handle_batch(ctx: Context, req: dict) -> dict:
+    """Run a list of tasks through manager.handle_task and aggregate the results.
+
+    req: {"tasks": [str | {"task": str, "template": str (optional),
+                           "deadline_s": float (optional)}],
+          "concurrency": int (optional, default BATCH_CONCURRENCY),
+          "deadline_s": float (optional per-task budget, default TASK_DEADLINE_S),
+          "prefix": str (optional project key prefix, default "batch")}
+    returns: {"total", "unique", "succeeded", "failed",
+              "results": [{"index", "task", "project_id", "status", "retries",
+                           "code", "duplicate_of", "error"}]}  (in input order)
+
+    Tasks with the same normalized text and template run once; their
+    duplicates share the result and point at the first occurrence.
+    """
+    from src.agents.manager import handle_task
+    from src.config import cfg
+
+    items = [t if isinstance(t, dict) else {"task": t} for t in req.get("tasks", [])]
+    concurrency = max(1, int(req.get("concurrency") or cfg.batch_concurrency))
+    prefix = req.get("prefix") or "batch"
+    # Deterministic across replays; keeps project keys unique across batches
+    batch_id = str(ctx.uuid())[:8]
+
+    unique, duplicate_of = _dedupe(items)
+
+    log.info(
+        "batch.handle_batch id=%s total=%d unique=%d concurrency=%d",
+        batch_id, len(items), len(unique), concurrency,
+    )
+
+    outcomes: dict[int, dict] = {}
+    pending: dict = {}  # future → task index
+    queue = list(unique)
+    while queue or pending:
+        while queue and len(pending) < concurrency:
+            i = queue.pop(0)
+            arg = {"task": items[i]["task"], "template": items[i].get("template")}
+            # Each task's budget starts when its handle_task does, not at submission
+            deadline_s = items[i].get("deadline_s", req.get("deadline_s"))
+            if deadline_s is not None:
+                arg["deadline_s"] = deadline_s
+            future = ctx.object_call(handle_task, key=f"{prefix}_{batch_id}_{i}", arg=arg)
+            pending[future] = i
+        done, _ = await restate.wait_completed(*pending)
+        for future in done:
+            i = pending.pop(future)
+            try:
+                outcomes[i] = await future
+            except TerminalError as e:
+                log.warning("batch.handle_batch task %d failed: %s", i, e.message)
+                outcomes[i] = {"status": "error", "error": e.message}
+
+    results = []
+    for i, item in enumerate(items):
+        source = duplicate_of.get(i, i)
+        outcome = outcomes[source]
+        results.append({
+            "index": i,
+            "task": item["task"],
+            "project_id": f"{prefix}_{batch_id}_{source}",
+            "status": outcome.get("status"),
+            "retries": outcome.get("retries", 0),
+            "code": outcome.get("code", ""),
+            "duplicate_of": duplicate_of.get(i),
+            "error": outcome.get("error"),
+        })
+
+    succeeded = sum(1 for r in results if r["status"] == "success")
+    log.info(
+        "batch.handle_batch DONE id=%s succeeded=%d/%d", batch_id, succeeded, len(results),
+    )
+    return {
+        "total": len(items),
+        "unique": len(unique),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+def _dedupe(items: list[dict]) -> tuple[list[int], dict[int, int]]:
+    """Split task items into first occurrences and duplicates.
+
+    Returns (indices to run, {duplicate index: index of its first occurrence}).
+    """
+    first_index: dict[str, int] = {}
+    duplicate_of: dict[int, int] = {}
+    for i, item in enumerate(items):
+        fp = task_fingerprint(item["task"], item.get("template"))
+        if fp in first_index:
+            duplicate_of[i] = first_index[fp]
+        else:
+            first_index[fp] = i
+    return sorted(first_index.values()), duplicate_of
@@ -3,9 +3,11 @@
 import logging
 import re
 
-from restate import ObjectContext, VirtualObject
+from restate import Context, Service, TerminalError
 
-coder = VirtualObject("coder")
+from src.infra.events import emit
+
+coder = Service("coder")
 
 log = logging.getLogger(__name__)
 
@@ -16,58 +18,304 @@ Always wrap your code in a single ```python ... ``` block.
 The code must be self-contained and runnable via `python main.py`.
 Include a simple demonstration / test at the bottom (e.g. print results) so the output can be verified."""
 
+_EDIT_SYSTEM_PROMPT = """\
+You are a Python code editor. You receive a task, the current program (main.py) and a change \
+request or error report. Change only what is needed, as one or more edit blocks:
+
+<<<<<<< SEARCH
+exact lines copied from the current program
+=======
+replacement lines
+>>>>>>> REPLACE
+
+Each SEARCH section must match the current program exactly, including indentation, and be \
+just long enough to be unique. An empty SEARCH section appends to the end of the file. \
+Return only edit blocks, no full program."""
+
+_FIX_SYSTEM_PROMPT = """\
+You are a Python debugger. You receive a task, a program (main.py) that failed and its \
+execution output. Start with a line beginning `DIAGNOSIS:` that explains the root cause in \
+a few sentences, then return the complete corrected program in a single ```python ... ``` \
+block. The program must stay self-contained, runnable via `python main.py`, and keep its \
+demonstration at the bottom."""
+
+_EDIT_BLOCK = re.compile(
+    r"<<<<<<< SEARCH\n(.*?)^=======\n(.*?)^>>>>>>> REPLACE", re.DOTALL | re.MULTILINE,
+)
+
 
 @coder.handler()
-async def generate_code(ctx: ObjectContext, req: dict) -> dict:
+async def generate_code(ctx: Context, req: dict) -> dict:
     """Generate code for a task and write it to the sandbox.
 
-    req: {"task": str, "reference": str, "error_feedback": str (optional)}
-    returns: {"filename": "main.py", "code": str}
+    req: {"project_id": str, "task": str, "reference": str, "error_feedback": str (optional),
+          "existing_code": str (optional), "failed_code": str (optional),
+          "test_output": str (optional), "test_analysis": str (optional),
+          "deadline": float (optional, epoch seconds)}
+    returns: {"filename": "main.py", "code": str, "edited": bool, "diagnosis": str
+              (only for a merged fix), "preflight_error": str (only if the code still
+              does not compile after repair)}
+
+    With existing_code the LLM answers with SEARCH/REPLACE edits to that
+    program instead of rewriting it; if the edits do not apply, one more call
+    asks for the full program. With test_output (MERGED_FIX) one call both
+    diagnoses the failed run and returns the corrected program, replacing
+    the manager's separate error analysis. The deadline caps every LLM call
+    and stops pre-flight repair rounds once it has passed; if it passes
+    before any code is generated, nothing is written and the result is the
+    starting program (existing_code / failed_code) with deadline_exceeded.
     """
-    project_id = ctx.key()
+    project_id = req["project_id"]
     task = req["task"]
     reference = req.get("reference", "")
     error_feedback = req.get("error_feedback", "")
+    existing_code = req.get("existing_code", "")
+    test_output = req.get("test_output", "")
+    deadline = req.get("deadline")
+    if test_output and existing_code:
+        # Edits are already one call: the raw run output stands in for the analysis
+        error_feedback = _failure_report(test_output, req.get("test_analysis", ""))
 
     log.info("coder.generate_code project=%s task=%s", project_id, task[:80])
 
     # Build the user prompt
-    user_parts = [f"Task: {task}"]
+    from src.config import cfg
+    from src.infra.compaction import truncate_middle
+    from src.infra.llm import in_llm_pool
+
+    budget = cfg.llm_prompt_token_budget
+    # Task + reference are identical across attempts: send them as the cached context
+    context_parts = [f"Task: {task}"]
     if reference:
-        user_parts.append(f"\nReference code/knowledge:\n{reference}")
+        reference = truncate_middle(reference, budget // 4)
+        context_parts.append(f"\nReference code/knowledge:\n{reference}")
+    context = "\n".join(context_parts)
     if error_feedback:
-        user_parts.append(
-            f"\nPrevious attempt failed with the following error. "
-            f"Fix the code accordingly:\n{error_feedback}"
+        user_prompt = (
+            f"Previous attempt failed with the following error. "
+            f"Fix the code accordingly:\n{truncate_middle(error_feedback, budget // 4)}"
+        )
+    else:
+        user_prompt = "Generate the code for the task above."
+    if existing_code:
+        # Edits must quote the program verbatim, so it is never truncated
+        edit_prompt = (
+            f"Current program (main.py):\n```python\n{existing_code}\n```\n\n"
+            + (user_prompt if error_feedback else "Change the program to fulfil the task above.")
         )
-    user_prompt = "\n".join(user_parts)
 
-    # LLM call must be a side effect wrapped in ctx.run
-    async def _call_llm():
-        from src.config import cfg
+    # LLM call must be a side effect wrapped in ctx.run. It is a plain function
+    # run through in_llm_pool, so rate-limit waits and retries block neither
+    # the event loop nor the default executor.
+    def _call_llm(prompt: str, system: str = _SYSTEM_PROMPT):
+        from src.infra.deadline import run_timeout
         from src.infra.llm import LLMClient
 
-        client = LLMClient(cfg.llm_base_url, cfg.llm_api_key, cfg.llm_model_name)
-        return client.chat(_SYSTEM_PROMPT, user_prompt)
+        timeout = run_timeout(None, deadline)
+        client = LLMClient.for_phase("code")
+        return client.chat(system, prompt, context=context, timeout=timeout)
+
+    async def _generate() -> tuple[str, bool, str]:
+        """(code, edited, diagnosis) from the edit, fix or plain generation call."""
+        code = None
+        diagnosis = ""
+        if existing_code:
+            response = await ctx.run(
+                "llm_edit_code",
+                in_llm_pool(lambda: _call_llm(edit_prompt, _EDIT_SYSTEM_PROMPT)),
+            )
+            code, edit_problems = _apply_edits(existing_code, response)
+            if code is None:
+                log.info("coder.generate_code edits did not apply: %s", "; ".join(edit_problems))
+                emit(ctx, project_id, "edit_failed", "coder", problems=edit_problems)
+        elif test_output:
+            fix_prompt = _fix_prompt(
+                req.get("failed_code", ""), test_output, req.get("test_analysis", ""), budget,
+            )
+            response = await ctx.run(
+                "llm_fix_code",
+                in_llm_pool(lambda: _call_llm(fix_prompt, _FIX_SYSTEM_PROMPT)),
+            )
+            log.info("coder.generate_code llm fix response length=%d", len(response))
+            diagnosis, code = _split_fix(response)
+        edited = code is not None
+        if code is None:
+            response = await ctx.run(
+                "llm_generate_code", in_llm_pool(lambda: _call_llm(user_prompt)),
+            )
+            log.info("coder.generate_code llm response length=%d", len(response))
+            # Extract code from markdown block
+            code = _extract_code(response)
+        return code, edited, diagnosis
 
-    response = await ctx.run("llm_generate_code", _call_llm)
-    log.info("coder.generate_code llm response length=%d", len(response))
+    from src.infra.deadline import expired, is_deadline_error
 
-    # Extract code from markdown block
-    code = _extract_code(response)
-    log.debug("coder.generate_code extracted code length=%d", len(code))
+    filename = "main.py"
+    try:
+        code, edited, diagnosis = await _generate()
+    except TerminalError as e:
+        if not is_deadline_error(e):
+            raise
+        # Nothing new was written: hand back the program this call started from
+        log.info("coder.generate_code deadline reached before any code was generated")
+        return {
+            "filename": filename, "code": existing_code or req.get("failed_code", ""),
+            "edited": False, "deadline_exceeded": True,
+        }
+    log.debug("coder.generate_code extracted code length=%d edited=%s", len(code), edited)
+
+    # Pre-flight: compile errors are cheap and local, so fix those here before
+    # a sandbox run and two LLM verdicts. Undefined-name / stdlib-import
+    # findings may be false positives: they get one advisory repair round at
+    # most and never keep the program from running.
+    from src.infra.preflight import advisories, check
+
+    def _preflight():
+        return {"errors": check(code), "advisories": advisories(code)}
+
+    report = await ctx.run("preflight", _preflight)
+    advised = False
+    for round_ in range(1, cfg.coder_preflight_repairs + 1):
+        if not report["errors"] and (advised or not report["advisories"]):
+            break
+        if deadline and expired(deadline, await ctx.time()):
+            log.info("coder.generate_code deadline reached, skipping pre-flight repair")
+            break
+        log.info(
+            "coder.generate_code pre-flight round %d: errors=%s advisories=%s", round_,
+            "; ".join(report["errors"]), "; ".join(report["advisories"]),
+        )
+        emit(
+            ctx, project_id, "preflight_failed", "coder", round=round_,
+            problems=report["errors"], advisories=report["advisories"],
+        )
+        repair_prompt = _repair_prompt(code, report["errors"], budget, report["advisories"])
+        advised = True
+        try:
+            response = await ctx.run(
+                f"llm_repair_code_{round_}", in_llm_pool(lambda: _call_llm(repair_prompt)),
+            )
+        except TerminalError as e:
+            if not is_deadline_error(e):
+                raise
+            # Keep the unrepaired code; the manager reports it as a pre-flight failure
+            break
+        code = _extract_code(response)
+        report = await ctx.run(f"preflight_{round_}", _preflight)
+    problems = report["errors"]
 
     # Write code to sandbox
     from src.infra.sandbox import write_file
 
-    filename = "main.py"
     await ctx.service_call(
         write_file,
         arg={"project_id": project_id, "filename": filename, "content": code},
     )
     log.info("coder.generate_code wrote %s to sandbox project=%s", filename, project_id)
+    emit(ctx, project_id, "code_generated", "coder", filename=filename, code=code, edited=edited)
+
+    result = {"filename": filename, "code": code, "edited": edited}
+    if diagnosis:
+        result["diagnosis"] = diagnosis
+    if problems:
+        # Still does not compile after the repair rounds: the caller skips the sandbox run
+        result["preflight_error"] = "\n".join(problems)
+    return result
+
+
+def _repair_prompt(
+    code: str, problems: list[str], budget: int, advisories: list[str] = (),
+) -> str:
+    """Prompt asking the LLM to fix static-check failures in *code*.
+
+    *advisories* are possible problems the model may judge to be false positives.
+    """
+    from src.infra.compaction import truncate_middle
+
+    parts = []
+    if problems:
+        parts.append(
+            "The code you generated fails static checks before it can run:\n"
+            + "\n".join(problems)
+        )
+    if advisories:
+        parts.append(
+            "A static scan flagged these possible problems. It can be wrong; if the "
+            "code is correct as written, return it unchanged:\n" + "\n".join(advisories)
+        )
+    return (
+        "\n\n".join(parts)
+        + f"\n\nCode:\n```python\n{truncate_middle(code, budget // 2)}\n```\n\n"
+        "Fix these problems and return the complete corrected program."
+    )
+
+
+def _failure_report(test_output: str, test_analysis: str) -> str:
+    report = f"Execution output:\n{test_output}"
+    if test_analysis:
+        report += f"\n\nTester's verdict:\n{test_analysis}"
+    return report
+
+
+def _fix_prompt(code: str, test_output: str, test_analysis: str, budget: int) -> str:
+    """Merged analyse-and-fix prompt within the token budget.
+
+    Like the manager's error analysis: the code gets at most half the budget,
+    the execution output (already compacted by the tester) what is left.
+    """
+    from src.infra.compaction import compact_output, estimate_tokens, truncate_middle
+
+    code = truncate_middle(code, budget // 2)
+    remaining = max(budget - estimate_tokens(code), budget // 8)
+    report = _failure_report(compact_output(test_output, remaining), test_analysis)
+    return (
+        f"The program below failed when run.\n\nProgram:\n```python\n{code}\n```\n\n"
+        f"{report}\n\nDiagnose the failure, then return the complete corrected program."
+    )
+
+
+def _split_fix(text: str) -> tuple[str, str]:
+    """Split a merged-fix response into (diagnosis, code)."""
+    fence = text.find("```")
+    diagnosis = text[:fence] if fence >= 0 else ""
+    diagnosis = re.sub(r"^\s*DIAGNOSIS:\s*", "", diagnosis, flags=re.IGNORECASE).strip()
+    return diagnosis, _extract_code(text)
+
+
+def _apply_edits(code: str, text: str) -> tuple[str | None, list[str]]:
+    """Apply the SEARCH/REPLACE blocks in *text* to *code*.
+
+    Returns (new code, []) or (None, problems); edits apply all or nothing.
+    A SEARCH section that does not match exactly may still match line by line
+    ignoring trailing whitespace. A response with no edit blocks but a code
+    block is taken as a full replacement.
+    """
+    blocks = _EDIT_BLOCK.findall(text)
+    if not blocks:
+        if "```" in text:
+            return _extract_code(text), []
+        return None, ["no SEARCH/REPLACE blocks in the response"]
 
-    return {"filename": filename, "code": code}
+    problems = []
+    for i, (search, replace) in enumerate(blocks, 1):
+        if not search.strip():
+            code = code.rstrip("\n") + "\n" + replace
+            continue
+        if search in code:
+            code = code.replace(search, replace, 1)
+            continue
+        lines = code.splitlines(keepends=True)
+        wanted = [line.rstrip() for line in search.splitlines()]
+        for start in range(len(lines) - len(wanted) + 1):
+            window = lines[start:start + len(wanted)]
+            if [line.rstrip() for line in window] == wanted:
+                code = "".join(lines[:start]) + replace + "".join(lines[start + len(wanted):])
+                break
+        else:
+            problems.append(f"edit {i}: SEARCH text not found: {search.strip()[:80]!r}")
+    if problems:
+        return None, problems
+    return code, []
 
 
 def _extract_code(text: str) -> str:
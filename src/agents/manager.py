@@ -1,8 +1,12 @@
 """Manager Agent — orchestrates Coder, Tester, Sandbox, and OpenViking."""
 
 import logging
+import time
 
-from restate import ObjectContext, VirtualObject
+from restate import ObjectContext, ObjectSharedContext, TerminalError, VirtualObject
+
+from src.infra.events import emit
+from src.infra.fingerprint import task_fingerprint
 
 manager = VirtualObject("manager")
 
@@ -33,14 +37,62 @@ Your output must include:
 
 Be concise and actionable. Your analysis will be fed back to the coder for the next attempt."""
 
+_FOLLOW_UP_PLAN_PROMPT = """\
+You are a senior software architect. A Python program already fulfils the current \
+specification. Given that specification, the program and a change request, produce the \
+updated specification for the coder, who will edit the existing program.
+
+Your output must include:
+1. The complete updated specification (keep unchanged parts brief)
+2. A "Changes" section listing exactly what must change in the existing code
+
+Be concise and precise. Do not ask for a rewrite of code that does not need to change."""
+
 
 @manager.handler()
 async def handle_task(ctx: ObjectContext, req: dict) -> dict:
     """Orchestrate the full code-generation workflow.
 
-    req: {"task": str}
-    returns: dict with status, code, test_output, retries, etc.
+    req: {"task": str, "template": str (optional), "follow_up": bool (optional),
+          "deadline_s": float (optional, default TASK_DEADLINE_S; 0 = no deadline)}
+    returns: dict with status, code, test_output, retries, etc.; deadline_exceeded
+    is set when the budget ran out and retries or archiving were skipped
+
+    The deadline is passed to every agent, which size their LLM, sandbox and
+    OpenViking timeouts from what is left of it.
+
+    With follow_up the task is a change request against this key's last
+    successful program: the planner and coder get that code and the coder
+    answers with edits instead of a rewrite.
+
+    Progress is readable through get_status and streamed as events (see
+    src.infra.events). Cancelling the invocation surfaces here as a
+    TerminalError; the final status and event are still recorded.
+
+    Identical concurrent tasks (same normalized text, template and reference)
+    are coalesced: one runs, the others wait for and share its result.
     """
+    try:
+        return await _run_task(ctx, req)
+    except TerminalError as e:
+        status = "cancelled" if e.status_code == 409 else "failed"
+        log.warning("manager.handle_task %s project=%s: %s", status, ctx.key(), e.message)
+        flight_key = await ctx.get("flight")
+        if flight_key:
+            from src.infra.flight import complete
+
+            # Release followers; one of them takes over as leader
+            ctx.object_send(complete, key=flight_key, arg={"project_id": ctx.key(), "result": None})
+            ctx.clear("flight")
+        progress = await ctx.get("progress") or {}
+        progress.update(status=status, error=e.message)
+        ctx.set("progress", progress)
+        ctx.set("status", status)
+        emit(ctx, ctx.key(), "task_finished", "manager", status=status, error=e.message)
+        raise
+
+
+async def _run_task(ctx: ObjectContext, req: dict) -> dict:
     task = req["task"]
     project_id = ctx.key()
 
@@ -48,137 +100,416 @@ async def handle_task(ctx: ObjectContext, req: dict) -> dict:
     ctx.set("status", "started")
     ctx.set("retry_count", 0)
 
+    started_at = await ctx.time()
+    progress = {
+        "status": "running",
+        "phase": None,
+        "attempt": 0,
+        "max_attempts": MAX_RETRIES,
+        "started_at": started_at,
+        "phase_started_at": started_at,
+        "updated_at": started_at,
+        "timings": {},
+        "partial": {"attempts": []},
+    }
+    # Follow-up: build on the last program that passed for this key
+    previous = await ctx.get("last_success") if req.get("follow_up") else None
+    if req.get("follow_up") and previous is None:
+        log.info("manager: follow-up without a previous success, running as new task")
+    # Recall, coalescing and archiving key on the whole task, not just the change request
+    full_task = f"{previous['task']}\n{task}" if previous else task
+    if previous:
+        progress["follow_up"] = True
+    emit(
+        ctx, project_id, "task_started", "manager",
+        task=task, invocation_id=ctx.request().id, follow_up=previous is not None,
+    )
+
     # ── Step 1: create sandbox project ──────────────────────────────
+    await _enter_phase(ctx, progress, "sandbox")
     from src.infra.sandbox import create_project
 
-    await ctx.service_call(create_project, arg=project_id)
+    await ctx.service_call(
+        create_project, arg={"project_id": project_id, "template": req.get("template")}
+    )
     log.info("manager: sandbox project created project=%s", project_id)
 
+    # ── Step 1b: exact recall of an archived solution ───────────────
+    from src.config import cfg
+    from src.infra.deadline import expired, is_deadline_error, make_deadline, stage_timeout
+    from src.infra.llm import in_llm_pool
+
+    deadline = make_deadline(started_at, req.get("deadline_s", cfg.task_deadline_s))
+    progress["deadline"] = deadline
+    recall_key = task_fingerprint(full_task, req.get("template"))
+    if cfg.task_recall:
+        recalled = await _try_recall(ctx, progress, recall_key, deadline)
+        if recalled is not None:
+            return await _finish(ctx, progress, recalled, full_task)
+
     # ── Step 2: retrieve reference from OpenViking ──────────────────
-    async def _ov_retrieve():
+    await _enter_phase(ctx, progress, "retrieve")
+
+    def _ov_retrieve():
         from src.config import cfg
         from src.infra.ov_client import OVClient
+        from src.infra.ov_meta import OVMeta
+        from src.infra.retrieval import hybrid_retrieve
 
-        client = OVClient(cfg.ov_data_path)
+        local_hits = []
+        meta = OVMeta(cfg.ov_meta_path)
         try:
-            client.init()
-            result = client.retrieve(task)
-            return result
+            local_hits = meta.search(task)
         except Exception:
-            log.exception("manager: OV retrieve failed, continuing without reference")
-            return ""
+            log.exception("manager: local index search failed, vector search only")
         finally:
-            client.close()
+            meta.close()
+
+        store = {}
+
+        def _open_store():
+            # Untimed: init() gets slower as the store grows
+            client = OVClient(cfg.ov_data_path)
+            try:
+                client.init()
+            except Exception:
+                client.close()
+                raise
+            store["client"] = client
+            return client.close
+
+        def _vector_search(query):
+            client = store["client"]
+            uris = client.find(query)
+            return uris, ({uris[0]: client.overview(uris[0])} if uris else {})
+
+        try:
+            retrieved = hybrid_retrieve(
+                task,
+                local_hits,
+                _vector_search,
+                strong_coverage=cfg.retrieve_local_coverage,
+                vector_timeout_s=stage_timeout(
+                    cfg.retrieve_vector_timeout_s, deadline, time.time(),
+                ),
+                open_store=_open_store,
+            )
+        except Exception:
+            log.exception("manager: OV retrieve failed, continuing without reference")
+            return {"reference": "", "source": "none", "uri": None}
 
-    reference = await ctx.run("ov_retrieve", _ov_retrieve)
-    log.info("manager: OV reference length=%d", len(reference))
+        if retrieved["uri"]:
+            # Usage counts drive maintenance pruning
+            meta = OVMeta(cfg.ov_meta_path)
+            try:
+                meta.record_hit(retrieved["uri"])
+            except Exception:
+                log.exception("manager: hit count update failed (non-fatal)")
+            finally:
+                meta.close()
+        return retrieved
+
+    if previous:
+        # The existing program is the reference for a change request
+        retrieved = {"reference": "", "source": "follow_up", "uri": None}
+    else:
+        retrieved = await ctx.run("ov_retrieve", _ov_retrieve)
+    reference = retrieved["reference"]
+    log.info(
+        "manager: reference length=%d source=%s uri=%s",
+        len(reference), retrieved["source"], retrieved["uri"],
+    )
+    progress["partial"]["reference_chars"] = len(reference)
+    emit(
+        ctx, project_id, "reference_retrieved", "manager",
+        chars=len(reference), source=retrieved["source"],
+    )
+
+    # ── Step 2b: coalesce with an identical task already in flight ──
+    flight_key = None
+    if cfg.task_coalesce:
+        flight_key = task_fingerprint(full_task, req.get("template"), reference)
+        shared = await _join_flight(ctx, progress, flight_key, deadline)
+        if shared is not None:
+            return await _finish_follower(ctx, progress, shared, full_task)
+        if await ctx.get("flight") != flight_key:
+            # Stopped waiting for the leader at the deadline: run alone
+            flight_key = None
 
     # ── Step 3: LLM-driven task planning ────────────────────────────
+    await _enter_phase(ctx, progress, "plan")
+    plan_system_prompt = _PLAN_SYSTEM_PROMPT
     plan_user_prompt = f"User task: {task}"
-    if reference:
-        plan_user_prompt += f"\n\nReference material:\n{reference}"
-
-    async def _llm_plan():
+    # Reference material goes first as a cacheable block shared by similar tasks
+    plan_context = ""
+    if previous:
+        plan_system_prompt = _FOLLOW_UP_PLAN_PROMPT
+        plan_context, plan_user_prompt = _follow_up_plan_prompt(previous, task)
+    elif reference:
         from src.config import cfg
+        from src.infra.compaction import truncate_middle
+
+        reference = truncate_middle(reference, cfg.llm_prompt_token_budget // 4)
+        plan_context = f"Reference material:\n{reference}"
+
+    def _llm_plan():
+        from src.infra.deadline import run_timeout
         from src.infra.llm import LLMClient
 
-        client = LLMClient(cfg.llm_base_url, cfg.llm_api_key, cfg.llm_model_name)
-        return client.chat(_PLAN_SYSTEM_PROMPT, plan_user_prompt)
+        timeout = run_timeout(None, deadline)
+        client = LLMClient.for_phase("plan")
+        return client.chat(
+            plan_system_prompt, plan_user_prompt, context=plan_context,
+            timeout=timeout,
+        )
 
-    refined_task = await ctx.run("llm_plan", _llm_plan)
+    try:
+        refined_task = await ctx.run("llm_plan", in_llm_pool(_llm_plan))
+    except TerminalError as e:
+        if not is_deadline_error(e):
+            raise
+        # The retry loop stops before its first attempt
+        refined_task = task
     log.info("manager: LLM plan length=%d", len(refined_task))
+    progress["partial"]["plan"] = refined_task
+    emit(ctx, project_id, "plan_ready", "manager", plan=refined_task)
 
     # ── Step 4–6: code → test → retry loop ──────────────────────────
     from src.agents.coder import generate_code
     from src.agents.tester import run_test
 
     error_feedback = ""
+    # MERGED_FIX: the failed run handed to the next coder call instead of feedback
+    failed_run = {}
     coder_result = {}
     test_result = {}
     retries = 0
+    deadline_exceeded = False
 
     for attempt in range(1, MAX_RETRIES + 1):
+        if expired(deadline, await ctx.time()):
+            log.info("manager: deadline reached, no attempt %d project=%s", attempt, project_id)
+            deadline_exceeded = True
+            break
         log.info("manager: attempt %d/%d project=%s", attempt, MAX_RETRIES, project_id)
         ctx.set("retry_count", attempt)
+        progress["attempt"] = attempt
+        emit(
+            ctx, project_id, "attempt_started", "manager",
+            attempt=attempt, max_attempts=MAX_RETRIES,
+        )
 
         # Call coder with refined task
-        coder_req = {"task": refined_task, "reference": reference}
+        await _enter_phase(ctx, progress, "code")
+        coder_req = {
+            "project_id": project_id, "task": refined_task, "reference": reference,
+            "deadline": deadline,
+        }
         if error_feedback:
             coder_req["error_feedback"] = error_feedback
-        coder_result = await ctx.object_call(generate_code, key=project_id, arg=coder_req)
+        if previous:
+            # Retries edit the failing attempt rather than the original program
+            coder_req["existing_code"] = coder_result.get("code") or previous["code"]
+        coder_req.update(failed_run)
+        failed_run = {}
+        try:
+            coder_out = await ctx.service_call(generate_code, arg=coder_req)
+        except TerminalError as e:
+            if not is_deadline_error(e):
+                raise
+            coder_out = {"deadline_exceeded": True}
+        if coder_out.get("deadline_exceeded"):
+            # Keep the previous attempt's code and output as the result
+            log.info("manager: deadline reached while coding project=%s", project_id)
+            deadline_exceeded = True
+            break
+        coder_result = coder_out
         log.info("manager: coder returned filename=%s", coder_result.get("filename"))
+        progress["partial"]["code"] = coder_result.get("code", "")
+        if coder_result.get("diagnosis"):
+            emit(
+                ctx, project_id, "error_analysis", "manager",
+                attempt=attempt - 1, feedback=coder_result["diagnosis"],
+            )
+
+        if coder_result.get("preflight_error"):
+            # Static failure: the compiler message is already the best feedback,
+            # so skip the sandbox run and both LLM analyses
+            log.info("manager: pre-flight failed, skipping tester project=%s", project_id)
+            preflight_error = coder_result["preflight_error"]
+            test_result = {
+                "passed": False,
+                "output": preflight_error,
+                "analysis": "Pre-flight static checks failed.",
+            }
+            progress["partial"]["attempts"].append({
+                "attempt": attempt,
+                "filename": coder_result.get("filename"),
+                "passed": False,
+                "analysis": test_result["analysis"],
+            })
+            error_feedback = f"The code fails static checks:\n{preflight_error}"
+            retries = attempt
+            continue
 
         # Call tester
-        test_result = await ctx.object_call(
-            run_test,
-            key=project_id,
-            arg={"project_id": project_id, "filename": coder_result["filename"]},
-        )
+        await _enter_phase(ctx, progress, "test")
+        try:
+            test_result = await ctx.service_call(
+                run_test,
+                arg={
+                    "project_id": project_id, "filename": coder_result["filename"],
+                    "deadline": deadline,
+                },
+            )
+        except TerminalError as e:
+            if not is_deadline_error(e):
+                raise
+            test_result = {
+                "passed": False,
+                "output": "",
+                "analysis": "Task deadline reached before the test finished.",
+                "deadline_exceeded": True,
+            }
+        if test_result.get("deadline_exceeded"):
+            deadline_exceeded = True
         log.info("manager: tester result passed=%s", test_result.get("passed"))
+        progress["partial"]["attempts"].append({
+            "attempt": attempt,
+            "filename": coder_result.get("filename"),
+            "passed": bool(test_result.get("passed")),
+            "analysis": test_result.get("analysis", ""),
+        })
 
         if test_result.get("passed"):
             retries = attempt - 1
             break
 
+        retries = attempt
+        if expired(deadline, await ctx.time()):
+            # No time left for another attempt to use the analysis
+            continue
+        if cfg.merged_fix:
+            # The next coder call diagnoses and fixes in one LLM round trip
+            error_feedback = ""
+            failed_run = {
+                "failed_code": coder_result.get("code", ""),
+                "test_output": test_result.get("output", ""),
+                "test_analysis": test_result.get("analysis", ""),
+            }
+            continue
+
         # LLM-driven error analysis for the next retry
+        await _enter_phase(ctx, progress, "error_analysis")
         test_output = test_result.get("output", "")
         code = coder_result.get("code", "")
-        error_user_prompt = (
-            f"Original task:\n{refined_task}\n\n"
-            f"Generated code:\n```python\n{code}\n```\n\n"
-            f"Execution output:\n{test_output}"
-        )
+        error_context, error_user_prompt = _error_analysis_prompt(refined_task, code, test_output)
 
-        async def _llm_error_analysis():
-            from src.config import cfg
+        def _llm_error_analysis():
+            from src.infra.deadline import run_timeout
             from src.infra.llm import LLMClient
 
-            client = LLMClient(cfg.llm_base_url, cfg.llm_api_key, cfg.llm_model_name)
-            return client.chat(_ERROR_ANALYSIS_PROMPT, error_user_prompt)
+            timeout = run_timeout(None, deadline)
+            client = LLMClient.for_phase("error_analysis")
+            return client.chat(
+                _ERROR_ANALYSIS_PROMPT, error_user_prompt, context=error_context,
+                timeout=timeout,
+            )
 
-        error_feedback = await ctx.run(
-            f"llm_error_analysis_{attempt}", _llm_error_analysis
-        )
+        try:
+            error_feedback = await ctx.run(
+                f"llm_error_analysis_{attempt}", in_llm_pool(_llm_error_analysis)
+            )
+        except TerminalError as e:
+            if not is_deadline_error(e):
+                raise
+            deadline_exceeded = True
+            break
         log.info("manager: LLM error analysis length=%d", len(error_feedback))
-        retries = attempt
+        emit(ctx, project_id, "error_analysis", "manager", attempt=attempt, feedback=error_feedback)
 
     # ── Step 7: on success, archive to OpenViking ───────────────────
     final_status = "success" if test_result.get("passed") else "failed"
     code = coder_result.get("code", "")
 
-    if final_status == "success":
+    if final_status == "success" and expired(deadline, await ctx.time()):
+        # The program passed; only the archive is skipped
+        log.info("manager: deadline reached, skipping OV archive project=%s", project_id)
+        deadline_exceeded = True
+    elif final_status == "success":
         from src.infra.sandbox import read_file
 
+        await _enter_phase(ctx, progress, "archive")
+
         file_content = await ctx.service_call(
             read_file, arg={"project_id": project_id, "filename": coder_result["filename"]}
         )
         code = file_content.get("content", code)
 
-        async def _ov_archive():
+        # Plain function like _ov_retrieve: the SQLite and OpenViking calls
+        # block, so Restate runs it in a worker thread, not on the event loop
+        def _ov_archive():
             from src.config import cfg
             from src.infra.ov_client import OVClient
+            from src.infra.ov_meta import ARCHIVE_PREFIX, OVMeta
 
-            uri = f"viking://code/{project_id}/{coder_result['filename']}"
-            client = OVClient(cfg.ov_data_path)
+            uri = f"{ARCHIVE_PREFIX}{project_id}/{coder_result['filename']}"
+            meta = OVMeta(cfg.ov_meta_path)
             try:
-                client.init()
-                client.add(code, uri)
-                log.info("manager: archived to OV uri=%s", uri)
-            except Exception:
-                log.exception("manager: OV archive failed (non-fatal)")
+                # Duplicates link to the canonical resource instead of being re-embedded
+                canonical, content_hash, signature = None, "", []
+                try:
+                    canonical, content_hash, signature = meta.find_duplicate(
+                        code, cfg.ov_dedup_threshold,
+                    )
+                except Exception:
+                    log.exception("manager: duplicate check failed (non-fatal)")
+
+                if canonical is not None:
+                    log.info("manager: OV archive skipped, uri=%s duplicates %s", uri, canonical)
+                    if canonical != uri:
+                        try:
+                            meta.record_resource(uri, content_hash, signature, canonical)
+                        except Exception:
+                            log.exception("manager: duplicate link failed (non-fatal)")
+                else:
+                    client = OVClient(cfg.ov_data_path)
+                    try:
+                        client.init()
+                        client.add(code, uri, stage_timeout(60, deadline, time.time()))
+                        log.info("manager: archived to OV uri=%s", uri)
+                        if content_hash:
+                            meta.record_resource(uri, content_hash, signature)
+                    except Exception:
+                        log.exception("manager: OV archive failed (non-fatal)")
+                    finally:
+                        client.close()
+
+                # The recall index keeps the code itself, so it works even when
+                # the embedding endpoint (and thus the OV archive) is down
+                try:
+                    meta.record_solution(recall_key, full_task, canonical or uri, code)
+                    meta.index_document(canonical or uri, full_task, code)
+                except Exception:
+                    log.exception("manager: recall index update failed (non-fatal)")
             finally:
-                client.close()
+                meta.close()
 
         await ctx.run("ov_archive", _ov_archive)
 
-    # ── Step 8: store final state and return ────────────────────────
-    ctx.set("status", final_status)
+    # ── Step 8: release the sandbox, store final state and return ───
+    from src.infra.sandbox import delete_project
+
+    await _enter_phase(ctx, progress, "cleanup")
+    # Deferred: the workspace stays inspectable until the reaper evicts it
+    await ctx.service_call(delete_project, arg={"project_id": project_id, "defer": True})
+
     log.info(
         "manager.handle_task DONE project=%s status=%s retries=%d",
         project_id, final_status, retries,
     )
 
-    return {
+    result = {
         "project_id": project_id,
         "status": final_status,
         "retries": retries,
@@ -186,3 +517,278 @@ async def handle_task(ctx: ObjectContext, req: dict) -> dict:
         "test_output": test_result.get("output", ""),
         "test_analysis": test_result.get("analysis", ""),
     }
+    if deadline_exceeded:
+        result["deadline_exceeded"] = True
+    if flight_key:
+        from src.infra.flight import complete
+
+        ctx.object_send(complete, key=flight_key, arg={"project_id": project_id, "result": result})
+        ctx.clear("flight")
+    return await _finish(ctx, progress, result, full_task, refined_task)
+
+
+@manager.handler(kind="shared")
+async def get_status(ctx: ObjectSharedContext) -> dict:
+    """Cheap progress query; runs concurrently with an in-flight handle_task.
+
+    returns: {"project_id",
+              "status": "idle" | "running" | "success" | "failed" | "cancelled",
+              "phase", "attempt", "max_attempts", "started_at", "updated_at",
+              "timings": {phase: seconds}, "partial": {...}, "result" (when done)}
+    "cancelled" means the invocation was cancelled (a TerminalError with
+    status 409); it and other terminal errors also set "error".
+    """
+    progress = await ctx.get("progress")
+    if progress is None:
+        return {"project_id": ctx.key(), "status": "idle"}
+    return {"project_id": ctx.key(), **progress}
+
+
+async def _try_recall(
+    ctx: ObjectContext, progress: dict, recall_key: str, deadline: float | None,
+) -> dict | None:
+    """Re-test the archived solution of an identical earlier task.
+
+    Returns the final result when the stored code still passes (one sandbox
+    run instead of plan → code → test), otherwise None after marking the
+    entry stale so the normal workflow takes over.
+    """
+    from src.agents.tester import run_test
+    from src.config import cfg
+    from src.infra.deadline import is_deadline_error
+    from src.infra.ov_meta import OVMeta
+    from src.infra.sandbox import delete_project, write_file
+
+    def _lookup():
+        meta = OVMeta(cfg.ov_meta_path)
+        try:
+            return meta.lookup_solution(recall_key)
+        finally:
+            meta.close()
+
+    hit = await ctx.run("recall_lookup", _lookup)
+    if not hit or hit["verdict"] != "pass":
+        return None
+
+    project_id = ctx.key()
+    log.info("manager: recall hit project=%s uri=%s", project_id, hit["uri"])
+    await _enter_phase(ctx, progress, "recall")
+    emit(ctx, project_id, "recall_hit", "manager", uri=hit["uri"])
+    await ctx.service_call(
+        write_file, arg={"project_id": project_id, "filename": "main.py", "content": hit["code"]},
+    )
+    try:
+        test_result = await ctx.service_call(
+            run_test, arg={"project_id": project_id, "filename": "main.py", "deadline": deadline},
+        )
+    except TerminalError as e:
+        if not is_deadline_error(e):
+            raise
+        # Out of time; the stored solution is not known to be stale
+        return None
+    progress["partial"]["attempts"].append({
+        "attempt": 0,
+        "filename": "main.py",
+        "passed": bool(test_result.get("passed")),
+        "analysis": test_result.get("analysis", ""),
+    })
+    if not test_result.get("passed"):
+        log.info("manager: recalled solution no longer passes uri=%s", hit["uri"])
+
+        def _mark_stale():
+            meta = OVMeta(cfg.ov_meta_path)
+            try:
+                meta.set_verdict(recall_key, "stale")
+            finally:
+                meta.close()
+
+        await ctx.run("recall_stale", _mark_stale)
+        return None
+
+    def _record_hit():
+        # Only a solution that still passes counts as used for pruning
+        meta = OVMeta(cfg.ov_meta_path)
+        try:
+            meta.record_hit(hit["uri"])
+        except Exception:
+            log.exception("manager: hit count update failed (non-fatal)")
+        finally:
+            meta.close()
+
+    await ctx.run("recall_used", _record_hit)
+    await _enter_phase(ctx, progress, "cleanup")
+    await ctx.service_call(delete_project, arg={"project_id": project_id, "defer": True})
+    log.info("manager.handle_task DONE project=%s status=success (recalled)", project_id)
+    return {
+        "project_id": project_id,
+        "status": "success",
+        "retries": 0,
+        "code": hit["code"],
+        "test_output": test_result.get("output", ""),
+        "test_analysis": test_result.get("analysis", ""),
+        "recalled_from": hit["uri"],
+    }
+
+
+async def _join_flight(
+    ctx: ObjectContext, progress: dict, flight_key: str, deadline: float | None,
+) -> dict | None:
+    """Join the single flight for *flight_key*.
+
+    Returns None when this invocation is the leader (it must later call
+    flight.complete), otherwise the leader's result. If the leader gives up
+    the followers join again and one of them takes over. A follower waits at
+    most until its own deadline (then leaves the flight, returns None without
+    leading and runs the task alone) or until the leader's lease runs out
+    (then joins again to take over from a leader that was killed).
+    """
+    from datetime import timedelta
+
+    import restate
+
+    from src.config import cfg
+    from src.infra.deadline import remaining
+    from src.infra.flight import join, lease_until, leave
+
+    while True:
+        awakeable_id, promise = ctx.awakeable()
+        now = await ctx.time()
+        joined = await ctx.object_call(
+            join, key=flight_key, arg={
+                "project_id": ctx.key(), "awakeable_id": awakeable_id,
+                "expires_at": lease_until(deadline, now, cfg.task_coalesce_lease_s),
+            },
+        )
+        if joined["role"] == "leader":
+            ctx.set("flight", flight_key)
+            return None
+        log.info("manager: project=%s coalesced with %s", ctx.key(), joined["leader"])
+        progress["coalesced_with"] = joined["leader"]
+        await _enter_phase(ctx, progress, "coalesced")
+        emit(ctx, ctx.key(), "coalesced", "manager", leader=joined["leader"])
+
+        waits = {"result": promise}
+        left = remaining(deadline, now)
+        lease_left = None if joined.get("expires_at") is None else joined["expires_at"] - now
+        out_of_time = left is not None and (lease_left is None or left <= lease_left)
+        wait_s = left if out_of_time else lease_left
+        if wait_s is not None:
+            waits["timeout"] = ctx.sleep(timedelta(seconds=max(wait_s, 0.0)))
+        match await restate.select(**waits):
+            case ["result", result]:
+                if result is not None:
+                    return result
+            case _:
+                await ctx.object_call(leave, key=flight_key, arg={"project_id": ctx.key()})
+                progress.pop("coalesced_with", None)
+                if out_of_time:
+                    log.info(
+                        "manager: project=%s stopped waiting for %s at the deadline",
+                        ctx.key(), joined["leader"],
+                    )
+                    return None
+                # The leader's lease ran out: join again to take over
+
+
+async def _finish_follower(
+    ctx: ObjectContext, progress: dict, shared: dict, full_task: str,
+) -> dict:
+    """Adopt the leader's result: copy its code into this sandbox and finish."""
+    from src.infra.sandbox import delete_project, write_file
+
+    project_id = ctx.key()
+    await _enter_phase(ctx, progress, "cleanup")
+    if shared.get("code"):
+        await ctx.service_call(
+            write_file,
+            arg={"project_id": project_id, "filename": "main.py", "content": shared["code"]},
+        )
+    await ctx.service_call(delete_project, arg={"project_id": project_id, "defer": True})
+    log.info(
+        "manager.handle_task DONE project=%s status=%s (coalesced with %s)",
+        project_id, shared.get("status"), shared.get("project_id"),
+    )
+    result = {**shared, "project_id": project_id, "coalesced_with": shared.get("project_id")}
+    return await _finish(ctx, progress, result, full_task)
+
+
+async def _finish(
+    ctx: ObjectContext, progress: dict, result: dict, full_task: str = "", spec: str = "",
+) -> dict:
+    """Record the final status and result, and close the event stream.
+
+    A successful program becomes the base for follow-up tasks on this key.
+    """
+    ctx.set("status", result["status"])
+    if result["status"] == "success" and full_task and result.get("code"):
+        ctx.set("last_success", {"task": full_task, "spec": spec, "code": result["code"]})
+    await _enter_phase(ctx, progress, None)
+    progress["status"] = result["status"]
+    progress["result"] = result
+    ctx.set("progress", progress)
+    emit(
+        ctx, ctx.key(), "task_finished", "manager",
+        status=result["status"], retries=result.get("retries", 0),
+    )
+    return result
+
+
+async def _enter_phase(ctx: ObjectContext, progress: dict, phase: str | None) -> None:
+    """Close the timing of the current phase, switch to *phase* and persist progress.
+
+    Timings accumulate per phase name, so "code" and "test" sum over attempts.
+    Timestamps come from ctx.time() so they are stable across replays.
+    """
+    now = await ctx.time()
+    current = progress["phase"]
+    if current is not None:
+        elapsed = now - progress["phase_started_at"]
+        progress["timings"][current] = round(progress["timings"].get(current, 0.0) + elapsed, 3)
+    progress["phase"] = phase
+    progress["phase_started_at"] = now
+    progress["updated_at"] = now
+    ctx.set("progress", progress)
+
+
+def _follow_up_plan_prompt(previous: dict, change: str) -> tuple[str, str]:
+    """Build the follow-up planning (context, prompt) within the token budget.
+
+    The previous spec and program are the cacheable context; the change
+    request is the prompt.
+    """
+    from src.config import cfg
+    from src.infra.compaction import truncate_middle
+
+    budget = cfg.llm_prompt_token_budget
+    parts = []
+    if previous.get("spec"):
+        parts.append(f"Current specification:\n{truncate_middle(previous['spec'], budget // 4)}")
+    else:
+        parts.append(f"Original task:\n{truncate_middle(previous['task'], budget // 4)}")
+    parts.append(
+        f"Current program (main.py):\n```python\n"
+        f"{truncate_middle(previous['code'], budget // 2)}\n```"
+    )
+    return "\n\n".join(parts), f"Change request: {change}"
+
+
+def _error_analysis_prompt(task: str, code: str, test_output: str) -> tuple[str, str]:
+    """Build the error-analysis (context, prompt) within the token budget.
+
+    The spec gets at most a quarter and the code half of the budget; the
+    execution output (already compacted by the tester) gets what is left.
+    The spec is constant across attempts and is returned as cacheable context.
+    """
+    from src.config import cfg
+    from src.infra.compaction import compact_output, estimate_tokens, truncate_middle
+
+    budget = cfg.llm_prompt_token_budget
+    task = truncate_middle(task, budget // 4)
+    code = truncate_middle(code, budget // 2)
+    remaining = max(budget - estimate_tokens(task) - estimate_tokens(code), budget // 8)
+    test_output = compact_output(test_output, remaining)
+    return (
+        f"Original task:\n{task}",
+        f"Generated code:\n```python\n{code}\n```\n\n"
+        f"Execution output:\n{test_output}",
+    )
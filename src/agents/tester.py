@@ -1,11 +1,14 @@
 """Tester Agent — runs code in the sandbox and analyzes results via LLM."""
 
+import json
 import logging
 import re
 
-from restate import ObjectContext, VirtualObject
+from restate import Context, Service, TerminalError
 
-tester = VirtualObject("tester")
+from src.infra.events import emit
+
+tester = Service("tester")
 
 log = logging.getLogger(__name__)
 
@@ -27,62 +30,130 @@ Always include a brief explanation before the verdict."""
 
 
 @tester.handler()
-async def run_test(ctx: ObjectContext, req: dict) -> dict:
+async def run_test(ctx: Context, req: dict) -> dict:
     """Execute a file in the sandbox and decide pass/fail.
 
-    req: {"project_id": str, "filename": str}
-    returns: {"passed": bool, "output": str, "analysis": str}
+    req: {"project_id": str, "filename": str, "deadline": float (optional, epoch seconds)}
+    returns: {"passed": bool, "output": str, "analysis": str,
+              "deadline_exceeded": bool (only when set)}
+
+    The deadline caps the dependency install, the run and the LLM verdict;
+    once it has passed the verdict falls back to the return-code heuristic.
     """
     project_id = req["project_id"]
     filename = req["filename"]
+    deadline = req.get("deadline")
 
     log.info("tester.run_test project=%s filename=%s", project_id, filename)
 
-    from src.infra.sandbox import exec_command
+    from src.infra.sandbox import exec_command, prepare_env
+
+    # Resolve third-party imports into a shared env (no-op for stdlib-only code)
+    env = await ctx.service_call(
+        prepare_env, arg={"project_id": project_id, "deadline": deadline},
+    )
+
+    from src.config import cfg
 
+    # Known up front so clients can tail the run (sandbox.tail_output) while it executes
+    exec_id = str(ctx.uuid())
+    emit(ctx, project_id, "test_started", "tester", filename=filename, exec_id=exec_id)
     result = await ctx.service_call(
         exec_command,
-        arg={"project_id": project_id, "command": f"python {filename}"},
+        arg={
+            "project_id": project_id,
+            "command": f"python {filename}",
+            "env_id": env["env_id"],
+            "exec_id": exec_id,
+            "deadline": deadline,
+            # An uncaught traceback is a failure even if the program then hangs
+            "abort_patterns": json.loads(cfg.tester_abort_patterns),
+        },
     )
 
     stdout = result.get("stdout", "")
     stderr = result.get("stderr", "")
     returncode = result.get("returncode", -1)
-    combined_output = f"stdout:\n{stdout}\nstderr:\n{stderr}\nreturncode: {returncode}"
+
+    from src.infra.compaction import compact_streams
+
+    # Bound what reaches the LLM (and the journal) however much the program prints
+    short_stdout, short_stderr = compact_streams(stdout, stderr, cfg.llm_output_token_budget)
+    combined_output = (
+        f"stdout:\n{short_stdout}\nstderr:\n{short_stderr}\nreturncode: {returncode}"
+    )
+    if env["error"]:
+        combined_output += f"\ndependency install failed for {env['requirements']}:\n{env['error']}"
 
     log.info(
         "tester.run_test project=%s rc=%s stdout_len=%d stderr_len=%d",
         project_id, returncode, len(stdout), len(stderr),
     )
 
-    # Ask LLM to analyse the execution result
+    from src.infra.deadline import expired, is_deadline_error
+
+    out_of_time = False
+    if cfg.merged_fix and returncode != 0:
+        # A crash needs no LLM verdict; the coder's fix call reads the output itself
+        passed = False
+        analysis = f"Exited with return code {returncode} (no LLM verdict)."
+        log.info("tester.run_test project=%s fast-fail rc=%s", project_id, returncode)
+    elif deadline and expired(deadline, await ctx.time()):
+        out_of_time = True
+    else:
+        try:
+            passed, analysis = await _llm_verdict(
+                ctx, filename, combined_output, returncode, stdout, stderr, deadline,
+            )
+        except TerminalError as e:
+            if not is_deadline_error(e):
+                raise
+            out_of_time = True
+    if out_of_time:
+        log.info("tester.run_test project=%s deadline reached, heuristic verdict", project_id)
+        passed = _analyse_result(returncode, stdout, stderr)
+        analysis = f"Task deadline reached; heuristic verdict (return code {returncode})."
+
+    log.info("tester.run_test project=%s passed=%s", project_id, passed)
+    emit(
+        ctx, project_id, "test_verdict", "tester",
+        filename=filename, passed=passed, returncode=returncode, analysis=analysis,
+    )
+
+    result = {"passed": passed, "output": combined_output, "analysis": analysis}
+    if out_of_time:
+        result["deadline_exceeded"] = True
+    return result
+
+
+async def _llm_verdict(
+    ctx: Context, filename: str, combined_output: str, returncode: int, stdout: str, stderr: str,
+    deadline: float | None,
+) -> tuple[bool, str]:
+    """Ask the LLM whether the run succeeded: (passed, analysis)."""
+    from src.infra.llm import in_llm_pool
+
     user_prompt = (
         f"Execution output of `python {filename}`:\n\n{combined_output}"
     )
 
-    async def _llm_analyse():
-        from src.config import cfg
+    def _llm_analyse():
+        from src.infra.deadline import run_timeout
         from src.infra.llm import LLMClient
 
-        client = LLMClient(cfg.llm_base_url, cfg.llm_api_key, cfg.llm_model_name)
-        return client.chat(_SYSTEM_PROMPT, user_prompt)
+        timeout = run_timeout(None, deadline)
+        client = LLMClient.for_phase("test_analysis")
+        return client.chat(_SYSTEM_PROMPT, user_prompt, timeout=timeout)
 
-    llm_response = await ctx.run("llm_analyse", _llm_analyse)
+    llm_response = await ctx.run("llm_analyse", in_llm_pool(_llm_analyse))
     log.info("tester.run_test llm_analyse response length=%d", len(llm_response))
 
     verdict = _parse_verdict(llm_response)
     if verdict is not None:
-        passed = verdict
-        analysis = llm_response
-    else:
-        # Fallback to heuristic if LLM didn't return a clear verdict
-        log.warning("tester: LLM returned no clear verdict, falling back to heuristic")
-        passed = _analyse_result(returncode, stdout, stderr)
-        analysis = llm_response
-
-    log.info("tester.run_test project=%s passed=%s", project_id, passed)
-
-    return {"passed": passed, "output": combined_output, "analysis": analysis}
+        return verdict, llm_response
+    # Fallback to heuristic if LLM didn't return a clear verdict
+    log.warning("tester: LLM returned no clear verdict, falling back to heuristic")
+    return _analyse_result(returncode, stdout, stderr), llm_response
 
 
 def _parse_verdict(llm_response: str) -> bool | None:
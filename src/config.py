@@ -20,9 +20,47 @@ class Config:
     llm_base_url: str = os.getenv("LLM_BASE_URL", "")
     llm_api_key: str = os.getenv("LLM_API_KEY", "")
     llm_model_name: str = os.getenv("LLM_MODEL_NAME", "")
+    # JSON list of equivalent endpoints to balance over (overrides LLM_BASE_URL)
+    llm_endpoints: str = os.getenv("LLM_ENDPOINTS", "")
+    llm_endpoint_failure_threshold: int = int(os.getenv("LLM_ENDPOINT_FAILURE_THRESHOLD", "3"))
+    llm_endpoint_cooldown_s: float = float(os.getenv("LLM_ENDPOINT_COOLDOWN_S", "30"))
+    # Optional cheaper/faster model for the short-answer phases (test/error analysis)
+    llm_fast_model_name: str = os.getenv("LLM_FAST_MODEL_NAME", "")
+    # JSON per-phase overrides: {"plan"|"code"|"test_analysis"|"error_analysis": {...}}
+    llm_profiles: str = os.getenv("LLM_PROFILES", "")
+    # Token budgets (estimated) for a whole prompt and for program output inside it
+    llm_prompt_token_budget: int = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "16000"))
+    llm_output_token_budget: int = int(os.getenv("LLM_OUTPUT_TOKEN_BUDGET", "4000"))
+    # Client-side rate limits (0 = unlimited) and retries of transient errors
+    llm_rpm: int = int(os.getenv("LLM_RPM", "0"))
+    llm_tpm: int = int(os.getenv("LLM_TPM", "0"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    # Threads for LLM side effects, separate from the executor shared with sandbox/OV work
+    llm_workers: int = int(os.getenv("LLM_WORKERS", "16"))
+    # Hedged requests: duplicate a request slower than the phase's latency percentile
+    llm_hedge: bool = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+    llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    llm_hedge_budget: float = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+    llm_hedge_min_samples: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    llm_hedge_base_url: str = os.getenv("LLM_HEDGE_BASE_URL", "")
+    llm_hedge_api_key: str = os.getenv("LLM_HEDGE_API_KEY", "")
+    # Provider-side prompt caching (cache_control breakpoints); needs endpoint support
+    llm_prompt_cache: bool = os.getenv("LLM_PROMPT_CACHE", "false").lower() in ("1", "true", "yes")
 
     # OpenViking local storage
     ov_data_path: str = os.getenv("OV_DATA_PATH", "./data/ov_store")
+    # SQLite sidecar with the exact-recall index of archived solutions
+    ov_meta_path: str = os.getenv("OV_META_PATH", "./data/ov_meta.sqlite3")
+    # Estimated Jaccard similarity at which archived code counts as a duplicate
+    ov_dedup_threshold: float = float(os.getenv("OV_DEDUP_THRESHOLD", "0.9"))
+    # Skip vector search when the best BM25 hit covers this share of the task's terms
+    retrieve_local_coverage: float = float(os.getenv("RETRIEVE_LOCAL_COVERAGE", "0.8"))
+    # Give up on the embedding endpoint after this long and use lexical hits only
+    retrieve_vector_timeout_s: float = float(os.getenv("RETRIEVE_VECTOR_TIMEOUT_S", "5"))
+    # Maintenance prunes archives never retrieved or recalled within this many days
+    ov_prune_min_age_days: float = float(os.getenv("OV_PRUNE_MIN_AGE_DAYS", "30"))
+    # Delay between scheduled maintenance passes (0 = run once, no schedule)
+    ov_maintenance_interval_s: float = float(os.getenv("OV_MAINTENANCE_INTERVAL_S", "86400"))
 
     # Embedding / VLM service
     embedding_api_key: str = os.getenv("EMBEDDING_API_KEY", "")
@@ -31,5 +69,44 @@ class Config:
     embedding_dim: int = int(os.getenv("EMBEDDING_DIM", "2048"))
     vlm_model: str = os.getenv("VLM_MODEL", "")
 
+    # Sandbox command execution
+    sandbox_exec_timeout_s: float = float(os.getenv("SANDBOX_EXEC_TIMEOUT_S", "30"))
+    # How long a command may keep printing after an abort pattern matched
+    sandbox_abort_grace_s: float = float(os.getenv("SANDBOX_ABORT_GRACE_S", "0.5"))
+    # JSON list of regexes that make the tester kill a run early ([] disables)
+    tester_abort_patterns: str = os.getenv(
+        "TESTER_ABORT_PATTERNS", r'["^Traceback \\(most recent call last\\):"]'
+    )
+
+    # Sandbox workspace templates
+    sandbox_templates_path: str = os.getenv("SANDBOX_TEMPLATES_PATH", "./templates")
+    sandbox_clone_mode: str = os.getenv("SANDBOX_CLONE_MODE", "auto")
+
+    # Sandbox workspace garbage collection
+    sandbox_ttl_s: int = int(os.getenv("SANDBOX_TTL_S", "3600"))
+    sandbox_idle_ttl_s: int = int(os.getenv("SANDBOX_IDLE_TTL_S", "86400"))
+    sandbox_quota_mb: int = int(os.getenv("SANDBOX_QUOTA_MB", "10240"))
+    sandbox_reap_interval_s: int = int(os.getenv("SANDBOX_REAP_INTERVAL_S", "300"))
+
+    # Shared dependency environments (kept outside /tmp/lbg so the reaper skips them)
+    sandbox_envs_path: str = os.getenv("SANDBOX_ENVS_PATH", "/tmp/lbg-envs")
+    sandbox_env_install_timeout_s: int = int(os.getenv("SANDBOX_ENV_INSTALL_TIMEOUT_S", "600"))
+
+    # LLM repair rounds for code failing the coder's local pre-flight checks
+    coder_preflight_repairs: int = int(os.getenv("CODER_PREFLIGHT_REPAIRS", "2"))
+    # Retries send the failing code + output to one LLM call that diagnoses and
+    # rewrites it; the tester also fails non-zero exits without an LLM verdict
+    merged_fix: bool = os.getenv("MERGED_FIX", "false").lower() in ("1", "true", "yes")
+    # Re-test the archived solution of an identical earlier task before planning
+    task_recall: bool = os.getenv("TASK_RECALL", "true").lower() in ("1", "true", "yes")
+    # Coalesce identical concurrent tasks into one workflow (see src.infra.flight)
+    task_coalesce: bool = os.getenv("TASK_COALESCE", "true").lower() in ("1", "true", "yes")
+    # How long a leader without a deadline holds its flight before others may take over
+    task_coalesce_lease_s: float = float(os.getenv("TASK_COALESCE_LEASE_S", "1800"))
+    # Default per-task time budget in seconds (handle_task "deadline_s"); 0 = none
+    task_deadline_s: float = float(os.getenv("TASK_DEADLINE_S", "900"))
+    # Batch submission: max handle_task invocations in flight per batch
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
 
 cfg = Config()
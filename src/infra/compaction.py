@@ -0,0 +1,122 @@
+"""Token-aware compaction of program output and other long prompt inputs.
+
+Keeps prompts bounded no matter how much a generated program prints: repeated
+lines are collapsed, the final traceback is always preserved in full, and the
+rest is cut down to its head and tail.
+"""
+
+import math
+
+# Rough chars-per-token ratio for code and English text; good enough for
+# budgeting without a tokenizer round trip.
+_CHARS_PER_TOKEN = 4
+
+_TRACEBACK_HEADER = "Traceback (most recent call last):"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for *text*."""
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def dedupe_lines(lines: list[str]) -> list[str]:
+    """Collapse runs of identical consecutive lines into one line plus a count."""
+    out: list[str] = []
+    i = 0
+    while i < len(lines):
+        j = i
+        while j + 1 < len(lines) and lines[j + 1] == lines[i]:
+            j += 1
+        out.append(lines[i])
+        if j > i:
+            out.append(f"... (previous line repeated {j - i} more times)")
+        i = j + 1
+    return out
+
+
+def final_traceback(lines: list[str]) -> tuple[int, int] | None:
+    """Return the [start, end) line span of the last traceback, if any."""
+    start = None
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].startswith(_TRACEBACK_HEADER):
+            start = i
+            break
+    if start is None:
+        return None
+    end = start + 1
+    while end < len(lines) and (lines[end].startswith((" ", "\t")) or not lines[end].strip()):
+        end += 1
+    # The exception line itself
+    if end < len(lines):
+        end += 1
+    return start, end
+
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of *text* so it fits in *max_tokens*."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    budget = max_tokens * _CHARS_PER_TOKEN
+    head_budget = budget * 2 // 5
+    tail_budget = budget - head_budget
+
+    head: list[str] = []
+    used = 0
+    for line in lines:
+        if used + len(line) + 1 > head_budget:
+            break
+        head.append(line)
+        used += len(line) + 1
+
+    tail: list[str] = []
+    used = 0
+    for line in reversed(lines[len(head):]):
+        if used + len(line) + 1 > tail_budget:
+            break
+        tail.append(line)
+        used += len(line) + 1
+    tail.reverse()
+
+    omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # A single enormous line: fall back to character slicing. text[-0:] is
+        # the whole text, so an empty budget must give an empty side.
+        head_text = text[:head_budget] if head_budget > 0 else ""
+        tail_text = text[-tail_budget:] if tail_budget > 0 else ""
+        return f"{head_text}\n... [truncated] ...\n{tail_text}"
+    return "\n".join([*head, f"... [{omitted} lines omitted] ...", *tail])
+
+
+def compact_output(text: str, max_tokens: int) -> str:
+    """Compact program output to *max_tokens*.
+
+    Repeated lines are collapsed first; if that is not enough the final
+    traceback is kept verbatim and the remaining budget goes to head/tail.
+    """
+    lines = dedupe_lines(text.splitlines())
+    deduped = "\n".join(lines)
+    if estimate_tokens(deduped) <= max_tokens:
+        return deduped
+
+    span = final_traceback(lines)
+    if span is None:
+        return truncate_middle(deduped, max_tokens)
+
+    start, end = span
+    traceback = "\n".join(lines[start:end])
+    tb_tokens = estimate_tokens(traceback)
+    if tb_tokens >= max_tokens:
+        return truncate_middle(traceback, max_tokens)
+
+    rest_budget = max_tokens - tb_tokens
+    before = truncate_middle("\n".join(lines[:start]), rest_budget * 2 // 3)
+    after = truncate_middle("\n".join(lines[end:]), rest_budget // 3)
+    return "\n".join(part for part in (before, traceback, after) if part)
+
+
+def compact_streams(stdout: str, stderr: str, max_tokens: int) -> tuple[str, str]:
+    """Split *max_tokens* between stdout and stderr, favouring stderr."""
+    out_need = estimate_tokens(stdout)
+    err_budget = min(estimate_tokens(stderr), max(max_tokens * 2 // 3, max_tokens - out_need))
+    return compact_output(stdout, max_tokens - err_budget), compact_output(stderr, err_budget)
@@ -0,0 +1,75 @@
+"""Per-task deadline budget shared by every agent.
+
+``manager.handle_task`` turns ``deadline_s`` (default TASK_DEADLINE_S) into
+an absolute ``deadline`` in epoch seconds and passes it in every request it
+makes; each stage sizes its own timeouts (LLM requests, sandbox runs,
+OpenViking waits) from what is left. Handlers read the clock with
+``ctx.time()`` so replays see the same budget; code inside ``ctx.run`` uses
+the wall clock, since a retried side effect must see the time it runs at.
+
+A side effect started after the deadline raises the TerminalError from
+``deadline_error()``; callers catch it (``is_deadline_error``) and give up
+gracefully with what they have instead of failing the invocation.
+"""
+
+import time
+
+from restate import TerminalError
+
+# A stage that starts with less than this left still gets this long
+MIN_STAGE_TIMEOUT_S = 5.0
+
+DEADLINE_EXCEEDED = "task deadline exceeded"
+
+
+def make_deadline(now: float, budget_s: float | None) -> float | None:
+    """Absolute deadline *budget_s* after *now*; None (no deadline) for 0 or less."""
+    if not budget_s or budget_s <= 0:
+        return None
+    return now + budget_s
+
+
+def remaining(deadline: float | None, now: float) -> float | None:
+    """Seconds left (negative once passed), or None without a deadline."""
+    return None if deadline is None else deadline - now
+
+
+def expired(deadline: float | None, now: float) -> bool:
+    return deadline is not None and now >= deadline
+
+
+def stage_timeout(
+    default: float | None, deadline: float | None, now: float,
+    floor: float = MIN_STAGE_TIMEOUT_S,
+) -> float | None:
+    """*default* capped at the remaining budget but never below *floor*.
+
+    A None default means "unbounded": the result is then the remaining
+    budget, or None without a deadline.
+    """
+    left = remaining(deadline, now)
+    if left is None:
+        return default
+    left = max(left, floor)
+    return left if default is None else min(default, left)
+
+
+def deadline_error() -> TerminalError:
+    return TerminalError(DEADLINE_EXCEEDED, status_code=408)
+
+
+def is_deadline_error(exc: TerminalError) -> bool:
+    """True for the error ``run_timeout`` raises (also after crossing a service call)."""
+    return exc.message == DEADLINE_EXCEEDED
+
+
+def run_timeout(default: float | None, deadline: float | None) -> float | None:
+    """``stage_timeout`` against the wall clock, for use inside ``ctx.run``.
+
+    Raises TerminalError once the deadline has passed, so Restate does not
+    keep retrying a side effect the task no longer has time for.
+    """
+    now = time.time()
+    if expired(deadline, now):
+        raise deadline_error()
+    return stage_timeout(default, deadline, now)
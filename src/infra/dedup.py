@@ -0,0 +1,84 @@
+"""Exact and near-duplicate detection for archived code.
+
+``code_hash`` ignores formatting, comments and docstrings by hashing the
+normalized AST. ``minhash`` signatures over token shingles estimate Jaccard
+similarity; ``lsh_buckets`` splits a signature into bands so candidates are
+found with an index lookup instead of comparing against every archived file.
+"""
+
+import ast
+import hashlib
+import io
+import random
+import re
+import tokenize
+
+NUM_PERM = 64
+BANDS = 8
+_SHINGLE = 5
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed permutation coefficients: signatures must be comparable across processes
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def code_hash(code: str) -> str:
+    """Hash of the code's AST without docstrings; falls back to whitespace-normalized text."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return hashlib.sha256(re.sub(r"\s+", " ", code).strip().encode()).hexdigest()
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if (
+            isinstance(node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+            and body
+            and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant)
+            and isinstance(body[0].value.value, str)
+        ):
+            node.body = body[1:] or [ast.Pass()]
+    return hashlib.sha256(ast.dump(tree, include_attributes=False).encode()).hexdigest()
+
+
+def _tokens(code: str) -> list[str]:
+    skip = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT}
+    try:
+        return [
+            tok.string
+            for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type not in skip and tok.string
+        ]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code.split()
+
+
+def minhash(code: str) -> list[int]:
+    """MinHash signature of the code's token 5-shingles."""
+    tokens = _tokens(code)
+    shingles = {
+        " ".join(tokens[i:i + _SHINGLE]) for i in range(max(1, len(tokens) - _SHINGLE + 1))
+    }
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+        for s in shingles
+    ]
+    return [min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMS]
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def lsh_buckets(signature: list[int]) -> list[str]:
+    """One bucket key per band; similar signatures share at least one bucket."""
+    rows = len(signature) // BANDS
+    return [
+        f"{band}:" + hashlib.blake2b(
+            repr(signature[band * rows:(band + 1) * rows]).encode(), digest_size=8,
+        ).hexdigest()
+        for band in range(BANDS)
+    ]
@@ -0,0 +1,170 @@
+"""Shared dependency environments for sandbox projects.
+
+Third-party imports of a project are resolved into a virtualenv whose
+directory name is a hash of the requirement set, so every project needing
+the same packages reuses one environment instead of installing from scratch.
+"""
+
+import ast
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+log = logging.getLogger(__name__)
+
+# Import names whose PyPI distribution is named differently
+_MODULE_TO_DIST = {
+    "attr": "attrs",
+    "bs4": "beautifulsoup4",
+    "Crypto": "pycryptodome",
+    "cv2": "opencv-python",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "jwt": "PyJWT",
+    "PIL": "Pillow",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "yaml": "PyYAML",
+}
+
+_READY_MARKER = ".ready"
+
+
+def imported_modules(source: str) -> set[str]:
+    """Return the top-level names of absolute imports in *source*."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return set()
+    names: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return names
+
+
+def find_requirements(project_dir: str) -> list[str]:
+    """Collect the third-party requirements of a project directory.
+
+    Explicit lines from requirements.txt are kept verbatim; imports found in
+    the project's .py files are added unless they are stdlib or local modules.
+    """
+    requirements: dict[str, str] = {}
+
+    req_path = os.path.join(project_dir, "requirements.txt")
+    if os.path.exists(req_path):
+        with open(req_path) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line and not line.startswith("-"):
+                    requirements[_dist_key(line)] = line
+
+    local: set[str] = set()
+    modules: set[str] = set()
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        if root == project_dir:
+            local.update(dirs)
+        for name in files:
+            if not name.endswith(".py"):
+                continue
+            if root == project_dir:
+                local.add(name[:-3])
+            with open(os.path.join(root, name), errors="replace") as f:
+                modules |= imported_modules(f.read())
+
+    for module in modules - local - set(sys.stdlib_module_names) - {"__future__"}:
+        dist = _MODULE_TO_DIST.get(module, module)
+        requirements.setdefault(_dist_key(dist), dist)
+
+    return sorted(requirements.values(), key=str.lower)
+
+
+def env_id(requirements: list[str]) -> str:
+    """Content hash identifying the environment for *requirements*."""
+    spec = {
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "requirements": sorted(_normalize(r) for r in requirements),
+    }
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+def env_dir(root: str, eid: str) -> str:
+    return os.path.join(root, eid)
+
+
+def ensure_env(root: str, requirements: list[str], timeout: float) -> str:
+    """Build (once) and return the id of the shared env for *requirements*.
+
+    Concurrent callers for the same requirement set serialise on a file lock;
+    everyone after the first finds the ready marker and returns immediately.
+    """
+    eid = env_id(requirements)
+    path = env_dir(root, eid)
+    if os.path.exists(os.path.join(path, _READY_MARKER)):
+        return eid
+
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, f"{eid}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(path, _READY_MARKER)):
+            return eid
+        # Leftovers of an interrupted build
+        shutil.rmtree(path, ignore_errors=True)
+        log.info("deps: building env %s for %s", eid, requirements)
+        _build_env(root, path, requirements, timeout)
+        with open(os.path.join(path, _READY_MARKER), "w") as f:
+            json.dump(requirements, f)
+    log.info("deps: env %s ready", eid)
+    return eid
+
+
+def _build_env(root: str, path: str, requirements: list[str], timeout: float) -> None:
+    """Create a virtualenv at *path* and install *requirements* into it.
+
+    uv is preferred (its global cache hardlinks installed files); otherwise a
+    venv + pip with a wheel cache shared by all environments under *root*.
+    """
+    python = os.path.join(path, "bin", "python")
+    uv = shutil.which("uv")
+    if uv:
+        commands = [
+            [uv, "venv", "--quiet", "--python", sys.executable, path],
+            [uv, "pip", "install", "--quiet", "--python", python, *requirements],
+        ]
+    else:
+        commands = [
+            [sys.executable, "-m", "venv", path],
+            [
+                python, "-m", "pip", "install", "--quiet", "--disable-pip-version-check",
+                "--cache-dir", os.path.join(root, ".pip-cache"), *requirements,
+            ],
+        ]
+    for command in commands:
+        subprocess.run(command, check=True, capture_output=True, text=True, timeout=timeout)
+
+
+def _split_name(requirement: str) -> tuple[str, str]:
+    requirement = requirement.strip()
+    name = re.split(r"[\s<>=!~;\[@]", requirement, maxsplit=1)[0]
+    return name, requirement[len(name):]
+
+
+def _dist_key(requirement: str) -> str:
+    """Canonical distribution name of a requirement line (PEP 503)."""
+    name, _ = _split_name(requirement)
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _normalize(requirement: str) -> str:
+    _, rest = _split_name(requirement)
+    return _dist_key(requirement) + rest.replace(" ", "")
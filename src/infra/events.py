@@ -0,0 +1,214 @@
+"""Per-project progress events — a Restate VirtualObject plus an SSE bridge.
+
+Agents append events with a one-way ``object_send`` to ``events/<project_id>``;
+the log keeps a sequence number so readers resume with ``read(after=seq)``.
+Each event is its own state entry, so appending costs one small write no
+matter how long the log is, and long payload fields are cut in the log.
+A project key is reused across tasks (follow-ups require it): reads without
+``after`` start at the current task's ``task_started``, or at a given
+invocation's. ``sse_app`` wraps the Restate ASGI app and serves
+``GET /sse/<project_id>`` as a Server-Sent Events stream fed from that log.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+
+from restate import Context, ObjectContext, ObjectSharedContext, VirtualObject
+
+log = logging.getLogger(__name__)
+
+events = VirtualObject("events")
+
+# Events kept per project; older ones are dropped from the log
+_MAX_EVENTS = 500
+
+# String fields (code, plan, analysis...) are cut to this many characters in
+# the log; get_status has the full partial results
+_MAX_FIELD_CHARS = 4000
+
+# The event that starts a task's stream
+START_EVENT = "task_started"
+
+# The event that ends a task's stream
+TERMINAL_EVENT = "task_finished"
+
+_SSE_PATH = re.compile(r"/sse/([^/]+)")
+_HEARTBEAT_S = 15.0
+
+
+@events.handler()
+async def publish(ctx: ObjectContext, event: dict) -> int:
+    """Append an event to this project's log.
+
+    event: {"type": str, "source": str, "data": dict}
+    returns: the event's sequence number
+    """
+    seq = (await ctx.get("seq") or 0) + 1
+    data = {k: _cap(v) for k, v in event.get("data", {}).items()}
+    entry = {
+        "seq": seq,
+        "ts": await ctx.time(),
+        "type": event["type"],
+        "source": event.get("source", ""),
+        "data": data,
+    }
+    ctx.set(f"event:{seq}", entry)
+    if seq > _MAX_EVENTS:
+        oldest = f"event:{seq - _MAX_EVENTS}"
+        dropped = await ctx.get(oldest)
+        ctx.clear(oldest)
+        # A task whose start left the window is no longer addressable by id;
+        # dropping its key keeps the state bounded on a reused project key
+        if dropped and dropped["type"] == START_EVENT and dropped["data"].get("invocation_id"):
+            ctx.clear(f"task:{dropped['data']['invocation_id']}")
+    if entry["type"] == START_EVENT:
+        ctx.set("task_start", seq)
+        if data.get("invocation_id"):
+            ctx.set(f"task:{data['invocation_id']}", seq)
+    ctx.set("seq", seq)
+    return seq
+
+
+def _cap(value):
+    if isinstance(value, str) and len(value) > _MAX_FIELD_CHARS:
+        cut = len(value) - _MAX_FIELD_CHARS
+        return f"{value[:_MAX_FIELD_CHARS]}\n... [{cut} chars truncated]"
+    return value
+
+
+@events.handler(kind="shared")
+async def read(ctx: ObjectSharedContext, req: dict | None = None) -> dict:
+    """Return events with seq > after.
+
+    req: {"after": int (optional), "invocation_id": str (optional)}
+    Without after the events start at the task_started of invocation_id (none
+    until that task has started) or, without either, of the latest task.
+    returns: {"events": [...], "last_seq": int}
+    """
+    req = req or {}
+    last_seq = await ctx.get("seq") or 0
+    after = req.get("after")
+    if after is None:
+        if req.get("invocation_id"):
+            start = await ctx.get(f"task:{req['invocation_id']}")
+        else:
+            start = await ctx.get("task_start") or 1
+        after = last_seq if start is None else start - 1
+    events_out = []
+    for seq in range(max(after, last_seq - _MAX_EVENTS) + 1, last_seq + 1):
+        entry = await ctx.get(f"event:{seq}")
+        if entry is not None:
+            events_out.append(entry)
+    return {"events": events_out, "last_seq": last_seq}
+
+
+def emit(ctx: Context, project_id: str, event_type: str, source: str, **data) -> None:
+    """Fire-and-forget an event from inside a handler (journaled, never awaited)."""
+    ctx.object_send(
+        publish, key=project_id, arg={"type": event_type, "source": source, "data": data},
+    )
+
+
+def format_sse(event: dict) -> bytes:
+    """Encode one event as an SSE message (id = seq, so clients can resume)."""
+    return (
+        f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    ).encode()
+
+
+async def _read_via_ingress(
+    project_id: str, after: int | None, invocation_id: str | None = None,
+) -> list[dict]:
+    import httpx
+
+    from src.config import cfg
+
+    body = {"after": after, "invocation_id": invocation_id}
+    async with httpx.AsyncClient(timeout=10) as client:
+        r = await client.post(
+            f"{cfg.restate_url}/events/{project_id}/read",
+            json={k: v for k, v in body.items() if v is not None},
+        )
+        r.raise_for_status()
+        return r.json()["events"]
+
+
+def sse_app(inner, read_events=_read_via_ingress, poll_interval: float = 0.5):
+    """Wrap the ASGI app *inner*, serving ``GET /sse/<project_id>`` itself.
+
+    The stream starts after ``?after=<seq>`` or the Last-Event-ID header,
+    otherwise at the task started by ``?invocation_id=<id>`` (the id /send
+    returns; the stream waits for it to start) or at the latest task, and
+    ends once the terminal event is sent or the client disconnects. Events
+    are polled from the log every *poll_interval* seconds, so one stream
+    costs one cheap shared-handler read per interval.
+    """
+
+    async def app(scope, receive, send):
+        match = _SSE_PATH.fullmatch(scope.get("path", "")) if scope["type"] == "http" else None
+        if match is None or scope["method"] != "GET":
+            await inner(scope, receive, send)
+            return
+        await _stream(scope, receive, send, match.group(1))
+
+    async def _stream(scope, receive, send, project_id: str) -> None:
+        headers = dict(scope.get("headers") or [])
+        query = parse_qs(scope.get("query_string", b"").decode())
+        after = None
+        raw_after = query.get("after", [headers.get(b"last-event-id", b"").decode()])[0]
+        if raw_after:
+            try:
+                after = int(raw_after)
+            except ValueError:
+                pass
+        invocation_id = query.get("invocation_id", [None])[0]
+
+        disconnected = asyncio.Event()
+
+        async def _watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(_watch_disconnect())
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+            ],
+        })
+        idle = 0.0
+        try:
+            while not disconnected.is_set():
+                try:
+                    batch = await read_events(project_id, after, invocation_id)
+                except Exception:
+                    log.exception("events: read failed project=%s", project_id)
+                    batch = []
+                for event in batch:
+                    await send({
+                        "type": "http.response.body", "body": format_sse(event), "more_body": True,
+                    })
+                    after = event["seq"]
+                    if event["type"] == TERMINAL_EVENT:
+                        return
+                if batch:
+                    idle = 0.0
+                elif idle >= _HEARTBEAT_S:
+                    await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+                    idle = 0.0
+                try:
+                    await asyncio.wait_for(disconnected.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    idle += poll_interval
+        finally:
+            watcher.cancel()
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    return app
@@ -0,0 +1,21 @@
+"""Normalization and fingerprints used to recognise identical tasks."""
+
+import hashlib
+import re
+import unicodedata
+
+
+def normalize_task(task: str) -> str:
+    """Canonical form of a task text: NFKC, whitespace runs collapsed, trimmed.
+
+    Case and punctuation are kept on purpose; they often change the expected
+    output ("print HELLO" vs "print hello").
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", task)).strip()
+
+
+def task_fingerprint(task: str, template: str | None = None, reference: str = "") -> str:
+    """Stable hash of a normalized task, its sandbox template and reference material."""
+    reference_hash = hashlib.sha256(reference.encode()).hexdigest() if reference else ""
+    payload = f"{normalize_task(task)}\0{template or ''}\0{reference_hash}"
+    return hashlib.sha256(payload.encode()).hexdigest()
@@ -0,0 +1,102 @@
+"""Single-flight coalescing of identical in-flight tasks.
+
+A ``flight`` VirtualObject is keyed by a task fingerprint. The first
+``handle_task`` to ``join`` a key becomes the leader and runs the workflow;
+later joiners register an awakeable and wait. ``complete`` hands the leader's
+result to every waiter and frees the key. Waiters and the leader live in
+Restate state and awakeables, so a coalesced group survives restarts.
+
+The leader holds a lease (``expires_at``, its task deadline plus a grace
+period). A leader whose invocation was killed never calls ``complete``;
+once its lease has run out the next ``join`` takes the flight over, and
+the waiters get the new leader's result. A follower that stops waiting
+(its own deadline, or the leader's lease) calls ``leave``.
+"""
+
+import logging
+
+from restate import ObjectContext, ObjectSharedContext, VirtualObject
+
+log = logging.getLogger(__name__)
+
+flight = VirtualObject("flight")
+
+# A leader past its deadline still finishes its attempt and cleans up
+LEASE_GRACE_S = 60.0
+
+
+def lease_until(deadline: float | None, now: float, lease_s: float) -> float:
+    """When a leader's lease runs out: its deadline plus a grace period, or
+    *lease_s* from *now* for a task without a deadline."""
+    if deadline is None:
+        return now + lease_s
+    return deadline + LEASE_GRACE_S
+
+
+@flight.handler()
+async def join(ctx: ObjectContext, req: dict) -> dict:
+    """Lead or follow the flight for this fingerprint.
+
+    req: {"project_id": str, "awakeable_id": str, "expires_at": float (epoch
+          seconds the caller's lease would last if it becomes the leader)}
+    returns: {"role": "leader"} or
+             {"role": "follower", "leader": project_id, "expires_at": float | None}
+    A follower's awakeable is resolved with the leader's result, or with
+    None if the leader gave up (the follower should then join again).
+    """
+    leader = await ctx.get("leader")
+    expires_at = await ctx.get("expires_at")
+    stale = expires_at is not None and await ctx.time() >= expires_at
+    if leader is None or leader == req["project_id"] or stale:
+        if stale and leader != req["project_id"]:
+            log.warning("flight: %s takes over from %s (lease expired)", req["project_id"], leader)
+        ctx.set("leader", req["project_id"])
+        ctx.set("expires_at", req.get("expires_at"))
+        # Taking over as a former follower: it no longer waits on itself
+        await _remove_waiter(ctx, req["project_id"])
+        return {"role": "leader"}
+    waiters = await ctx.get("waiters") or []
+    waiters.append({"project_id": req["project_id"], "awakeable_id": req["awakeable_id"]})
+    ctx.set("waiters", waiters)
+    log.info("flight: %s follows %s (%d waiting)", req["project_id"], leader, len(waiters))
+    return {"role": "follower", "leader": leader, "expires_at": expires_at}
+
+
+@flight.handler()
+async def leave(ctx: ObjectContext, req: dict) -> None:
+    """Stop waiting: drop the follower *project_id* from the waiter list.
+
+    req: {"project_id": str}
+    """
+    await _remove_waiter(ctx, req["project_id"])
+
+
+async def _remove_waiter(ctx: ObjectContext, project_id: str) -> None:
+    waiters = await ctx.get("waiters") or []
+    kept = [w for w in waiters if w["project_id"] != project_id]
+    if len(kept) != len(waiters):
+        ctx.set("waiters", kept)
+
+
+@flight.handler()
+async def complete(ctx: ObjectContext, req: dict) -> int:
+    """Deliver the leader's result to all waiters and clear the flight.
+
+    req: {"project_id": str, "result": dict | None}
+    returns: number of waiters released
+    """
+    if await ctx.get("leader") != req["project_id"]:
+        # A stale completion (e.g. replayed after the key was reused)
+        return 0
+    waiters = await ctx.get("waiters") or []
+    for waiter in waiters:
+        ctx.resolve_awakeable(waiter["awakeable_id"], req.get("result"))
+    ctx.clear_all()
+    return len(waiters)
+
+
+@flight.handler(kind="shared")
+async def status(ctx: ObjectSharedContext) -> dict:
+    """{"leader": project_id | None, "waiters": [project_id, ...]}"""
+    waiters = await ctx.get("waiters") or []
+    return {"leader": await ctx.get("leader"), "waiters": [w["project_id"] for w in waiters]}
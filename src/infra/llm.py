@@ -1,33 +1,756 @@
 """LLM client wrapping the Anthropic SDK for a custom-endpoint provider."""
 
+import asyncio
+import heapq
+import itertools
+import json
 import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
 
+import anthropic
 from anthropic import Anthropic
 
+from src.config import cfg
+from src.infra.compaction import estimate_tokens
+
 log = logging.getLogger(__name__)
 
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+PHASES = ("plan", "code", "test_analysis", "error_analysis")
+
+
+@dataclass(frozen=True)
+class LLMProfile:
+    """Per-phase request settings; None/empty fields use provider defaults."""
+
+    model: str
+    max_tokens: int = 4096
+    temperature: float | None = None
+    stop_sequences: tuple[str, ...] = ()
+    # Scheduling class under rate limits: lower runs first
+    priority: int = 2
+    # Max fraction of requests that may be hedged (None = LLM_HEDGE_BUDGET)
+    hedge_budget: float | None = None
+
+
+def load_profiles() -> dict[str, LLMProfile]:
+    """Build the phase → profile map from defaults plus LLM_PROFILES overrides.
+
+    The short-answer phases default to LLM_FAST_MODEL_NAME (falling back to
+    LLM_MODEL_NAME) with small output limits; the tester stops right after
+    its verdict line. Priorities let in-flight tasks finish (verdicts, then
+    fixes) before new tasks start planning. LLM_PROFILES is a JSON object
+    such as {"test_analysis": {"model": "small", "max_tokens": 256}}.
+    """
+    fast = cfg.llm_fast_model_name or cfg.llm_model_name
+    profiles = {
+        "plan": LLMProfile(cfg.llm_model_name, priority=3),
+        "code": LLMProfile(cfg.llm_model_name, priority=2),
+        "test_analysis": LLMProfile(
+            fast, max_tokens=1024, temperature=0.0,
+            stop_sequences=("VERDICT: PASS", "VERDICT: FAIL"), priority=0,
+        ),
+        "error_analysis": LLMProfile(fast, max_tokens=2048, temperature=0.0, priority=1),
+    }
+    if cfg.llm_profiles:
+        for phase, overrides in json.loads(cfg.llm_profiles).items():
+            if phase not in profiles:
+                raise ValueError(f"LLM_PROFILES: unknown phase {phase!r}, expected one of {PHASES}")
+            if "stop_sequences" in overrides:
+                overrides["stop_sequences"] = tuple(overrides["stop_sequences"])
+            profiles[phase] = replace(profiles[phase], **overrides)
+    return profiles
+
+
+class _TokenBucket:
+    """Bucket refilled continuously at *per_minute*, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: int, now: float) -> None:
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self._rate = per_minute / 60.0
+        self._last = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until *amount* is available (after a refill)."""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self._rate)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimitScheduler:
+    """Process-wide admission control for LLM requests.
+
+    Requests wait in a priority queue and are admitted strictly in
+    (priority, arrival) order once the requests/min and tokens/min buckets
+    allow it. A 429 pauses admission for everyone until its Retry-After.
+    """
+
+    def __init__(self, rpm: int, tpm: int, clock=time.monotonic) -> None:
+        now = clock()
+        self._clock = clock
+        self._requests = _TokenBucket(rpm, now) if rpm > 0 else None
+        self._tokens = _TokenBucket(tpm, now) if tpm > 0 else None
+        self._cond = threading.Condition()
+        self._queue: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+
+    def acquire(self, priority: int, tokens: int, timeout: float | None = None) -> None:
+        """Block until a request of about *tokens* tokens may be sent.
+
+        Raises TimeoutError (leaving the queue) if that takes over *timeout* seconds.
+        """
+        give_up_at = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == ticket:
+                        wait = self._wait_time(tokens)
+                        if wait <= 0:
+                            heapq.heappop(self._queue)
+                            if self._requests:
+                                self._requests.take(1)
+                            if self._tokens:
+                                self._tokens.take(tokens)
+                            self._cond.notify_all()
+                            return
+                    if give_up_at is not None:
+                        left = give_up_at - self._clock()
+                        if left <= 0:
+                            raise TimeoutError("LLM rate-limit admission timed out")
+                        wait = left if wait is None else min(wait, left)
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+
+    def try_acquire(self, priority: int, tokens: int) -> bool:
+        """Admit immediately if nobody is waiting and the buckets allow it."""
+        with self._cond:
+            if self._queue or self._wait_time(tokens) > 0:
+                return False
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(tokens)
+            return True
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Refund the unused part of a token reservation."""
+        if self._tokens and reserved > used:
+            with self._cond:
+                self._tokens.give(reserved - used)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all admissions for *seconds* (provider asked us to slow down)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def _wait_time(self, tokens: int) -> float:
+        now = self._clock()
+        wait = self._paused_until - now
+        for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+            if bucket:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+
+_scheduler: RateLimitScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """The process-wide scheduler, created from LLM_RPM / LLM_TPM on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler(cfg.llm_rpm, cfg.llm_tpm)
+        return _scheduler
+
+
+_llm_executor: ThreadPoolExecutor | None = None
+_llm_executor_lock = threading.Lock()
+
+
+def in_llm_pool(fn):
+    """Wrap blocking LLM work *fn* as an async action for ``ctx.run``.
+
+    A plain ``def`` passed to ``ctx.run`` runs on the event loop's default
+    executor, which is shared with sandbox runs, pre-flight and OpenViking
+    lookups. Rate-limit waits and retry backoff can hold an LLM call's thread
+    for a long time, so LLM calls get their own LLM_WORKERS threads instead;
+    callers beyond that wait on the event loop without holding any thread.
+    """
+    async def _run():
+        global _llm_executor
+        with _llm_executor_lock:
+            if _llm_executor is None:
+                _llm_executor = ThreadPoolExecutor(
+                    max_workers=max(cfg.llm_workers, 1), thread_name_prefix="llm",
+                )
+        return await asyncio.get_running_loop().run_in_executor(_llm_executor, fn)
+
+    return _run
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True
+    if isinstance(exc, anthropic.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    """Honor Retry-After when the provider sends it, else full-jitter backoff."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000 + random.uniform(0, 0.5)
+        if "retry-after" in headers:
+            return float(headers["retry-after"]) + random.uniform(0, 0.5)
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(60.0, 2.0 ** attempt))
+
+
+class Endpoint:
+    """One provider endpoint plus the health state the pool balances on."""
+
+    def __init__(self, base_url: str, api_key: str, weight: float = 1.0) -> None:
+        if weight <= 0:
+            raise ValueError(f"endpoint {base_url!r}: weight must be positive")
+        self.base_url = base_url
+        self.weight = weight
+        self.client = Anthropic(base_url=base_url, api_key=api_key, max_retries=0)
+        self.outstanding = 0
+        self.failures = 0
+        # Circuit open (or rate limited) until this monotonic time
+        self.open_until = 0.0
+        # A half-open circuit lets exactly one probe request through
+        self.probing = False
+
+
+class EndpointPool:
+    """Least-outstanding-requests balancing with per-endpoint circuit breakers.
+
+    An endpoint's load is outstanding / weight. After *failure_threshold*
+    consecutive transient failures its circuit opens for *cooldown_s*; then a
+    single probe request is allowed and its outcome closes or reopens it.
+    When every endpoint is open the one that recovers first is used anyway,
+    so a single-endpoint pool behaves exactly like a plain client.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        failure_threshold: int = 3,
+        cooldown_s: float = 30.0,
+        clock=time.monotonic,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self._failure_threshold = failure_threshold
+        self._cooldown_s = cooldown_s
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def acquire(self, avoid: tuple[Endpoint, ...] = ()) -> Endpoint:
+        """Pick the least loaded healthy endpoint, preferring ones not in *avoid*."""
+        with self._lock:
+            now = self._clock()
+            candidates = [e for e in self.endpoints if self._available(e, now)]
+            preferred = [e for e in candidates if e not in avoid]
+            if preferred or candidates:
+                endpoint = min(preferred or candidates, key=lambda e: (e.outstanding + 1) / e.weight)
+            else:
+                endpoint = min(self.endpoints, key=lambda e: e.open_until)
+            if endpoint.open_until and endpoint.open_until <= now:
+                endpoint.probing = True
+            endpoint.outstanding += 1
+            return endpoint
+
+    def has_alternative(self, endpoint: Endpoint) -> bool:
+        """Whether a healthy endpoint other than *endpoint* is available."""
+        with self._lock:
+            now = self._clock()
+            return any(e is not endpoint and self._available(e, now) for e in self.endpoints)
+
+    def release(self, endpoint: Endpoint, error: Exception | None = None) -> None:
+        """Return *endpoint* after a request and update its health.
+
+        Only transient errors count against the endpoint: a 400 is the
+        request's fault, not the endpoint's. A 429 takes the endpoint out of
+        rotation for its Retry-After delay without tripping the breaker.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.probing = False
+            now = self._clock()
+            if error is None:
+                endpoint.failures = 0
+                endpoint.open_until = 0.0
+            elif isinstance(error, anthropic.RateLimitError):
+                endpoint.open_until = max(endpoint.open_until, now + _retry_delay(error, 0))
+            elif _is_retryable(error):
+                endpoint.failures += 1
+                if endpoint.failures >= self._failure_threshold:
+                    endpoint.open_until = now + self._cooldown_s
+                    log.warning(
+                        "LLM endpoint %s: circuit open for %.0fs after %d failures",
+                        endpoint.base_url, self._cooldown_s, endpoint.failures,
+                    )
+            else:
+                # The endpoint answered, so it is up
+                endpoint.failures = 0
+                endpoint.open_until = 0.0
+
+    def stats(self) -> list[dict]:
+        """[{"base_url", "weight", "outstanding", "failures", "open"}]"""
+        with self._lock:
+            now = self._clock()
+            return [
+                {
+                    "base_url": e.base_url,
+                    "weight": e.weight,
+                    "outstanding": e.outstanding,
+                    "failures": e.failures,
+                    "open": e.open_until > now,
+                }
+                for e in self.endpoints
+            ]
+
+    @staticmethod
+    def _available(endpoint: Endpoint, now: float) -> bool:
+        if endpoint.open_until > now:
+            return False
+        # Half-open: only one probe at a time
+        return not (endpoint.open_until and endpoint.probing)
+
+
+def load_endpoints() -> list[Endpoint]:
+    """Endpoints from LLM_ENDPOINTS, or the single LLM_BASE_URL / LLM_API_KEY.
+
+    LLM_ENDPOINTS is a JSON list such as
+    [{"base_url": "https://a/v1", "api_key": "k1", "weight": 2}, {"base_url": "https://b/v1"}];
+    api_key defaults to LLM_API_KEY and weight to 1.
+    """
+    if not cfg.llm_endpoints:
+        return [Endpoint(cfg.llm_base_url, cfg.llm_api_key)]
+    return [
+        Endpoint(e["base_url"], e.get("api_key") or cfg.llm_api_key, float(e.get("weight", 1.0)))
+        for e in json.loads(cfg.llm_endpoints)
+    ]
+
+
+_pool: EndpointPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> EndpointPool:
+    """The process-wide endpoint pool, created from Config on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EndpointPool(
+                load_endpoints(), cfg.llm_endpoint_failure_threshold, cfg.llm_endpoint_cooldown_s,
+            )
+        return _pool
+
+
+class _Cancelled(Exception):
+    """Raised inside a streamed request that lost a hedge race."""
+
+
+class HedgeTracker:
+    """Per-phase latency window, hedge budget and hedge win-rate metrics."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._window = window
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque] = {}
+        self._stats: dict[str, dict] = {}
+
+    def record_latency(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(phase, deque(maxlen=self._window)).append(seconds)
+
+    def threshold(self, phase: str, percentile: float, min_samples: int) -> float | None:
+        """Latency at *percentile* for *phase*, or None until enough samples exist."""
+        with self._lock:
+            samples = sorted(self._latencies.get(phase, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+    def count_request(self, phase: str) -> None:
+        with self._lock:
+            self._phase_stats(phase)["requests"] += 1
+
+    def try_spend(self, phase: str, budget: float) -> bool:
+        """Reserve one hedge if *phase* is still under its budget fraction."""
+        with self._lock:
+            stats = self._phase_stats(phase)
+            if stats["hedged"] + 1 > budget * stats["requests"]:
+                return False
+            stats["hedged"] += 1
+            return True
+
+    def refund(self, phase: str) -> None:
+        """Return a reserved hedge that was not issued after all."""
+        with self._lock:
+            self._phase_stats(phase)["hedged"] -= 1
+
+    def record_win(self, phase: str) -> None:
+        with self._lock:
+            self._phase_stats(phase)["hedge_wins"] += 1
+
+    def stats(self) -> dict[str, dict]:
+        """{phase: {"requests", "hedged", "hedge_wins", "win_rate"}}"""
+        with self._lock:
+            return {
+                phase: {**s, "win_rate": s["hedge_wins"] / s["hedged"] if s["hedged"] else 0.0}
+                for phase, s in self._stats.items()
+            }
+
+    def _phase_stats(self, phase: str) -> dict:
+        return self._stats.setdefault(phase, {"requests": 0, "hedged": 0, "hedge_wins": 0})
+
+
+_hedges = HedgeTracker()
+# Only hedges run here; primaries get a thread of their own (_start_primary)
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+
+def hedge_stats() -> dict[str, dict]:
+    """Hedging metrics of this process, per phase."""
+    return _hedges.stats()
+
+
+def _start_primary(primary, cancel: threading.Event) -> Future:
+    """Run *primary* on a thread of its own, started right away.
+
+    Primaries never queue behind hedges in ``_hedge_pool``, so the hedge
+    threshold counts from when the request actually starts.
+    """
+    future: Future = Future()
+    future.set_running_or_notify_cancel()
+
+    def _run() -> None:
+        try:
+            future.set_result(primary(cancel))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name="llm-primary", daemon=True).start()
+    return future
+
+
+def _hedged_call(primary, hedge, threshold: float, allow_hedge):
+    """Run *primary*; if it is slower than *threshold*, race it against *hedge*.
+
+    Both callables take a threading.Event that asks them to abort. The first
+    successful result wins and is returned at once, even while the loser is
+    stalled between stream events; the loser is cancelled and exits on its
+    next event. If one side fails the other is still awaited. *allow_hedge*
+    is checked only once the threshold is exceeded. Returns (result, hedge_won).
+    """
+    cancel_primary = threading.Event()
+    first = _start_primary(primary, cancel_primary)
+    done, _ = wait([first], timeout=threshold)
+    if done or not allow_hedge():
+        return first.result(), False
+
+    cancel_hedge = threading.Event()
+    second = _hedge_pool.submit(hedge, cancel_hedge)
+    cancels = {first: cancel_primary, second: cancel_hedge}
+    pending = {first, second}
+    error: BaseException | None = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    cancels[other].set()
+                return future.result(), future is second
+            if error is None or future is first:
+                error = future.exception()
+    raise error
+
+
+def _stream_create(client: Anthropic, kwargs: dict, cancel: threading.Event):
+    """messages.create via streaming so a losing hedge can be aborted mid-flight."""
+    with client.messages.stream(**kwargs) as stream:
+        for _ in stream:
+            if cancel.is_set():
+                # Leaving the context manager closes the HTTP response
+                raise _Cancelled()
+        return stream.get_final_message()
+
 
 class LLMClient:
     """Thin wrapper around the Anthropic SDK that points at a custom base URL."""
 
-    def __init__(self, base_url: str, api_key: str, model: str) -> None:
-        self._client = Anthropic(base_url=base_url, api_key=api_key)
-        self._model = model
-        log.info("LLMClient initialised (model=%s, base_url=%s)", model, base_url)
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        prompt_cache: bool = False,
+        profile: LLMProfile | None = None,
+        phase: str = "default",
+        pool: EndpointPool | None = None,
+    ) -> None:
+        # Retries are ours (see _create) so they respect the shared rate limits
+        # and can fail over between endpoints
+        self._pool = pool or EndpointPool([Endpoint(base_url, api_key)])
+        # An explicit profile carries its own model
+        self._profile = profile or LLMProfile(model)
+        self._model = self._profile.model
+        self._prompt_cache = prompt_cache
+        self._phase = phase
+        self._hedge_client = None
+        if cfg.llm_hedge and cfg.llm_hedge_base_url:
+            self._hedge_client = Anthropic(
+                base_url=cfg.llm_hedge_base_url,
+                api_key=cfg.llm_hedge_api_key or api_key,
+                max_retries=0,
+            )
+        self.last_usage: dict = {}
+        log.info(
+            "LLMClient initialised (model=%s, endpoints=%s, prompt_cache=%s)",
+            self._model, [e.base_url for e in self._pool.endpoints], prompt_cache,
+        )
+
+    @classmethod
+    def for_phase(cls, phase: str) -> "LLMClient":
+        """Create a client configured with the profile for *phase*."""
+        profile = load_profiles()[phase]
+        return cls(
+            cfg.llm_base_url, cfg.llm_api_key, profile.model, cfg.llm_prompt_cache, profile, phase,
+            get_pool(),
+        )
 
-    def chat(self, system: str, user: str) -> str:
-        """Send a single-turn chat and return the assistant text."""
+    def chat(
+        self, system: str, user: str, context: str = "", timeout: float | None = None,
+    ) -> str:
+        """Send a single-turn chat and return the assistant text.
+
+        *context* is a prefix shared across calls (task spec, reference
+        material). With prompt caching enabled it and the system prompt are
+        sent as cache breakpoints so retries only pay prefill for *user*.
+        *timeout* bounds the whole call in seconds, retries included.
+        """
+        est_input = estimate_tokens(system) + estimate_tokens(context) + estimate_tokens(user)
+        log.info(
+            "LLM request  model=%s est_tokens=%d (system=%d context=%d user=%d)",
+            self._model, est_input,
+            estimate_tokens(system), estimate_tokens(context), estimate_tokens(user),
+        )
         log.debug("LLM request  model=%s system=%s user=%s", self._model, system[:80], user[:120])
         try:
-            resp = self._client.messages.create(
+            resp = self._create(
+                est_input + self._profile.max_tokens,
+                timeout,
                 model=self._model,
-                max_tokens=4096,
-                system=system,
-                messages=[{"role": "user", "content": user}],
+                max_tokens=self._profile.max_tokens,
+                **self._sampling_kwargs(),
+                **self._build_prompt(system, user, context),
+            )
+            # A response cut at a stop sequence may carry no content block at all
+            text = resp.content[0].text if resp.content else ""
+            # Stop sequences are not part of the returned text; restore the
+            # matched one so callers can still parse it (e.g. the verdict).
+            if getattr(resp, "stop_reason", None) == "stop_sequence" and isinstance(
+                getattr(resp, "stop_sequence", None), str
+            ):
+                text += resp.stop_sequence
+            self.last_usage = _usage(resp)
+            log.info(
+                "LLM usage    model=%s input=%d output=%d cache_read=%d cache_write=%d",
+                self._model, self.last_usage["input_tokens"], self.last_usage["output_tokens"],
+                self.last_usage["cache_read_input_tokens"],
+                self.last_usage["cache_creation_input_tokens"],
             )
-            text = resp.content[0].text
             log.debug("LLM response length=%d", len(text))
             return text
         except Exception:
             log.exception("LLM request failed")
             raise
+
+    def _create(self, reserve: int, timeout: float | None = None, **kwargs):
+        """messages.create under the shared scheduler, retrying transient errors.
+
+        A failed attempt is retried right away on another healthy endpoint
+        when there is one; otherwise after the usual backoff. With *timeout*
+        each request gets what is left of it and no retry starts after it.
+        """
+        scheduler = get_scheduler()
+        failed: tuple[Endpoint, ...] = ()
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        for attempt in range(cfg.llm_max_retries + 1):
+            scheduler.acquire(
+                self._profile.priority, reserve,
+                None if give_up_at is None else give_up_at - time.monotonic(),
+            )
+            if give_up_at is not None:
+                kwargs["timeout"] = max(give_up_at - time.monotonic(), 1.0)
+            endpoint = self._pool.acquire(avoid=failed)
+            try:
+                resp = self._send(reserve, kwargs, endpoint)
+            except Exception as e:
+                self._pool.release(endpoint, e)
+                scheduler.settle(reserve, 0)
+                out_of_time = give_up_at is not None and time.monotonic() >= give_up_at
+                if not _is_retryable(e) or attempt == cfg.llm_max_retries or out_of_time:
+                    raise
+                failed = (*failed, endpoint)
+                if self._pool.has_alternative(endpoint):
+                    log.warning(
+                        "LLM request failed on %s (%s), failing over, retry %d/%d",
+                        endpoint.base_url, type(e).__name__, attempt + 1, cfg.llm_max_retries,
+                    )
+                    continue
+                delay = _retry_delay(e, attempt)
+                if give_up_at is not None and time.monotonic() + delay >= give_up_at:
+                    raise
+                if isinstance(e, anthropic.RateLimitError):
+                    scheduler.pause(delay)
+                log.warning(
+                    "LLM request failed (%s), retry %d/%d in %.1fs",
+                    type(e).__name__, attempt + 1, cfg.llm_max_retries, delay,
+                )
+                time.sleep(delay)
+                failed = ()
+                continue
+            self._pool.release(endpoint)
+            usage = _usage(resp)
+            scheduler.settle(reserve, usage["input_tokens"] + usage["output_tokens"] or reserve)
+            return resp
+        raise AssertionError("unreachable")
+
+    def _send(self, reserve: int, kwargs: dict, endpoint: Endpoint):
+        """One request; with LLM_HEDGE a slow one is raced against a duplicate."""
+        if not cfg.llm_hedge:
+            return endpoint.client.messages.create(**kwargs)
+
+        _hedges.count_request(self._phase)
+        budget = self._profile.hedge_budget
+        if budget is None:
+            budget = cfg.llm_hedge_budget
+        threshold = _hedges.threshold(
+            self._phase, cfg.llm_hedge_percentile, cfg.llm_hedge_min_samples,
+        )
+        start = time.monotonic()
+        if threshold is None or budget <= 0:
+            resp = _stream_create(endpoint.client, kwargs, threading.Event())
+            _hedges.record_latency(self._phase, time.monotonic() - start)
+            return resp
+
+        def _allow_hedge() -> bool:
+            # Hedges never queue behind real work and count against rate limits
+            if not _hedges.try_spend(self._phase, budget):
+                return False
+            if not get_scheduler().try_acquire(self._profile.priority, reserve):
+                _hedges.refund(self._phase)
+                return False
+            return True
+
+        def _hedge(cancel: threading.Event):
+            if self._hedge_client is not None:
+                return _stream_create(self._hedge_client, kwargs, cancel)
+            # Prefer a different endpoint from the pool for the duplicate
+            secondary = self._pool.acquire(avoid=(endpoint,))
+            try:
+                resp = _stream_create(secondary.client, kwargs, cancel)
+            except Exception as e:
+                # Losing the race says nothing about the endpoint's health
+                self._pool.release(secondary, None if isinstance(e, _Cancelled) else e)
+                raise
+            self._pool.release(secondary)
+            return resp
+
+        resp, hedge_won = _hedged_call(
+            lambda cancel: _stream_create(endpoint.client, kwargs, cancel),
+            _hedge,
+            threshold,
+            _allow_hedge,
+        )
+        elapsed = time.monotonic() - start
+        _hedges.record_latency(self._phase, elapsed)
+        if hedge_won:
+            _hedges.record_win(self._phase)
+        if elapsed > threshold:
+            log.info(
+                "LLM hedge    phase=%s threshold=%.1fs elapsed=%.1fs hedge_won=%s",
+                self._phase, threshold, elapsed, hedge_won,
+            )
+        return resp
+
+    def _sampling_kwargs(self) -> dict:
+        kwargs: dict = {}
+        if self._profile.temperature is not None:
+            kwargs["temperature"] = self._profile.temperature
+        if self._profile.stop_sequences:
+            kwargs["stop_sequences"] = list(self._profile.stop_sequences)
+        return kwargs
+
+    def _build_prompt(self, system: str, user: str, context: str) -> dict:
+        """Return the system/messages kwargs, with cache breakpoints if enabled."""
+        if not self._prompt_cache:
+            content = f"{context}\n\n{user}" if context else user
+            return {"system": system, "messages": [{"role": "user", "content": content}]}
+
+        blocks = []
+        if context:
+            blocks.append({"type": "text", "text": context, "cache_control": _CACHE_CONTROL})
+        blocks.append({"type": "text", "text": user})
+        return {
+            "system": [{"type": "text", "text": system, "cache_control": _CACHE_CONTROL}],
+            "messages": [{"role": "user", "content": blocks}],
+        }
+
+
+def _usage(resp) -> dict:
+    """Token usage of a response; providers without caching report zeros."""
+    usage = getattr(resp, "usage", None)
+
+    def _count(name: str) -> int:
+        value = getattr(usage, name, 0)
+        return value if isinstance(value, int) else 0
+
+    return {
+        name: _count(name)
+        for name in (
+            "input_tokens",
+            "output_tokens",
+            "cache_read_input_tokens",
+            "cache_creation_input_tokens",
+        )
+    }
@@ -0,0 +1,153 @@
+"""Knowledge-store maintenance: prune unused / superseded archives, compact.
+
+``run_maintenance`` removes the OpenViking resources ``OVMeta`` marks as
+superseded or never used, forgets them in the sidecar, compacts the sidecar
+and reports disk usage before and after. The ``maintenance`` VirtualObject
+runs it durably and reschedules itself with a delayed ``object_send``; only
+the most recently scheduled chain stays alive, so starting it twice does not
+double the schedule. ``python -m src.tools.ov_maintain`` runs it offline.
+"""
+
+import logging
+import os
+from datetime import timedelta
+
+from restate import ObjectContext, ObjectSharedContext, VirtualObject
+
+log = logging.getLogger(__name__)
+
+maintenance = VirtualObject("maintenance")
+
+
+def _disk_bytes(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def store_bytes(data_path: str, meta_path: str) -> int:
+    """Bytes used by the OV store plus the sidecar database and its WAL."""
+    meta = sum(
+        _disk_bytes(meta_path + suffix)
+        for suffix in ("", "-wal", "-shm")
+        if os.path.exists(meta_path + suffix)
+    )
+    return _disk_bytes(data_path) + meta
+
+
+def run_maintenance(
+    meta,
+    client,
+    data_path: str,
+    meta_path: str,
+    *,
+    min_age_s: float,
+    dry_run: bool = False,
+    now: float | None = None,
+) -> dict:
+    """One prune + compact pass.
+
+    meta: an ``OVMeta``; client: an initialised ``OVClient`` (unused on dry runs)
+    returns: {"candidates": [{"uri", "reason"}], "pruned": [uri], "failed": [uri],
+              "bytes_before": int, "bytes_after": int, "dry_run": bool}
+    """
+    bytes_before = store_bytes(data_path, meta_path)
+    candidates = meta.prune_candidates(min_age_s, now)
+    pruned: list[str] = []
+    failed: list[str] = []
+    if not dry_run:
+        for candidate in candidates:
+            try:
+                client.remove(candidate["uri"])
+            except Exception:
+                # Keep tracking it so the next pass retries
+                log.exception("maintenance: removing %s failed", candidate["uri"])
+                failed.append(candidate["uri"])
+                continue
+            meta.forget(candidate["uri"])
+            pruned.append(candidate["uri"])
+        meta.compact()
+    report = {
+        "candidates": candidates,
+        "pruned": pruned,
+        "failed": failed,
+        "bytes_before": bytes_before,
+        "bytes_after": store_bytes(data_path, meta_path),
+        "dry_run": dry_run,
+    }
+    log.info(
+        "maintenance: %d candidates, %d pruned, %d failed, %d -> %d bytes%s",
+        len(candidates), len(pruned), len(failed), report["bytes_before"],
+        report["bytes_after"], " (dry run)" if dry_run else "",
+    )
+    return report
+
+
+@maintenance.handler()
+async def run(ctx: ObjectContext, req: dict | None = None) -> dict:
+    """Run one maintenance pass and schedule the next.
+
+    req: {"dry_run": bool, "min_age_days": float, "interval_s": float}
+    Defaults come from OV_PRUNE_MIN_AGE_DAYS / OV_MAINTENANCE_INTERVAL_S;
+    interval_s=0 runs once and stops any existing schedule.
+    returns: the run_maintenance report, or {"skipped": ...} for a stale schedule
+    """
+    from src.config import cfg
+
+    req = dict(req or {})
+    token = req.pop("token", None)
+    if token is not None and token != await ctx.get("token"):
+        # A later manual start replaced the chain this call belongs to
+        return {"skipped": "superseded schedule"}
+
+    min_age_s = float(req.get("min_age_days", cfg.ov_prune_min_age_days)) * 86400
+    dry_run = bool(req.get("dry_run", False))
+
+    def _pass():
+        from src.infra.ov_client import OVClient
+        from src.infra.ov_meta import OVMeta
+
+        meta = OVMeta(cfg.ov_meta_path)
+        client = None
+        try:
+            if not dry_run:
+                client = OVClient(cfg.ov_data_path)
+                client.init()
+            return run_maintenance(
+                meta, client, cfg.ov_data_path, cfg.ov_meta_path,
+                min_age_s=min_age_s, dry_run=dry_run,
+            )
+        finally:
+            meta.close()
+            if client is not None:
+                client.close()
+
+    report = await ctx.run("ov_maintenance", _pass)
+    report["ran_at"] = await ctx.time()
+    ctx.set("last_report", report)
+
+    interval_s = float(req.get("interval_s", cfg.ov_maintenance_interval_s))
+    if interval_s > 0:
+        next_token = str(ctx.uuid())
+        ctx.set("token", next_token)
+        ctx.object_send(
+            run, key=ctx.key(), arg={**req, "token": next_token},
+            send_delay=timedelta(seconds=interval_s),
+        )
+        report["next_run_in_s"] = interval_s
+    else:
+        ctx.clear("token")
+    return report
+
+
+@maintenance.handler(kind="shared")
+async def last_report(ctx: ObjectSharedContext) -> dict | None:
+    """The report of the most recent pass (None before the first one)."""
+    return await ctx.get("last_report")
@@ -3,7 +3,9 @@
 import json
 import logging
 import os
+import random
 import tempfile
+import time
 from pathlib import Path
 
 import openviking as ov
@@ -12,6 +14,9 @@ from src.config import cfg
 
 log = logging.getLogger(__name__)
 
+# add_many tries each add_resource this many times before giving up on it
+_QUEUE_ATTEMPTS = 5
+
 # Default ov.conf location used by the SDK
 _OV_CONF_DIR = Path.home() / ".openviking"
 _OV_CONF_PATH = _OV_CONF_DIR / "ov.conf"
@@ -66,15 +71,18 @@ class OVClient:
         log.info("OVClient.init — initialising index")
         self._client.initialize()
 
-    def add(self, content: str, uri: str) -> None:
-        """Persist *content* as a knowledge resource under *uri*."""
+    def add(self, content: str, uri: str, timeout: float = 60) -> None:
+        """Persist *content* as a knowledge resource under *uri*.
+
+        Waits up to *timeout* seconds for OpenViking to process it.
+        """
         log.info("OVClient.add uri=%s length=%d", uri, len(content))
         fd, temp_path = tempfile.mkstemp(suffix=".py")
         try:
             with os.fdopen(fd, "w") as f:
                 f.write(content)
             self._client.add_resource(path=temp_path, target=uri)
-            self._client.wait_processed(timeout=60)
+            self._client.wait_processed(timeout=timeout)
             log.debug("OVClient.add — resource processed")
         except Exception:
             log.exception("OVClient.add failed for uri=%s", uri)
@@ -82,22 +90,77 @@ class OVClient:
         finally:
             os.unlink(temp_path)
 
+    def add_many(
+        self, docs: list[tuple[str, str]], workers: int = 4, timeout: float = 600,
+    ) -> list[str]:
+        """Queue several (content, uri) resources, then wait for processing once.
+
+        add_resource calls run on up to *workers* threads; the temp files stay
+        on disk until wait_processed returns. Returns the uris that failed to
+        queue; a wait_processed failure raises.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        log.info("OVClient.add_many docs=%d workers=%d", len(docs), workers)
+        failed: list[str] = []
+        with tempfile.TemporaryDirectory(prefix="ov_add_") as tmp:
+
+            def _queue(i: int, content: str, uri: str) -> None:
+                # One directory per doc keeps the uri's file name on disk
+                name = uri.rstrip("/").rsplit("/", 1)[-1]
+                if not os.path.splitext(name)[1]:
+                    name += ".py"
+                os.makedirs(os.path.join(tmp, str(i)))
+                path = os.path.join(tmp, str(i), name)
+                with open(path, "w") as f:
+                    f.write(content)
+                for attempt in range(_QUEUE_ATTEMPTS):
+                    try:
+                        self._client.add_resource(path=path, target=uri)
+                        return
+                    except Exception as e:
+                        error = e
+                        # Concurrent adds can collide on OpenViking's path locks
+                        if attempt + 1 < _QUEUE_ATTEMPTS:
+                            time.sleep(0.2 * (attempt + 1) * (0.5 + random.random()))
+                log.error("OVClient.add_many failed to queue uri=%s: %s", uri, error)
+                failed.append(uri)
+
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for i, (content, uri) in enumerate(docs):
+                    pool.submit(_queue, i, content, uri)
+            self._client.wait_processed(timeout=timeout)
+        return failed
+
+    def find(self, query: str, limit: int = 3) -> list[str]:
+        """Vector search; URIs of the best matching resources, best first."""
+        log.info("OVClient.find query=%s", query[:80])
+        results = self._client.find(query, limit=limit)
+        return [r.uri for r in results.resources]
+
+    def overview(self, uri: str) -> str:
+        """L1 overview of the resource at *uri* ("" if it has none)."""
+        return self._client.overview(uri) or ""
+
     def retrieve(self, query: str) -> str:
         """Search the knowledge base and return an L1 overview of the best hit."""
-        log.info("OVClient.retrieve query=%s", query[:80])
         try:
-            results = self._client.find(query, limit=3)
-            if not results.resources:
+            uris = self.find(query)
+            if not uris:
                 log.debug("OVClient.retrieve — no results")
                 return ""
-            best = results.resources[0]
-            overview = self._client.overview(best.uri)
-            log.debug("OVClient.retrieve — hit uri=%s overview_len=%d", best.uri, len(overview or ""))
-            return overview or ""
+            overview = self.overview(uris[0])
+            log.debug("OVClient.retrieve — hit uri=%s overview_len=%d", uris[0], len(overview))
+            return overview
         except Exception:
             log.exception("OVClient.retrieve failed")
             raise
 
+    def remove(self, uri: str) -> None:
+        """Delete the resource at *uri* (and anything under it) from the store."""
+        log.info("OVClient.remove uri=%s", uri)
+        self._client.rm(uri, recursive=True)
+
     def close(self) -> None:
         log.info("OVClient.close")
         self._client.close()
@@ -0,0 +1,262 @@
+"""Local SQLite sidecar to the OpenViking store.
+
+Holds what OpenViking itself cannot answer cheaply: an exact task-fingerprint
+index of archived solutions, content hashes / MinHash signatures of archived
+code so duplicates are linked instead of re-embedded, an FTS5 (BM25)
+index over task descriptions and code for local first-stage retrieval, and
+per-URI usage (retrieval hits, superseded archives) for pruning. Every
+``ctx.run`` opens its own connection; WAL mode lets concurrent handlers read
+while one writes.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from src.infra import dedup
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    fingerprint TEXT PRIMARY KEY,
+    task        TEXT NOT NULL,
+    uri         TEXT NOT NULL,
+    code        TEXT NOT NULL,
+    verdict     TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    uri           TEXT PRIMARY KEY,
+    content_hash  TEXT NOT NULL,
+    signature     TEXT NOT NULL,
+    -- NULL for a resource stored in OpenViking, else the resource it duplicates
+    canonical_uri TEXT,
+    created_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_hash ON resources (content_hash);
+CREATE TABLE IF NOT EXISTS lsh (
+    bucket TEXT NOT NULL,
+    uri    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_bucket ON lsh (bucket);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5 (uri UNINDEXED, task, code);
+CREATE TABLE IF NOT EXISTS hits (
+    uri      TEXT PRIMARY KEY,
+    count    INTEGER NOT NULL,
+    last_hit REAL NOT NULL
+);
+-- Archives a newer solution for the same task fingerprint replaced
+CREATE TABLE IF NOT EXISTS superseded (
+    uri         TEXT PRIMARY KEY,
+    replaced_by TEXT NOT NULL,
+    at          REAL NOT NULL
+);
+"""
+
+# Where manager archives generated programs; only these can be pruned as unused,
+# library docs bulk-imported by ov_import are kept however rarely they are hit
+ARCHIVE_PREFIX = "viking://code/"
+
+# bm25() column weights (uri, task, code): task wording matters most
+_BM25_WEIGHTS = "0.0, 2.0, 1.0"
+
+
+class OVMeta:
+    """Sidecar index kept next to the OpenViking store."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def lookup_solution(self, fingerprint: str) -> dict | None:
+        """Archived solution for a task fingerprint: {"task", "uri", "code", "verdict", ...}."""
+        row = self._db.execute(
+            "SELECT * FROM solutions WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def record_solution(
+        self, fingerprint: str, task: str, uri: str, code: str, verdict: str = "pass",
+    ) -> None:
+        """Insert or replace the solution for *fingerprint*."""
+        previous = self.lookup_solution(fingerprint)
+        with self._db:
+            if previous and previous["uri"] != uri:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO superseded VALUES (?, ?, ?)",
+                    (previous["uri"], uri, time.time()),
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint, task, uri, code, verdict, time.time()),
+            )
+        log.info("OVMeta.record_solution uri=%s verdict=%s", uri, verdict)
+
+    def set_verdict(self, fingerprint: str, verdict: str) -> None:
+        """Update the verdict of a recalled solution after it was re-tested."""
+        with self._db:
+            self._db.execute(
+                "UPDATE solutions SET verdict = ?, updated_at = ? WHERE fingerprint = ?",
+                (verdict, time.time(), fingerprint),
+            )
+
+    def find_duplicate(self, code: str, threshold: float) -> tuple[str | None, str, list[int]]:
+        """Look for an archived resource identical or near-identical to *code*.
+
+        Returns (canonical uri or None, content hash, signature); pass the
+        last two to record_resource. Exact matches are found by normalized-AST
+        hash, near duplicates via MinHash LSH buckets and an estimated Jaccard
+        similarity of at least *threshold*.
+        """
+        content_hash = dedup.code_hash(code)
+        signature = dedup.minhash(code)
+        row = self._db.execute(
+            "SELECT uri, canonical_uri FROM resources WHERE content_hash = ? LIMIT 1",
+            (content_hash,),
+        ).fetchone()
+        if row:
+            return row["canonical_uri"] or row["uri"], content_hash, signature
+
+        buckets = dedup.lsh_buckets(signature)
+        candidates = self._db.execute(
+            "SELECT DISTINCT r.uri, r.signature FROM lsh JOIN resources r ON r.uri = lsh.uri "
+            f"WHERE lsh.bucket IN ({','.join('?' * len(buckets))}) AND r.canonical_uri IS NULL",
+            buckets,
+        ).fetchall()
+        best, best_score = None, threshold
+        for candidate in candidates:
+            score = dedup.similarity(signature, json.loads(candidate["signature"]))
+            if score >= best_score:
+                best, best_score = candidate["uri"], score
+        return best, content_hash, signature
+
+    def record_resource(
+        self,
+        uri: str,
+        content_hash: str,
+        signature: list[int],
+        canonical_uri: str | None = None,
+    ) -> None:
+        """Register archived code; duplicates carry the canonical resource's uri."""
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?)",
+                (uri, content_hash, json.dumps(signature), canonical_uri, time.time()),
+            )
+            self._db.execute("DELETE FROM lsh WHERE uri = ?", (uri,))
+            if canonical_uri is None:
+                # Only canonical resources are candidates for later matches
+                self._db.executemany(
+                    "INSERT INTO lsh VALUES (?, ?)",
+                    [(bucket, uri) for bucket in dedup.lsh_buckets(signature)],
+                )
+        log.info("OVMeta.record_resource uri=%s canonical=%s", uri, canonical_uri)
+
+    def index_document(self, uri: str, task: str, code: str) -> None:
+        """Add archived code and the task it solved to the lexical index."""
+        with self._db:
+            self._db.execute("DELETE FROM docs WHERE uri = ? AND task = ?", (uri, task))
+            self._db.execute("INSERT INTO docs VALUES (?, ?, ?)", (uri, task, code))
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """BM25 search over indexed tasks and code, best first.
+
+        returns: [{"uri", "task", "code", "score"}] (higher score is better),
+        at most one entry per uri
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+        rows = self._db.execute(
+            f"SELECT uri, task, code, bm25(docs, {_BM25_WEIGHTS}) AS rank FROM docs "
+            "WHERE docs MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit * 3),
+        ).fetchall()
+        hits: dict[str, dict] = {}
+        for row in rows:
+            if row["uri"] not in hits:
+                hits[row["uri"]] = {
+                    "uri": row["uri"], "task": row["task"], "code": row["code"],
+                    "score": -row["rank"],
+                }
+        return list(hits.values())[:limit]
+
+    def record_hit(self, uri: str) -> None:
+        """Count one retrieval or recall of *uri*."""
+        with self._db:
+            self._db.execute(
+                "INSERT INTO hits VALUES (?, 1, ?) "
+                "ON CONFLICT (uri) DO UPDATE SET count = count + 1, last_hit = excluded.last_hit",
+                (uri, time.time()),
+            )
+
+    def hit_count(self, uri: str) -> int:
+        row = self._db.execute("SELECT count FROM hits WHERE uri = ?", (uri,)).fetchone()
+        return row["count"] if row else 0
+
+    def prune_candidates(self, min_age_s: float, now: float | None = None) -> list[dict]:
+        """Archived resources worth removing from OpenViking, as [{"uri", "reason"}].
+
+        - "superseded": replaced by a newer archive of the same task and no
+          longer referenced by any solution
+        - "unused": an archived program under ARCHIVE_PREFIX, stored (not a
+          duplicate link), older than *min_age_s* and never retrieved or recalled
+        Only resources registered here are considered; anything added to the
+        store by other means is left alone.
+        """
+        cutoff = (time.time() if now is None else now) - min_age_s
+        superseded = self._db.execute(
+            "SELECT uri FROM superseded "
+            "WHERE uri NOT IN (SELECT uri FROM solutions) ORDER BY at"
+        ).fetchall()
+        unused = self._db.execute(
+            "SELECT uri FROM resources WHERE canonical_uri IS NULL AND created_at < ? "
+            "AND uri NOT IN (SELECT uri FROM hits) ORDER BY created_at",
+            (cutoff,),
+        ).fetchall()
+        candidates = [{"uri": r["uri"], "reason": "superseded"} for r in superseded]
+        seen = {c["uri"] for c in candidates}
+        candidates += [
+            {"uri": r["uri"], "reason": "unused"} for r in unused
+            if r["uri"].startswith(ARCHIVE_PREFIX) and r["uri"] not in seen
+        ]
+        return candidates
+
+    def forget(self, uri: str) -> None:
+        """Drop every trace of a pruned resource, including duplicates linked to it.
+
+        Solutions pointing at it go too: left behind, the next archive of the
+        same task would mark the removed URI superseded and prune it again.
+        """
+        with self._db:
+            linked = [uri] + [
+                r["uri"] for r in self._db.execute(
+                    "SELECT uri FROM resources WHERE canonical_uri = ?", (uri,),
+                )
+            ]
+            for u in linked:
+                self._db.execute("DELETE FROM resources WHERE uri = ?", (u,))
+                self._db.execute("DELETE FROM lsh WHERE uri = ?", (u,))
+                self._db.execute("DELETE FROM solutions WHERE uri = ?", (u,))
+            self._db.execute("DELETE FROM docs WHERE uri = ?", (uri,))
+            self._db.execute("DELETE FROM hits WHERE uri = ?", (uri,))
+            self._db.execute("DELETE FROM superseded WHERE uri = ?", (uri,))
+        log.info("OVMeta.forget uri=%s links=%d", uri, len(linked) - 1)
+
+    def compact(self) -> None:
+        """Merge FTS segments, fold the WAL back and VACUUM the database file."""
+        with self._db:
+            self._db.execute("INSERT INTO docs (docs) VALUES ('optimize')")
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._db.execute("VACUUM")
+
+    def close(self) -> None:
+        self._db.close()
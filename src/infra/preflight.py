@@ -0,0 +1,176 @@
+"""Local static checks on generated code, run before spending a sandbox run.
+
+``check`` reports syntax and compile errors: the program cannot run at all,
+so the sandbox run is skipped. ``advisories`` reports likely runtime failures
+— names that are never bound anywhere and ``from <stdlib module> import
+<missing name>`` — as hints only: a program can legitimately use an unbound
+name (e.g. to demonstrate a NameError), so these never stop it from running.
+The name check is conservative (a name bound in any scope counts as
+defined), and stdlib modules are never imported here; names are only
+checked against modules the process has already loaded.
+"""
+
+import ast
+import builtins
+import importlib.util
+import sys
+
+# Module attributes every script can reference
+_MODULE_NAMES = {
+    "__name__", "__file__", "__doc__", "__builtins__", "__spec__",
+    "__loader__", "__package__", "__annotations__", "__path__", "__cached__",
+    # Implicit closure cell inside methods
+    "__class__",
+    # Implicit in class bodies
+    "__module__", "__qualname__",
+}
+
+# Handlers under which loading an unbound name is expected behaviour
+_CATCHES_NAME_ERROR = {"NameError", "Exception", "BaseException"}
+
+# except* blocks (3.11+)
+_TRY_STAR = (ast.TryStar,) if hasattr(ast, "TryStar") else ()
+
+# PEP 695 type parameters (3.12+)
+_TYPE_PARAMS = tuple(
+    getattr(ast, name) for name in ("TypeVar", "ParamSpec", "TypeVarTuple") if hasattr(ast, name)
+)
+
+# Stdlib packages whose __init__ has side effects (or a GUI); find_spec of a
+# submodule would import them
+_NO_IMPORT = {"antigravity", "this", "turtle", "turtledemo", "tkinter", "idlelib", "__main__"}
+
+
+def check(code: str, filename: str = "main.py") -> list[str]:
+    """Syntax / compile errors in *code* as "file:line: message" (empty if it compiles)."""
+    try:
+        tree = ast.parse(code, filename)
+        compile(tree, filename, "exec")
+    except SyntaxError as e:
+        return [f"{filename}:{e.lineno}: SyntaxError: {e.msg}"]
+    except ValueError as e:
+        return [f"{filename}: {e}"]
+    return []
+
+
+def advisories(code: str, filename: str = "main.py") -> list[str]:
+    """Likely runtime failures in *code* that compiles; empty if it does not."""
+    try:
+        tree = ast.parse(code, filename)
+    except (SyntaxError, ValueError):
+        return []
+    return _undefined_names(tree, filename) + _missing_stdlib_imports(tree, filename)
+
+
+def _bound_names(tree: ast.AST) -> set[str]:
+    """Every name bound anywhere in *tree*, regardless of scope."""
+    names: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+        elif _TYPE_PARAMS and isinstance(node, _TYPE_PARAMS):
+            names.add(node.name)
+    return names
+
+
+def _undefined_names(tree: ast.AST, filename: str) -> list[str]:
+    for node in ast.walk(tree):
+        # Star imports and dynamic namespaces make any name potentially defined
+        if isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names):
+            return []
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in (
+            "exec", "globals", "locals", "vars", "__import__",
+        ):
+            return []
+
+    known = _bound_names(tree) | set(dir(builtins)) | _MODULE_NAMES
+    guarded = _guarded_loads(tree)
+    problems = []
+    seen: set[str] = set()
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Name)
+            and isinstance(node.ctx, ast.Load)
+            and node.id not in known
+            and node.id not in seen
+            and id(node) not in guarded
+        ):
+            seen.add(node.id)
+            problems.append(f"{filename}:{node.lineno}: undefined name {node.id!r}")
+    return sorted(problems, key=lambda p: int(p.split(":")[1]))
+
+
+def _guarded_loads(tree: ast.AST) -> set[int]:
+    """ids of Name nodes inside try bodies whose handlers catch NameError."""
+    guarded: set[int] = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Try, *_TRY_STAR)):
+            continue
+        if not any(_catches_name_error(h.type) for h in node.handlers):
+            continue
+        for stmt in node.body:
+            guarded.update(id(n) for n in ast.walk(stmt) if isinstance(n, ast.Name))
+    return guarded
+
+
+def _catches_name_error(handler_type: ast.expr | None) -> bool:
+    if handler_type is None:
+        return True
+    types = handler_type.elts if isinstance(handler_type, ast.Tuple) else [handler_type]
+    return any(isinstance(t, ast.Name) and t.id in _CATCHES_NAME_ERROR for t in types)
+
+
+def _missing_stdlib_imports(tree: ast.AST, filename: str) -> list[str]:
+    problems = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                top = alias.name.split(".")[0]
+                # Plain top-level stdlib imports always resolve; check dotted ones
+                if "." not in alias.name or top not in sys.stdlib_module_names or top in _NO_IMPORT:
+                    continue
+                if not _find_submodule(alias.name):
+                    problems.append(f"{filename}:{node.lineno}: no module named {alias.name!r}")
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            top = node.module.split(".")[0]
+            if top not in sys.stdlib_module_names or top in _NO_IMPORT:
+                continue
+            if not _find_submodule(node.module):
+                problems.append(f"{filename}:{node.lineno}: no module named {node.module!r}")
+                continue
+            # Never import here: only modules this process already loaded are inspected
+            module = sys.modules.get(node.module)
+            if module is None:
+                continue
+            for alias in node.names:
+                if alias.name == "*" or hasattr(module, alias.name):
+                    continue
+                if _find_submodule(f"{node.module}.{alias.name}"):
+                    continue
+                problems.append(
+                    f"{filename}:{node.lineno}: cannot import name {alias.name!r} "
+                    f"from {node.module!r}"
+                )
+    return problems
+
+
+def _find_submodule(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
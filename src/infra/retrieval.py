@@ -0,0 +1,132 @@
+"""Hybrid retrieval: local BM25 first stage fused with OpenViking vector search.
+
+The lexical index in ``OVMeta`` answers without a network round trip. When
+its best hit already covers the query's terms the vector search is skipped;
+otherwise it runs with a timeout and both rankings are merged with reciprocal
+rank fusion. A slow or failing embedding endpoint degrades to lexical-only.
+Opening the store is not part of the timeout (``init()`` grows with the
+store), and searches run on a small shared pool so searches that hang after
+timing out cannot pile up threads.
+"""
+
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+# Reciprocal rank fusion constant (the usual k=60 from the RRF paper)
+RRF_K = 60
+
+# Archived code used as a reference is cut to this many characters
+MAX_REFERENCE_CHARS = 4000
+
+# (query) -> (uris best first, {uri: overview} for the uris it fetched)
+VectorSearch = Callable[[str], tuple[list[str], dict[str, str]]]
+
+# Opens the store behind a VectorSearch; returns the function that closes it
+OpenStore = Callable[[], Callable[[], None]]
+
+# Searches still running after their timeout keep a thread until they finish;
+# beyond this many, new searches queue (and time out) instead of adding threads
+_SEARCH_WORKERS = 4
+_search_pool = ThreadPoolExecutor(max_workers=_SEARCH_WORKERS, thread_name_prefix="vector-search")
+
+
+def rrf_fuse(*rankings: list[str], k: int = RRF_K) -> list[str]:
+    """Merge ranked URI lists by reciprocal rank fusion, best first."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, uri in enumerate(ranking, start=1):
+            scores[uri] = scores.get(uri, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda uri: -scores[uri])
+
+
+def coverage(query: str, text: str) -> float:
+    """Fraction of the query's distinct terms that occur in *text*."""
+    terms = set(re.findall(r"\w+", query.lower()))
+    if not terms:
+        return 0.0
+    return len(terms & set(re.findall(r"\w+", text.lower()))) / len(terms)
+
+
+def _local_reference(hit: dict) -> str:
+    return f"# Archived solution for: {hit['task']}\n{hit['code'][:MAX_REFERENCE_CHARS]}"
+
+
+def hybrid_retrieve(
+    query: str,
+    local_hits: list[dict],
+    vector_search: VectorSearch,
+    *,
+    strong_coverage: float = 0.8,
+    vector_timeout_s: float = 5.0,
+    open_store: OpenStore | None = None,
+) -> dict:
+    """Pick the reference for *query*.
+
+    local_hits: ``OVMeta.search`` results, best first
+    open_store: called before the timed search, only when it is needed; the
+        close function it returns runs once the search has finished, even
+        if that is after the timeout
+    returns: {"reference": str, "source": "local" | "vector" | "hybrid" | "none",
+              "uri": str | None}
+    """
+    if local_hits and coverage(query, local_hits[0]["task"]) >= strong_coverage:
+        return {"reference": _local_reference(local_hits[0]), "source": "local",
+                "uri": local_hits[0]["uri"]}
+
+    vector_uris: list[str] = []
+    overviews: dict[str, str] = {}
+    close: Callable[[], None] | None = None
+    opened = True
+    if open_store is not None:
+        try:
+            close = open_store()
+        except Exception:
+            log.exception("retrieval: opening the vector store failed, using local hits")
+            opened = False
+    if opened:
+        abandoned = threading.Event()
+
+        def _search():
+            try:
+                if abandoned.is_set():
+                    # Timed out while queued behind hung searches
+                    return [], {}
+                return vector_search(query)
+            finally:
+                if close is not None:
+                    close()
+
+        try:
+            # Never wait for a hung search; it finishes (and cleans up) on its own
+            vector_uris, overviews = _search_pool.submit(_search).result(
+                timeout=vector_timeout_s,
+            )
+        except FutureTimeout:
+            abandoned.set()
+            log.warning("retrieval: vector search timed out after %.1fs, using local hits",
+                        vector_timeout_s)
+        except Exception:
+            log.exception("retrieval: vector search failed, using local hits")
+
+    local = {hit["uri"]: hit for hit in local_hits}
+    for uri in rrf_fuse([hit["uri"] for hit in local_hits], vector_uris):
+        if overviews.get(uri):
+            reference = overviews[uri]
+        elif uri in local:
+            reference = _local_reference(local[uri])
+        else:
+            continue
+        if not vector_uris:
+            source = "local"
+        elif not local_hits:
+            source = "vector"
+        else:
+            source = "hybrid"
+        return {"reference": reference, "source": source, "uri": uri}
+    return {"reference": "", "source": "none", "uri": None}
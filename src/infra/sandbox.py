@@ -1,10 +1,24 @@
 """Sandbox manager — a stateless Restate Service for local file & process ops."""
 
+import asyncio
+import fcntl
 import logging
 import os
+import re
+import shutil
+import signal
+import stat
 import subprocess
+import tempfile
+import threading
+import time
+import uuid
 
-from restate import Context, Service
+from restate import Context, Service, TerminalError
+
+from src.config import cfg
+from src.infra import deps
+from src.infra.deadline import stage_timeout
 
 log = logging.getLogger(__name__)
 
@@ -12,18 +26,54 @@ sandbox = Service("sandbox")
 
 _BASE = "/tmp/lbg"
 
+# Linux ioctl request that clones a whole file by sharing its data extents
+# (supported on btrfs, XFS, overlayfs-on-XFS, ...).
+_FICLONE = 0x40049409
+
+# Marker file flagging a project whose task has completed; such projects are
+# evicted by the reaper after SANDBOX_TTL_S or earlier under quota pressure.
+_FINISHED_MARKER = ".lbg_finished"
+
+# Per-exec output logs (tail_output reads them while the command runs)
+_EXEC_LOG_DIR = ".lbg_exec"
+
 
 @sandbox.handler()
-async def create_project(ctx: Context, project_id: str) -> dict:
-    """Create a project directory under /tmp/lbg/<project_id>."""
+async def create_project(ctx: Context, req: str | dict) -> dict:
+    """Create a project directory under /tmp/lbg/<project_id>.
+
+    req: "project_id" or {"project_id": str, "template": str (optional)}
+    When a template is given its files are cloned into the project directory.
+    """
+    if isinstance(req, str):
+        req = {"project_id": req}
+    project_id = req["project_id"]
+    template = req.get("template")
     base = f"{_BASE}/{project_id}"
 
-    async def _create():
+    template_dir = _template_dir(template) if template else None
+
+    # Plain function: copying a large template blocks, so Restate runs it in
+    # a worker thread
+    def _create():
+        if template_dir and not os.path.isdir(template_dir):
+            raise TerminalError(f"unknown sandbox template: {template}")
         os.makedirs(base, exist_ok=True)
-        return {"project_id": project_id, "path": base}
+        files = 0
+        if template_dir:
+            files = _materialize_template(template_dir, base, cfg.sandbox_clone_mode)
+        # A re-used project key is active again
+        marker = os.path.join(base, _FINISHED_MARKER)
+        if os.path.exists(marker):
+            os.unlink(marker)
+        _touch(base)
+        return {"project_id": project_id, "path": base, "template": template, "files": files}
 
     result = await ctx.run("create_project", _create)
-    log.info("sandbox.create_project id=%s path=%s", project_id, base)
+    log.info(
+        "sandbox.create_project id=%s path=%s template=%s files=%d",
+        project_id, base, template, result["files"],
+    )
     return result
 
 
@@ -36,9 +86,8 @@ async def write_file(ctx: Context, req: dict) -> dict:
     path = f"{_BASE}/{project_id}/{filename}"
 
     async def _write():
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as f:
-            f.write(content)
+        _atomic_write(path, content)
+        _touch(f"{_BASE}/{project_id}")
         return path
 
     written = await ctx.run("write_file", _write)
@@ -62,27 +111,498 @@ async def read_file(ctx: Context, req: dict) -> dict:
     return {"content": content}
 
 
+@sandbox.handler()
+async def prepare_env(ctx: Context, req: dict) -> dict:
+    """Resolve a project's third-party imports into a shared virtualenv.
+
+    req: {"project_id": str, "deadline": float (optional, epoch seconds)}
+    returns: {"env_id": str | None, "requirements": list[str], "error": str}
+    env_id is None when the project needs no third-party packages or the
+    install failed (the run then surfaces the ImportError as a normal failure).
+    """
+    project_id = req["project_id"]
+    base = f"{_BASE}/{project_id}"
+    install_timeout = cfg.sandbox_env_install_timeout_s
+    if req.get("deadline"):
+        install_timeout = stage_timeout(install_timeout, req["deadline"], await ctx.time())
+
+    # Plain function: scanning imports, the env lock and a pip install can take
+    # minutes, so Restate runs it in a worker thread instead of the event loop
+    def _prepare():
+        requirements = deps.find_requirements(base)
+        if not requirements:
+            return {"env_id": None, "requirements": [], "error": ""}
+        try:
+            eid = deps.ensure_env(cfg.sandbox_envs_path, requirements, install_timeout)
+            return {"env_id": eid, "requirements": requirements, "error": ""}
+        except subprocess.CalledProcessError as e:
+            error = (e.stderr or str(e))[-2000:]
+        except subprocess.TimeoutExpired:
+            error = f"dependency install timed out after {install_timeout:.0f}s"
+        log.warning("sandbox.prepare_env failed project=%s: %s", project_id, error)
+        return {"env_id": None, "requirements": requirements, "error": error}
+
+    result = await ctx.run("prepare_env", _prepare)
+    log.info(
+        "sandbox.prepare_env project=%s env=%s requirements=%s",
+        project_id, result["env_id"], result["requirements"],
+    )
+    return result
+
+
 @sandbox.handler()
 async def exec_command(ctx: Context, req: dict) -> dict:
-    """Execute a shell command inside the project sandbox."""
+    """Execute a shell command inside the project sandbox.
+
+    req: {"project_id": str, "command": str, "env_id": str (optional),
+          "timeout": float (optional, default SANDBOX_EXEC_TIMEOUT_S),
+          "abort_patterns": [regex] (optional), "exec_id": str (optional),
+          "deadline": float (optional, epoch seconds; caps timeout)}
+    returns: {"stdout", "stderr", "returncode", "exec_id",
+              "aborted": bool, "abort_match": str | None, "timed_out": bool}
+
+    With env_id the command runs with that shared virtualenv first on PATH.
+    Output is appended line by line to the exec log while the command runs
+    (see tail_output). When a line matches one of abort_patterns the process
+    group is killed after SANDBOX_ABORT_GRACE_S and the partial output is
+    returned; a timeout likewise returns what was printed so far.
+    """
     project_id = req["project_id"]
     command = req["command"]
+    env_id = req.get("env_id")
+    timeout = req.get("timeout") or cfg.sandbox_exec_timeout_s
+    if req.get("deadline"):
+        timeout = stage_timeout(timeout, req["deadline"], await ctx.time())
+    abort_patterns = req.get("abort_patterns") or []
     base = f"{_BASE}/{project_id}"
+    # Callers that want to tail the output pass their own id up front
+    exec_id = req.get("exec_id") or str(ctx.uuid())
+    log_path = _exec_log_path(base, exec_id)
 
-    async def _exec():
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True,
-            cwd=base, timeout=30,
+    # Plain function: Restate runs it in a worker thread, so a long command
+    # does not stall the event loop
+    def _exec():
+        _touch(base)
+        result = _run_command(
+            command, base, _command_env(env_id), timeout, abort_patterns,
+            cfg.sandbox_abort_grace_s, log_path,
         )
-        return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode,
-        }
+        return {**result, "exec_id": exec_id}
 
     out = await ctx.run("exec", _exec)
     log.info(
-        "sandbox.exec_command project=%s cmd=%s rc=%s",
-        project_id, command[:80], out["returncode"],
+        "sandbox.exec_command project=%s cmd=%s rc=%s aborted=%s timed_out=%s",
+        project_id, command[:80], out["returncode"], out["aborted"], out["timed_out"],
     )
     return out
+
+
+@sandbox.handler()
+async def tail_output(ctx: Context, req: dict) -> dict:
+    """Read the output an exec_command has produced so far.
+
+    req: {"project_id": str, "exec_id": str, "offset": int (optional)}
+    returns: {"data": str, "offset": int, "done": bool}
+    Pass the returned offset back to continue where the last read stopped.
+    Not journaled: it only observes a file that changes on its own.
+    """
+    path = _exec_log_path(f"{_BASE}/{req['project_id']}", req["exec_id"])
+    offset = req.get("offset", 0)
+    if not os.path.exists(path):
+        return {"data": "", "offset": offset, "done": False}
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    done = os.path.exists(path + ".done")
+    return {"data": data.decode(errors="replace"), "offset": offset + len(data), "done": done}
+
+
+@sandbox.handler()
+async def delete_project(ctx: Context, req: str | dict) -> dict:
+    """Remove a project directory, or mark it finished for later eviction.
+
+    req: "project_id" or {"project_id": str, "defer": bool (optional)}
+    With defer the workspace stays inspectable until the reaper evicts it
+    (SANDBOX_TTL_S after completion, or earlier when over the disk quota).
+    """
+    if isinstance(req, str):
+        req = {"project_id": req}
+    project_id = req["project_id"]
+    defer = req.get("defer", False)
+    base = f"{_BASE}/{project_id}"
+
+    # Plain function: rmtree and the usage walk block on large workspaces
+    def _delete():
+        if not os.path.isdir(base):
+            return {"project_id": project_id, "deleted": False, "freed_bytes": 0}
+        if defer:
+            with open(os.path.join(base, _FINISHED_MARKER), "w"):
+                pass
+            _touch(base)
+            return {"project_id": project_id, "deleted": False, "freed_bytes": 0}
+        freed = _project_usage(base)["bytes"]
+        shutil.rmtree(base, ignore_errors=True)
+        return {"project_id": project_id, "deleted": True, "freed_bytes": freed}
+
+    result = await ctx.run("delete_project", _delete)
+    log.info(
+        "sandbox.delete_project id=%s defer=%s deleted=%s freed=%d",
+        project_id, defer, result["deleted"], result["freed_bytes"],
+    )
+    return result
+
+
+@sandbox.handler()
+async def usage(ctx: Context) -> dict:
+    """Report per-project disk and inode usage under /tmp/lbg."""
+
+    # Plain function: walks all of /tmp/lbg
+    def _usage():
+        projects = _scan_projects(_BASE)
+        return {
+            "total_bytes": sum(p["bytes"] for p in projects),
+            "total_inodes": sum(p["inodes"] for p in projects),
+            "projects": projects,
+        }
+
+    return await ctx.run("usage", _usage)
+
+
+@sandbox.handler()
+async def reap(ctx: Context) -> dict:
+    """Run one garbage-collection pass (TTL + LRU eviction under the quota)."""
+
+    # Plain function, like run_reaper's asyncio.to_thread
+    def _reap_once():
+        return _reap(
+            _BASE,
+            ttl_s=cfg.sandbox_ttl_s,
+            idle_ttl_s=cfg.sandbox_idle_ttl_s,
+            quota_bytes=cfg.sandbox_quota_mb * 1024 * 1024,
+        )
+
+    report = await ctx.run("reap", _reap_once)
+    log.info(
+        "sandbox.reap evicted=%d freed=%d remaining=%d",
+        len(report["evicted"]), report["freed_bytes"], report["total_bytes"],
+    )
+    return report
+
+
+async def run_reaper(interval_s: float) -> None:
+    """Background loop evicting stale workspaces every *interval_s* seconds."""
+    log.info("sandbox reaper started (interval=%ss)", interval_s)
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            report = await asyncio.to_thread(
+                _reap,
+                _BASE,
+                ttl_s=cfg.sandbox_ttl_s,
+                idle_ttl_s=cfg.sandbox_idle_ttl_s,
+                quota_bytes=cfg.sandbox_quota_mb * 1024 * 1024,
+            )
+            if report["evicted"]:
+                log.info(
+                    "sandbox reaper evicted=%d freed=%d remaining=%d",
+                    len(report["evicted"]), report["freed_bytes"], report["total_bytes"],
+                )
+        except Exception:
+            log.exception("sandbox reaper pass failed")
+
+
+def _template_dir(name: str) -> str:
+    """Resolve a template name to its directory, rejecting path traversal."""
+    if not name or name.startswith(".") or os.path.basename(name) != name:
+        raise TerminalError(f"invalid sandbox template name: {name!r}")
+    return os.path.join(cfg.sandbox_templates_path, name)
+
+
+def _reflink(src: str, dst: str) -> None:
+    """Copy-on-write clone *src* into *dst*; raises OSError if unsupported."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def _clone_file(src: str, dst: str, mode: str) -> str:
+    """Clone one template file using the cheapest method *mode* allows.
+
+    auto tries reflink, then falls back to a byte copy; both give the project
+    its own data. hardlink is opt-in: the file shares the template's inode, so
+    it is made read-only (for the template too) to keep in-place writes from
+    a project from changing the template.
+    """
+    # Never write through an existing destination: it may be a hardlink
+    # into the template itself.
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(src, dst)
+            return dst
+        except OSError:
+            if os.path.lexists(dst):
+                os.unlink(dst)
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+        except OSError:
+            pass
+        else:
+            os.chmod(dst, stat.S_IMODE(os.stat(dst).st_mode) & ~0o222)
+            return dst
+    return shutil.copy2(src, dst)
+
+
+def _materialize_template(template_dir: str, dest: str, mode: str = "auto") -> int:
+    """Clone every file of *template_dir* into *dest*; returns the file count."""
+    count = 0
+
+    def _copy(src: str, dst: str) -> str:
+        nonlocal count
+        count += 1
+        return _clone_file(src, dst, mode)
+
+    shutil.copytree(template_dir, dest, copy_function=_copy, dirs_exist_ok=True)
+    return count
+
+
+def _atomic_write(path: str, content: str) -> None:
+    """Write *content* to *path* via a temp file and rename.
+
+    Replacing (instead of truncating) keeps files hardlinked from a template
+    intact and never exposes a half-written file to a running process.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+def _exec_log_path(base: str, exec_id: str) -> str:
+    """Log file of one exec; *exec_id* must be a uuid so it cannot escape *base*."""
+    try:
+        valid = str(uuid.UUID(exec_id)) == exec_id
+    except (TypeError, ValueError, AttributeError):
+        valid = False
+    if not valid:
+        raise TerminalError(f"invalid exec_id: {exec_id!r}")
+    return os.path.join(base, _EXEC_LOG_DIR, f"{exec_id}.log")
+
+
+def _run_command(
+    command: str,
+    cwd: str,
+    env: dict | None,
+    timeout: float,
+    abort_patterns: list[str],
+    grace_s: float,
+    log_path: str,
+) -> dict:
+    """Run *command*, streaming its output to *log_path* as it arrives.
+
+    Each stream is drained by its own thread; a line matching one of
+    *abort_patterns* starts a *grace_s* countdown (so the rest of a traceback
+    still arrives) after which the whole process group is killed. Lines in
+    the log are prefixed with "stdout| " or "stderr| ".
+    """
+    patterns = [re.compile(p) for p in abort_patterns]
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    lines: dict[str, list[str]] = {"stdout": [], "stderr": []}
+    matched: list[str] = []
+    abort = threading.Event()
+    lock = threading.Lock()
+
+    proc = subprocess.Popen(
+        command, shell=True, cwd=cwd, env=env, text=True, errors="replace",
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True,
+    )
+    with open(log_path, "w") as log_file:
+
+        def _drain(name: str, pipe) -> None:
+            for line in iter(pipe.readline, ""):
+                with lock:
+                    lines[name].append(line)
+                    log_file.write(f"{name}| {line}")
+                    log_file.flush()
+                if not abort.is_set():
+                    for pattern in patterns:
+                        if pattern.search(line):
+                            matched.append(line.rstrip("\n"))
+                            abort.set()
+                            break
+            pipe.close()
+
+        readers = [
+            threading.Thread(target=_drain, args=("stdout", proc.stdout), daemon=True),
+            threading.Thread(target=_drain, args=("stderr", proc.stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        deadline = time.monotonic() + timeout
+        aborted = timed_out = False
+        while proc.poll() is None:
+            if abort.is_set():
+                try:
+                    proc.wait(timeout=max(0.0, min(grace_s, deadline - time.monotonic())))
+                except subprocess.TimeoutExpired:
+                    _kill_group(proc)
+                    aborted = True
+                break
+            if time.monotonic() >= deadline:
+                _kill_group(proc)
+                timed_out = True
+                break
+            abort.wait(0.05)
+        returncode = proc.wait()
+        for reader in readers:
+            # Grandchildren that kept the pipes open were killed with the group
+            reader.join(timeout=1)
+
+    with open(log_path + ".done", "w"):
+        pass
+    with lock:
+        stdout, stderr = "".join(lines["stdout"]), "".join(lines["stderr"])
+    if timed_out:
+        stderr += f"\n[sandbox] killed after {timeout:g}s timeout"
+    elif aborted:
+        stderr += f"\n[sandbox] aborted on output matching abort pattern: {matched[0]}"
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "returncode": returncode,
+        "aborted": aborted,
+        "abort_match": matched[0] if aborted else None,
+        "timed_out": timed_out,
+    }
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _command_env(env_id: str | None) -> dict | None:
+    """Environment for a sandbox command, activating a shared virtualenv."""
+    if not env_id:
+        return None
+    if not env_id.isalnum():
+        raise TerminalError(f"invalid env_id: {env_id!r}")
+    venv = deps.env_dir(cfg.sandbox_envs_path, env_id)
+    env = dict(os.environ)
+    env["VIRTUAL_ENV"] = venv
+    env["PATH"] = os.path.join(venv, "bin") + os.pathsep + env.get("PATH", "")
+    env.pop("PYTHONHOME", None)
+    return env
+
+
+def _touch(base: str) -> None:
+    """Record *base* as recently used (its mtime drives TTL and LRU eviction)."""
+    try:
+        os.utime(base)
+    except FileNotFoundError:
+        pass
+
+
+def _project_usage(path: str) -> dict:
+    """Return {"bytes", "inodes"} allocated by a project directory.
+
+    Hardlinked files are apportioned by link count so template files shared
+    between projects are not counted once per project.
+    """
+    total = 0
+    inodes = 0
+    for root, dirs, files in os.walk(path):
+        inodes += len(dirs)
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            inodes += 1
+            total += st.st_blocks * 512 // max(st.st_nlink, 1)
+    return {"bytes": total, "inodes": inodes}
+
+
+def _scan_projects(base: str, now: float | None = None) -> list[dict]:
+    """List project directories with their size, idle time and finished flag."""
+    now = time.time() if now is None else now
+    projects = []
+    try:
+        entries = list(os.scandir(base))
+    except FileNotFoundError:
+        return projects
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            mtime = entry.stat(follow_symlinks=False).st_mtime
+        except FileNotFoundError:
+            continue
+        projects.append({
+            "project_id": entry.name,
+            "finished": os.path.exists(os.path.join(entry.path, _FINISHED_MARKER)),
+            "idle_s": max(0.0, now - mtime),
+            **_project_usage(entry.path),
+        })
+    return projects
+
+
+def _reap(
+    base: str,
+    ttl_s: float,
+    idle_ttl_s: float,
+    quota_bytes: int,
+    now: float | None = None,
+) -> dict:
+    """Evict expired projects, then least-recently-used finished ones over quota.
+
+    - finished projects idle longer than *ttl_s* are removed
+    - unfinished projects idle longer than *idle_ttl_s* are treated as abandoned
+    - while the total exceeds *quota_bytes* (0 = unlimited), finished projects
+      are removed oldest first; active projects are never evicted for quota
+    """
+    projects = _scan_projects(base, now)
+    evicted: list[str] = []
+    freed = 0
+
+    def _evict(p: dict) -> None:
+        nonlocal freed
+        shutil.rmtree(os.path.join(base, p["project_id"]), ignore_errors=True)
+        evicted.append(p["project_id"])
+        freed += p["bytes"]
+
+    remaining = []
+    for p in projects:
+        expired = p["idle_s"] > (ttl_s if p["finished"] else idle_ttl_s)
+        if expired:
+            _evict(p)
+        else:
+            remaining.append(p)
+
+    total = sum(p["bytes"] for p in remaining)
+    if quota_bytes and total > quota_bytes:
+        lru = sorted((p for p in remaining if p["finished"]), key=lambda p: -p["idle_s"])
+        for p in lru:
+            if total <= quota_bytes:
+                break
+            _evict(p)
+            total -= p["bytes"]
+        if total > quota_bytes:
+            log.warning(
+                "sandbox quota exceeded by active projects: %d > %d bytes",
+                total, quota_bytes,
+            )
+
+    return {"evicted": evicted, "freed_bytes": freed, "total_bytes": total}
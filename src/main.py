@@ -5,10 +5,15 @@ import logging
 
 import restate
 
+from src.agents.batch import batch
 from src.agents.coder import coder
 from src.agents.manager import manager
 from src.agents.tester import tester
-from src.infra.sandbox import sandbox
+from src.config import cfg
+from src.infra.events import events, sse_app
+from src.infra.flight import flight
+from src.infra.maintenance import maintenance
+from src.infra.sandbox import run_reaper, sandbox
 
 # ── Logging ─────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -19,7 +24,9 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 # ── Restate application ────────────────────────────────────────────
-app = restate.app(services=[sandbox, manager, coder, tester])
+app = restate.app(services=[sandbox, manager, coder, tester, events, flight, batch, maintenance])
+# GET /sse/<project_id> streams progress events; everything else is Restate
+asgi_app = sse_app(app)
 
 
 async def _serve() -> None:
@@ -28,8 +35,15 @@ async def _serve() -> None:
 
     conf = Config()
     conf.bind = ["0.0.0.0:9080"]
+    reaper = None
+    if cfg.sandbox_reap_interval_s > 0:
+        reaper = asyncio.create_task(run_reaper(cfg.sandbox_reap_interval_s))
     log.info("Starting Restate app on %s", conf.bind)
-    await hypercorn.asyncio.serve(app, conf)  # type: ignore[arg-type]
+    try:
+        await hypercorn.asyncio.serve(asgi_app, conf)  # type: ignore[arg-type]
+    finally:
+        if reaper:
+            reaper.cancel()
 
 
 if __name__ == "__main__":
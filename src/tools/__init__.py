@@ -0,0 +1 @@
+"""Operator command-line tools — run with ``python -m src.tools.<name>``."""
@@ -0,0 +1,391 @@
+"""Retrieval latency and quality benchmark against knowledge-base size.
+
+    python -m src.tools.ov_bench [--sizes 1000,10000,100000] [--queries 200] [--k 3]
+
+For each size a store is populated with synthetic code resources. A local
+stand-in serves embeddings (and the VLM summaries behind ``overview``), so a
+run needs no network and yields the same vectors every time. The stand-in
+speaks the OpenAI API and OpenViking is pointed at it via a generated config
+file. Each size reports ingest rate, ``init()`` time, ``find`` / ``overview``
+latency percentiles, process RSS, on-disk size and recall@1 / recall@k. Each
+size runs in a fresh process, so its RSS does not include the stores of the
+sizes before it. The JSON report is tagged with the OpenViking version for
+comparison across runs.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+EMBED_DIM = 256
+
+_VOCAB = (
+    "account address alert archive array audit balance batch bill block bucket buffer cache "
+    "calendar cart channel chart checksum city client cluster column comment config contact "
+    "counter coupon csv currency cursor customer dashboard date deadline delta device digest "
+    "directory discount document domain draft email employee event export feed file filter "
+    "folder forecast form graph grid group hash header heap histogram holiday host image "
+    "import index invoice item job journal key label ledger license line link list locale "
+    "lock log matrix median member merge message metric minute mode month node note "
+    "number order packet page parcel parser partition password path payment payroll peak "
+    "permission phone pixel playlist point policy poll port post price printer priority "
+    "product profile queue quota quote rank rate receipt record region report request "
+    "reservation retry review role route row rule salary sample schedule score segment "
+    "sensor session shift signal sitemap slot snapshot socket sort source span stack stock "
+    "stream string subscription summary survey table tag task tax template tenant ticket "
+    "timer token topic trace track transaction tree trend upload url user vector vendor "
+    "version video visit volume voucher wallet warehouse weather week word zone"
+).split()
+_VERBS = (
+    "parse validate merge sort count group filter rank export import compute normalize "
+    "dedupe summarize convert schedule aggregate split"
+).split()
+
+
+# ── Deterministic embedding stand-in ────────────────────────────────
+
+
+def stub_embedding(text: str, dim: int = EMBED_DIM) -> list[float]:
+    """Unit-length feature-hashed bag of words; texts sharing words point the same way."""
+    vec = [0.0] * dim
+    for token in re.findall(r"[a-z]+", text.lower()):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "big") % dim
+        vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        if self.path.endswith("/embeddings"):
+            inputs = body.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            reply = {
+                "object": "list",
+                "model": body.get("model", "stand-in"),
+                "data": [
+                    {"object": "embedding", "index": i,
+                     "embedding": stub_embedding(str(text), self.server.dim)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        elif self.path.endswith("/chat/completions"):
+            messages = body.get("messages") or [{}]
+            content = messages[-1].get("content", "")
+            if isinstance(content, list):
+                content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+            reply = {
+                "id": "stand-in", "object": "chat.completion", "created": 0,
+                "model": body.get("model", "stand-in"),
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": str(content)[-400:]},
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer:
+    """OpenAI-compatible /v1/embeddings + /v1/chat/completions on 127.0.0.1."""
+
+    def __init__(self, dim: int = EMBED_DIM) -> None:
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self._httpd.dim = dim
+        self.dim = dim
+        self.api_base = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def ov_conf(self) -> dict:
+        model = {"provider": "openai", "api_key": "stand-in", "api_base": self.api_base}
+        return {
+            "embedding": {"dense": {**model, "model": "stand-in", "dimension": self.dim}},
+            "vlm": {**model, "model": "stand-in"},
+        }
+
+
+# ── Synthetic corpus ────────────────────────────────────────────────
+
+
+@dataclass
+class Resource:
+    uri: str
+    code: str
+    # Natural-language query that should retrieve this resource
+    query: str
+
+
+def synthetic_corpus(n: int, seed: int = 0) -> list[Resource]:
+    """*n* distinct small programs, each about a unique (verb, noun, noun, noun) topic."""
+    rng = random.Random(seed)
+    topics: set[tuple[str, ...]] = set()
+    resources = []
+    while len(resources) < n:
+        topic = (rng.choice(_VERBS), *rng.sample(_VOCAB, 3))
+        if topic in topics:
+            continue
+        topics.add(topic)
+        verb, a, b, c = topic
+        name = f"{verb}_{a}_{b}_{c}"
+        code = (
+            f'"""{verb.capitalize()} {a} {b} records by {c}."""\n\n\n'
+            f"def {name}({a}_rows, {c}_key):\n"
+            f"    {b}_index = {{}}\n"
+            f"    for row in {a}_rows:\n"
+            f"        {b}_index.setdefault(row[{c}_key], []).append(row)\n"
+            f"    return {b}_index\n"
+        )
+        resources.append(Resource(f"viking://bench/r{len(resources)}.py", code,
+                                  f"{verb} the {a} {b} data by {c}"))
+    return resources
+
+
+# ── Measurements ────────────────────────────────────────────────────
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def _matches(hit: str, expected: str) -> bool:
+    # Bench file names are unique; SDK versions differ in where a target lands
+    hit, expected = hit.rstrip("/"), expected.rstrip("/")
+    name = expected.rsplit("/", 1)[-1]
+    return (
+        hit == expected or hit.startswith(expected + "/")
+        or hit.rsplit("/", 1)[-1] == name or f"/{name}/" in hit
+    )
+
+
+def recall_at(results: list[list[str]], expected: list[str], k: int) -> float:
+    """Share of queries whose expected uri is among the first *k* hits."""
+    if not expected:
+        return 0.0
+    found = sum(
+        any(_matches(hit, want) for hit in hits[:k]) for hits, want in zip(results, expected)
+    )
+    return found / len(expected)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+@dataclass
+class SizeResult:
+    size: int
+    ingest_s: float
+    ingest_docs_per_s: float
+    init_s: float
+    find_p50_ms: float
+    find_p95_ms: float
+    overview_p50_ms: float
+    overview_p95_ms: float
+    rss_mb: float
+    disk_mb: float
+    recall_at_1: float
+    recall_at_k: float
+
+
+def bench_size(
+    store: str, size: int, queries: int, k: int, batch_size: int, workers: int, seed: int = 0,
+) -> SizeResult:
+    from src.infra.ov_client import OVClient
+
+    corpus = synthetic_corpus(size, seed)
+    marker = os.path.join(store, ".bench_size")
+    ingest_s = 0.0
+    if not (os.path.exists(marker) and open(marker).read().strip() == str(size)):
+        shutil.rmtree(store, ignore_errors=True)
+        client = OVClient(store)
+        try:
+            client.init()
+            start = time.perf_counter()
+            for i in range(0, size, batch_size):
+                client.add_many(
+                    [(r.code, r.uri) for r in corpus[i:i + batch_size]], workers=workers,
+                )
+                log.info("ov_bench: size=%d ingested %d", size, min(i + batch_size, size))
+            ingest_s = time.perf_counter() - start
+        finally:
+            client.close()
+        with open(marker, "w") as f:
+            f.write(str(size))
+
+    start = time.perf_counter()
+    client = OVClient(store)
+    client.init()
+    init_s = time.perf_counter() - start
+    try:
+        sample = random.Random(seed + 1).sample(corpus, min(queries, size))
+        find_ms, overview_ms, results = [], [], []
+        for resource in sample:
+            t0 = time.perf_counter()
+            hits = client.find(resource.query, limit=k)
+            find_ms.append((time.perf_counter() - t0) * 1000)
+            results.append(hits)
+            if hits:
+                t0 = time.perf_counter()
+                client.overview(hits[0])
+                overview_ms.append((time.perf_counter() - t0) * 1000)
+        rss = _rss_mb()
+    finally:
+        client.close()
+
+    expected = [r.uri for r in sample]
+    return SizeResult(
+        size=size,
+        ingest_s=round(ingest_s, 3),
+        ingest_docs_per_s=round(size / ingest_s, 1) if ingest_s else 0.0,
+        init_s=round(init_s, 3),
+        find_p50_ms=round(percentile(find_ms, 50), 2),
+        find_p95_ms=round(percentile(find_ms, 95), 2),
+        overview_p50_ms=round(percentile(overview_ms, 50), 2),
+        overview_p95_ms=round(percentile(overview_ms, 95), 2),
+        rss_mb=round(rss, 1),
+        disk_mb=round(_disk_mb(store), 1),
+        recall_at_1=round(recall_at(results, expected, 1), 3),
+        recall_at_k=round(recall_at(results, expected, k), 3),
+    )
+
+
+def _setup_logging() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-5s %(message)s")
+
+
+def in_fresh_process(fn, *args):
+    """Call *fn* in a freshly spawned process and return its result.
+
+    RSS only ever grows within a process (freed pages are rarely returned),
+    so measuring every size in one process would report a running total.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_setup_logging,
+    ) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def format_table(results: list[SizeResult], k: int) -> str:
+    header = (
+        f"| size | ingest docs/s | init s | find p50/p95 ms | overview p50/p95 ms "
+        f"| RSS MB | disk MB | recall@1 | recall@{k} |"
+    )
+    rows = [header, "|" + "---|" * 9]
+    for r in results:
+        rows.append(
+            f"| {r.size} | {r.ingest_docs_per_s} | {r.init_s} | {r.find_p50_ms}/{r.find_p95_ms} "
+            f"| {r.overview_p50_ms}/{r.overview_p95_ms} | {r.rss_mb} | {r.disk_mb} "
+            f"| {r.recall_at_1} | {r.recall_at_k} |"
+        )
+    return "\n".join(rows)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--work-dir", default="./data/bench", help="stores are kept for reuse")
+    parser.add_argument("--out", default=None, help="default: <work-dir>/report-<ov version>.json")
+    args = parser.parse_args(argv)
+
+    _setup_logging()
+
+    from importlib.metadata import version
+
+    ov_version = version("openviking")
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = []
+    with StandInServer() as server:
+        conf_path = os.path.join(os.path.abspath(args.work_dir), "ov.conf")
+        with open(conf_path, "w") as f:
+            json.dump(server.ov_conf(), f, indent=2)
+        # Takes precedence over ~/.openviking/ov.conf
+        os.environ["OPENVIKING_CONFIG_FILE"] = conf_path
+        for size in (int(s) for s in args.sizes.split(",")):
+            store = os.path.join(args.work_dir, f"store_{size}")
+            results.append(in_fresh_process(bench_size, store, size, args.queries, args.k,
+                                            args.batch_size, args.workers))
+            log.info("ov_bench: %s", asdict(results[-1]))
+
+    report = {
+        "openviking_version": ov_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "queries": args.queries,
+        "k": args.k,
+        "embedding": f"stand-in feature hashing, dim={EMBED_DIM}",
+        "results": [asdict(r) for r in results],
+    }
+    out = args.out or os.path.join(args.work_dir, f"report-{ov_version}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(format_table(results, args.k))
+    print(f"report written to {out}")
+
+
+if __name__ == "__main__":
+    main()
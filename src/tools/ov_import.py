@@ -0,0 +1,261 @@
+"""Bulk import of code snippets into the OpenViking store.
+
+    python -m src.tools.ov_import <dir | file.jsonl> [--workers 4] [--batch-size 64]
+
+A directory is walked for files with the given extensions; a JSONL file holds
+one ``{"content": str, "uri"?: str, "task"?: str}`` object per line. Large
+documents are split into chunks at top-level ``def``/``class`` boundaries.
+Each batch is queued with ``OVClient.add_many`` (bounded parallelism, one
+``wait_processed``) and then appended to a checkpoint file, so an interrupted
+import resumes where it stopped. Documents are also registered in the OVMeta
+sidecar: duplicates of already-archived code are skipped, and everything
+imported becomes searchable by the local BM25 index.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = "viking://library"
+
+
+@dataclass
+class Doc:
+    uri: str
+    content: str
+    # Text the BM25 index uses as the task description
+    title: str
+
+
+@dataclass
+class ImportStats:
+    total: int = 0
+    imported: int = 0
+    resumed: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def docs_per_s(self) -> float:
+        return self.imported / self.elapsed_s if self.elapsed_s else 0.0
+
+    def report(self) -> str:
+        return (
+            f"{self.imported}/{self.total} imported, {self.resumed} already done, "
+            f"{self.duplicates} duplicates, {self.failed} failed "
+            f"in {self.elapsed_s:.1f}s ({self.docs_per_s:.1f} docs/s)"
+        )
+
+
+def chunk(text: str, max_chars: int) -> list[str]:
+    """Split *text* into pieces of at most ~max_chars, preferring top-level defs.
+
+    A single top-level block longer than max_chars is split at line boundaries.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    blocks: list[list[str]] = [[]]
+    for line in text.splitlines(keepends=True):
+        starts_block = line.startswith(("def ", "async def ", "class ", "@"))
+        # Decorators stay with the definition they decorate
+        if starts_block and blocks[-1] and not blocks[-1][-1].startswith("@"):
+            blocks.append([])
+        blocks[-1].append(line)
+
+    chunks: list[str] = []
+    current = ""
+    for block in blocks:
+        whole = "".join(block)
+        for piece in block if len(whole) > max_chars else [whole]:
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chunk_uris(uri: str, n: int) -> list[str]:
+    if n == 1:
+        return [uri]
+    stem, ext = os.path.splitext(uri)
+    return [f"{stem}__{i}{ext}" for i in range(n)]
+
+
+def iter_documents(
+    source: str, exts: tuple[str, ...] = (".py",), prefix: str = DEFAULT_PREFIX,
+    max_chars: int = 8000,
+) -> Iterator[Doc]:
+    """Documents from a directory tree or a JSONL file, already chunked."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                if not name.endswith(exts):
+                    continue
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, source).replace(os.sep, "/")
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    yield from _split(f"{prefix}/{rel}", f.read(), rel, max_chars)
+        return
+
+    with open(source, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                content = item["content"]
+            except (ValueError, KeyError, TypeError):
+                log.warning("ov_import: skipping malformed line %d", lineno)
+                continue
+            uri = item.get("uri") or f"{prefix}/snippet_{lineno}.py"
+            yield from _split(uri, content, item.get("task") or uri, max_chars)
+
+
+def _split(uri: str, content: str, title: str, max_chars: int) -> Iterator[Doc]:
+    parts = chunk(content, max_chars)
+    for part_uri, part in zip(_chunk_uris(uri, len(parts)), parts):
+        yield Doc(part_uri, part, title)
+
+
+class Checkpoint:
+    """Append-only file of imported URIs, one per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+
+    def add(self, uris: Iterable[str]) -> None:
+        uris = [u for u in uris if u not in self.done]
+        if not uris:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(f"{u}\n" for u in uris)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(uris)
+
+
+def run_import(
+    docs: Iterable[Doc],
+    client,
+    meta,
+    checkpoint: Checkpoint,
+    *,
+    batch_size: int = 64,
+    workers: int = 4,
+    dedup_threshold: float = 0.9,
+    wait_timeout: float = 600,
+    progress_every_s: float = 10.0,
+) -> ImportStats:
+    """Import *docs* through ``client.add_many`` in checkpointed batches.
+
+    client: an ``OVClient`` (or anything with ``add_many``)
+    meta: an ``OVMeta``, or None to skip dedup and lexical indexing
+    """
+    stats = ImportStats()
+    start = time.monotonic()
+    last_report = start
+    batch: list[tuple[Doc, str, list[int]]] = []
+
+    def _flush() -> None:
+        failed = set(client.add_many(
+            [(d.content, d.uri) for d, _, _ in batch], workers=workers, timeout=wait_timeout,
+        ))
+        for doc, content_hash, signature in batch:
+            if doc.uri in failed:
+                continue
+            if meta is not None:
+                meta.record_resource(doc.uri, content_hash, signature)
+                meta.index_document(doc.uri, doc.title, doc.content)
+        checkpoint.add(d.uri for d, _, _ in batch if d.uri not in failed)
+        stats.imported += len(batch) - len(failed)
+        stats.failed += len(failed)
+        batch.clear()
+
+    for doc in docs:
+        stats.total += 1
+        if doc.uri in checkpoint.done:
+            stats.resumed += 1
+            continue
+        content_hash, signature = "", []
+        if meta is not None:
+            canonical, content_hash, signature = meta.find_duplicate(doc.content, dedup_threshold)
+            # Exact copies within the unflushed batch are not in OVMeta yet
+            canonical = canonical or next(
+                (d.uri for d, h, _ in batch if h == content_hash), None,
+            )
+            if canonical is not None:
+                meta.record_resource(doc.uri, content_hash, signature, canonical)
+                checkpoint.add([doc.uri])
+                stats.duplicates += 1
+                continue
+        batch.append((doc, content_hash, signature))
+        if len(batch) >= batch_size:
+            _flush()
+            now = time.monotonic()
+            if now - last_report >= progress_every_s:
+                stats.elapsed_s = now - start
+                log.info("ov_import: %s", stats.report())
+                last_report = now
+    if batch:
+        _flush()
+    stats.elapsed_s = time.monotonic() - start
+    return stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    from src.config import cfg
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("source", help="directory to walk or JSONL file")
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX, help="URI prefix for directory files")
+    parser.add_argument("--ext", action="append", help="file extension to import (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4, help="parallel add_resource calls")
+    parser.add_argument("--chunk-chars", type=int, default=8000)
+    parser.add_argument("--wait-timeout", type=float, default=600, help="per-batch seconds")
+    parser.add_argument("--checkpoint", default=None, help="default: <OV_DATA_PATH>.import")
+    parser.add_argument("--no-meta", action="store_true", help="skip dedup and BM25 indexing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-5s %(message)s")
+
+    from src.infra.ov_client import OVClient
+    from src.infra.ov_meta import OVMeta
+
+    checkpoint = Checkpoint(args.checkpoint or f"{cfg.ov_data_path.rstrip('/')}.import")
+    docs = iter_documents(
+        args.source, tuple(args.ext or [".py"]), args.prefix.rstrip("/"), args.chunk_chars,
+    )
+    client = OVClient(cfg.ov_data_path)
+    meta = None if args.no_meta else OVMeta(cfg.ov_meta_path)
+    try:
+        client.init()
+        stats = run_import(
+            docs, client, meta, checkpoint,
+            batch_size=args.batch_size, workers=args.workers,
+            dedup_threshold=cfg.ov_dedup_threshold, wait_timeout=args.wait_timeout,
+        )
+    finally:
+        client.close()
+        if meta is not None:
+            meta.close()
+    print(stats.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Offline knowledge-store maintenance.
+
+    python -m src.tools.ov_maintain [--dry-run] [--min-age-days 30]
+
+Runs the same prune + compact pass as the ``maintenance`` Restate handler,
+directly against OV_DATA_PATH / OV_META_PATH, and prints the report. Use the
+handler for scheduled runs; this is for one-off cleanups with the app stopped.
+"""
+
+import argparse
+import json
+import logging
+
+
+def main(argv: list[str] | None = None) -> None:
+    from src.config import cfg
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="only list prune candidates")
+    parser.add_argument("--min-age-days", type=float, default=cfg.ov_prune_min_age_days)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-5s %(message)s")
+
+    from src.infra.maintenance import run_maintenance
+    from src.infra.ov_client import OVClient
+    from src.infra.ov_meta import OVMeta
+
+    meta = OVMeta(cfg.ov_meta_path)
+    client = None
+    try:
+        if not args.dry_run:
+            client = OVClient(cfg.ov_data_path)
+            client.init()
+        report = run_maintenance(
+            meta, client, cfg.ov_data_path, cfg.ov_meta_path,
+            min_age_s=args.min_age_days * 86400, dry_run=args.dry_run,
+        )
+    finally:
+        meta.close()
+        if client is not None:
+            client.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Tests for src.agents.batch and src.infra.fingerprint pure functions."""
+
+from src.agents.batch import _dedupe
+from src.infra.fingerprint import normalize_task, task_fingerprint
+
+
+class TestNormalizeTask:
+    def test_collapses_whitespace(self):
+        assert normalize_task("  sort   a\n list\t ") == "sort a list"
+
+    def test_nfkc(self):
+        # Full-width characters fold to their ASCII forms
+        assert normalize_task("ｐｒｉｎｔ １") == "print 1"
+
+    def test_keeps_case(self):
+        assert normalize_task("print HELLO") != normalize_task("print hello")
+
+
+class TestTaskFingerprint:
+    def test_equal_for_equivalent_text(self):
+        assert task_fingerprint("sort a list") == task_fingerprint(" sort  a list\n")
+
+    def test_template_distinguishes(self):
+        assert task_fingerprint("sort", "flask") != task_fingerprint("sort")
+        assert task_fingerprint("sort", None) == task_fingerprint("sort", "")
+
+    def test_reference_distinguishes(self):
+        a = task_fingerprint("sort", reference="ref A")
+        assert a != task_fingerprint("sort", reference="ref B")
+        assert task_fingerprint("sort", reference="") == task_fingerprint("sort")
+
+
+class TestDedupe:
+    def test_duplicates_point_at_first_occurrence(self):
+        items = [
+            {"task": "a"},
+            {"task": "b"},
+            {"task": " a "},
+            {"task": "a", "template": "t"},
+            {"task": "b"},
+        ]
+        unique, duplicate_of = _dedupe(items)
+        assert unique == [0, 1, 3]
+        assert duplicate_of == {2: 0, 4: 1}
+
+    def test_empty(self):
+        assert _dedupe([]) == ([], {})
@@ -81,3 +81,105 @@ if __name__ == "__main__":
     def test_raw_text_stripped(self):
         text = "   some code   "
         assert _extract_code(text) == "some code"
+
+
+class TestRepairPrompt:
+    def test_includes_problems_and_code(self):
+        from src.agents.coder import _repair_prompt
+
+        prompt = _repair_prompt("print(x)", ["main.py:1: undefined name 'x'"], budget=1000)
+        assert "main.py:1: undefined name 'x'" in prompt
+        assert "```python\nprint(x)\n```" in prompt
+
+    def test_advisories_are_marked_as_possibly_wrong(self):
+        from src.agents.coder import _repair_prompt
+
+        prompt = _repair_prompt("print(x)", [], 1000, ["main.py:1: undefined name 'x'"])
+        assert "fails static checks" not in prompt
+        assert "It can be wrong" in prompt
+        assert "main.py:1: undefined name 'x'" in prompt
+
+
+class TestApplyEdits:
+    CODE = "def f(x):\n    return x\n\n\nprint(f(1))\n"
+
+    def _edit(self, search, replace):
+        return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+    def test_applies_exact_edit(self):
+        from src.agents.coder import _apply_edits
+
+        text = self._edit("    return x\n", "    return abs(x)\n")
+        assert _apply_edits(self.CODE, text) == (self.CODE.replace("x\n\n", "abs(x)\n\n", 1), [])
+
+    def test_applies_several_edits_in_order(self):
+        from src.agents.coder import _apply_edits
+
+        text = (
+            self._edit("    return x\n", "    return -x\n")
+            + "and\n"
+            + self._edit("print(f(1))\n", "print(f(2))\n")
+        )
+        code, problems = _apply_edits(self.CODE, text)
+        assert problems == []
+        assert "return -x" in code and "print(f(2))" in code
+
+    def test_ignores_trailing_whitespace(self):
+        from src.agents.coder import _apply_edits
+
+        code, problems = _apply_edits(self.CODE, self._edit("    return x   \n", "    return 0\n"))
+        assert problems == []
+        assert "return 0" in code
+
+    def test_empty_search_appends(self):
+        from src.agents.coder import _apply_edits
+
+        code, _ = _apply_edits(self.CODE, self._edit("", "print(f(3))\n"))
+        assert code.endswith("print(f(1))\nprint(f(3))\n")
+
+    def test_unmatched_edit_rejects_all(self):
+        from src.agents.coder import _apply_edits
+
+        text = self._edit("    return x\n", "    return 1\n") + self._edit("nope\n", "x\n")
+        code, problems = _apply_edits(self.CODE, text)
+        assert code is None
+        assert "edit 2" in problems[0]
+
+    def test_full_program_fallback(self):
+        from src.agents.coder import _apply_edits
+
+        assert _apply_edits(self.CODE, "```python\nprint(2)\n```") == ("print(2)", [])
+
+    def test_no_edits(self):
+        from src.agents.coder import _apply_edits
+
+        code, problems = _apply_edits(self.CODE, "I cannot help with that.")
+        assert code is None and problems
+
+
+class TestMergedFix:
+    def test_split_fix(self):
+        from src.agents.coder import _split_fix
+
+        text = "DIAGNOSIS: off by one in the loop.\n\n```python\nprint(1)\n```"
+        assert _split_fix(text) == ("off by one in the loop.", "print(1)")
+
+    def test_split_fix_without_diagnosis(self):
+        from src.agents.coder import _split_fix
+
+        assert _split_fix("```python\nprint(1)\n```") == ("", "print(1)")
+
+    def test_fix_prompt_includes_code_output_and_verdict(self):
+        from src.agents.coder import _fix_prompt
+
+        prompt = _fix_prompt("print(x)", "NameError: x", "VERDICT: FAIL", budget=1000)
+        assert "```python\nprint(x)\n```" in prompt
+        assert "NameError: x" in prompt
+        assert "Tester's verdict:\nVERDICT: FAIL" in prompt
+
+    def test_fix_prompt_stays_within_budget(self):
+        from src.agents.coder import _fix_prompt
+        from src.infra.compaction import estimate_tokens
+
+        prompt = _fix_prompt("x = 1\n" * 5000, "line\n" * 5000, "", budget=1000)
+        assert estimate_tokens(prompt) < 1500
@@ -0,0 +1,96 @@
+"""Tests for src.infra.compaction."""
+
+from src.infra.compaction import (
+    compact_output,
+    compact_streams,
+    dedupe_lines,
+    estimate_tokens,
+    final_traceback,
+    truncate_middle,
+)
+
+_TRACEBACK = """Traceback (most recent call last):
+  File "main.py", line 10, in <module>
+    main()
+  File "main.py", line 7, in main
+    1 / 0
+ZeroDivisionError: division by zero"""
+
+
+class TestEstimateTokens:
+    def test_empty(self):
+        assert estimate_tokens("") == 0
+
+    def test_rounds_up(self):
+        assert estimate_tokens("abcde") == 2
+
+
+class TestDedupeLines:
+    def test_collapses_runs(self):
+        assert dedupe_lines(["a", "a", "a", "b"]) == [
+            "a", "... (previous line repeated 2 more times)", "b",
+        ]
+
+    def test_keeps_non_consecutive_duplicates(self):
+        assert dedupe_lines(["a", "b", "a"]) == ["a", "b", "a"]
+
+
+class TestFinalTraceback:
+    def test_finds_last_traceback(self):
+        lines = ["noise", *_TRACEBACK.splitlines(), "after"]
+        start, end = final_traceback(lines)
+        assert lines[start].startswith("Traceback")
+        assert lines[end - 1] == "ZeroDivisionError: division by zero"
+
+    def test_none_without_traceback(self):
+        assert final_traceback(["just", "output"]) is None
+
+
+class TestTruncateMiddle:
+    def test_short_text_untouched(self):
+        assert truncate_middle("short", 100) == "short"
+
+    def test_keeps_head_and_tail(self):
+        text = "\n".join(f"line {i}" for i in range(1000))
+        out = truncate_middle(text, 50)
+        assert out.startswith("line 0")
+        assert out.endswith("line 999")
+        assert "lines omitted" in out
+        assert estimate_tokens(out) <= 60
+
+    def test_single_huge_line(self):
+        out = truncate_middle("x" * 10_000, 10)
+        assert "[truncated]" in out
+        assert len(out) < 100
+
+    def test_zero_budget_keeps_nothing(self):
+        for max_tokens in (0, -5):
+            out = truncate_middle("x" * 10_000, max_tokens)
+            assert out == "\n... [truncated] ...\n"
+
+
+class TestCompactOutput:
+    def test_repeated_output_collapses(self):
+        out = compact_output("tick\n" * 100_000, 1000)
+        assert out == "tick\n... (previous line repeated 99999 more times)"
+
+    def test_traceback_survives_huge_output(self):
+        noise = "\n".join(f"progress {i}" for i in range(100_000))
+        out = compact_output(f"{noise}\n{_TRACEBACK}", 500)
+        assert _TRACEBACK in out
+        assert "progress 0" in out
+        assert estimate_tokens(out) <= 550
+
+    def test_within_budget_is_unchanged(self):
+        assert compact_output(_TRACEBACK, 1000) == _TRACEBACK
+
+
+class TestCompactStreams:
+    def test_small_streams_unchanged(self):
+        assert compact_streams("out", "err", 100) == ("out", "err")
+
+    def test_stderr_favoured(self):
+        stdout = "\n".join(f"out {i}" for i in range(10_000))
+        stderr = "\n".join(f"err {i}" for i in range(10_000))
+        out, err = compact_streams(stdout, stderr, 300)
+        assert estimate_tokens(err) > estimate_tokens(out)
@@ -0,0 +1,62 @@
+"""Tests for src.infra.deadline."""
+
+import time
+
+import pytest
+from restate import TerminalError
+
+from src.infra.deadline import (
+    MIN_STAGE_TIMEOUT_S,
+    expired,
+    make_deadline,
+    remaining,
+    run_timeout,
+    stage_timeout,
+)
+
+
+class TestDeadline:
+    def test_make_deadline(self):
+        assert make_deadline(100.0, 60) == 160.0
+
+    def test_zero_budget_means_no_deadline(self):
+        assert make_deadline(100.0, 0) is None
+        assert make_deadline(100.0, None) is None
+
+    def test_remaining_and_expired(self):
+        assert remaining(160.0, 100.0) == 60.0
+        assert remaining(None, 100.0) is None
+        assert not expired(160.0, 100.0)
+        assert expired(160.0, 160.0)
+        assert not expired(None, 1e12)
+
+
+class TestStageTimeout:
+    def test_without_deadline_keeps_default(self):
+        assert stage_timeout(30, None, 100.0) == 30
+        assert stage_timeout(None, None, 100.0) is None
+
+    def test_caps_default_at_remaining_budget(self):
+        assert stage_timeout(30, 120.0, 100.0) == 20.0
+        assert stage_timeout(30, 200.0, 100.0) == 30
+
+    def test_unbounded_default_gets_remaining_budget(self):
+        assert stage_timeout(None, 120.0, 100.0) == 20.0
+
+    def test_never_below_floor(self):
+        assert stage_timeout(30, 101.0, 100.0) == MIN_STAGE_TIMEOUT_S
+        assert stage_timeout(30, 50.0, 100.0) == MIN_STAGE_TIMEOUT_S
+        assert stage_timeout(30, 101.0, 100.0, floor=0.5) == 1.0
+
+
+class TestRunTimeout:
+    def test_uses_wall_clock(self):
+        timeout = run_timeout(None, time.time() + 100)
+        assert 90 < timeout <= 100
+
+    def test_raises_terminal_error_after_deadline(self):
+        with pytest.raises(TerminalError):
+            run_timeout(30, time.time() - 1)
+
+    def test_no_deadline(self):
+        assert run_timeout(30, None) == 30
@@ -0,0 +1,81 @@
+"""Tests for src.infra.dedup duplicate detection."""
+
+from src.infra.dedup import NUM_PERM, code_hash, lsh_buckets, minhash, similarity
+
+BASE = '''
+def merge_sort(items):
+    if len(items) <= 1:
+        return items
+    mid = len(items) // 2
+    left = merge_sort(items[:mid])
+    right = merge_sort(items[mid:])
+    out = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] <= right[j]:
+            out.append(left[i])
+            i += 1
+        else:
+            out.append(right[j])
+            j += 1
+    out.extend(left[i:])
+    out.extend(right[j:])
+    return out
+
+
+if __name__ == "__main__":
+    print(merge_sort([3, 1, 2]))
+'''
+
+UNRELATED = '''
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    data = load(sys.argv[1])
+    for key, value in sorted(data.items()):
+        print(f"{key}={value}")
+
+
+main()
+'''
+
+
+class TestCodeHash:
+    def test_ignores_formatting_comments_and_docstrings(self):
+        variant = BASE.replace("mid = len(items) // 2", "mid=len(items)//2  # half")
+        variant = '"""Merge sort."""\n' + variant
+        assert code_hash(variant) == code_hash(BASE)
+
+    def test_differs_on_logic_change(self):
+        assert code_hash(BASE.replace("<=", "<")) != code_hash(BASE)
+
+    def test_syntax_error_falls_back_to_text(self):
+        assert code_hash("def f(:\n  pass") == code_hash("def f(:   pass")
+
+
+class TestMinHash:
+    def test_signature_is_deterministic(self):
+        sig = minhash(BASE)
+        assert len(sig) == NUM_PERM
+        assert sig == minhash(BASE)
+
+    def test_near_duplicate_is_similar(self):
+        variant = BASE.replace('print(merge_sort([3, 1, 2]))', 'print(merge_sort([5, 4]))')
+        assert similarity(minhash(BASE), minhash(variant)) >= 0.8
+
+    def test_unrelated_code_is_dissimilar(self):
+        assert similarity(minhash(BASE), minhash(UNRELATED)) < 0.3
+
+    def test_near_duplicates_share_a_bucket(self):
+        variant = BASE.replace('print(merge_sort([3, 1, 2]))', 'print(merge_sort([5, 4]))')
+        assert set(lsh_buckets(minhash(BASE))) & set(lsh_buckets(minhash(variant)))
+
+    def test_empty_code(self):
+        assert len(minhash("")) == NUM_PERM
@@ -0,0 +1,81 @@
+"""Tests for src.infra.deps — import parsing and shared env resolution."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src.infra.deps import env_id, ensure_env, find_requirements, imported_modules
+
+
+class TestImportedModules:
+    def test_collects_top_level_names(self):
+        src = "import numpy as np\nimport os.path\nfrom requests.adapters import HTTPAdapter\n"
+        assert imported_modules(src) == {"numpy", "os", "requests"}
+
+    def test_ignores_relative_imports(self):
+        assert imported_modules("from . import sibling\nfrom .pkg import x\n") == set()
+
+    def test_nested_imports_are_found(self):
+        src = "def f():\n    import yaml\n    return yaml\n"
+        assert imported_modules(src) == {"yaml"}
+
+    def test_syntax_error_returns_empty(self):
+        assert imported_modules("def broken(:\n") == set()
+
+
+class TestFindRequirements:
+    def test_stdlib_only_project(self, tmp_path):
+        (tmp_path / "main.py").write_text("import json, sys\nprint(json.dumps(sys.argv))\n")
+        assert find_requirements(str(tmp_path)) == []
+
+    def test_maps_import_names_to_distributions(self, tmp_path):
+        (tmp_path / "main.py").write_text("import sklearn\nimport yaml\nimport numpy\n")
+        assert find_requirements(str(tmp_path)) == ["numpy", "PyYAML", "scikit-learn"]
+
+    def test_local_modules_are_not_requirements(self, tmp_path):
+        (tmp_path / "main.py").write_text("import helpers\nimport pkg.sub\n")
+        (tmp_path / "helpers.py").write_text("X = 1\n")
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg" / "__init__.py").write_text("")
+        assert find_requirements(str(tmp_path)) == []
+
+    def test_requirements_txt_pins_win(self, tmp_path):
+        (tmp_path / "main.py").write_text("import numpy\nimport requests\n")
+        (tmp_path / "requirements.txt").write_text("# pinned\nnumpy==1.26.4\n-r other.txt\n")
+        assert find_requirements(str(tmp_path)) == ["numpy==1.26.4", "requests"]
+
+
+class TestEnvId:
+    def test_order_and_spelling_insensitive(self):
+        assert env_id(["Requests", "numpy >= 1.0"]) == env_id(["numpy>=1.0", "requests"])
+        assert env_id(["scikit_learn"]) == env_id(["scikit-learn"])
+
+    def test_different_sets_differ(self):
+        assert env_id(["numpy"]) != env_id(["numpy", "pandas"])
+        assert env_id(["numpy==1.0"]) != env_id(["numpy==2.0"])
+
+
+class TestEnsureEnv:
+    def test_builds_once_then_reuses(self, tmp_path):
+        root = str(tmp_path / "envs")
+        with patch("src.infra.deps._build_env") as build:
+            build.side_effect = lambda root, path, reqs, timeout: os.makedirs(path)
+            first = ensure_env(root, ["numpy"], timeout=10)
+            second = ensure_env(root, ["numpy"], timeout=10)
+
+        assert first == second == env_id(["numpy"])
+        build.assert_called_once()
+        assert os.path.exists(os.path.join(root, first, ".ready"))
+
+    def test_failed_build_is_retried(self, tmp_path):
+        root = str(tmp_path / "envs")
+        with patch("src.infra.deps._build_env") as build:
+            build.side_effect = RuntimeError("pip failed")
+            with pytest.raises(RuntimeError):
+                ensure_env(root, ["numpy"], timeout=10)
+
+            build.side_effect = lambda root, path, reqs, timeout: os.makedirs(path)
+            ensure_env(root, ["numpy"], timeout=10)
+
+        assert build.call_count == 2
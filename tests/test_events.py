@@ -0,0 +1,189 @@
+"""Tests for src.infra.events SSE bridge."""
+
+import asyncio
+import json
+
+
+def _run_sse(path, read_events, query=b"", headers=(), disconnect_after=None):
+    """Drive the SSE app for one GET request; return (sent messages, inner calls)."""
+    from src.infra.events import sse_app
+
+    inner_calls = []
+
+    async def inner(scope, receive, send):
+        inner_calls.append(scope["path"])
+
+    sent = []
+
+    async def main():
+        app = sse_app(inner, read_events=read_events, poll_interval=0.01)
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        if disconnect_after is not None:
+            asyncio.get_running_loop().call_later(disconnect_after, disconnect.set)
+        scope = {
+            "type": "http", "method": "GET", "path": path,
+            "query_string": query, "headers": list(headers),
+        }
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+    asyncio.run(main())
+    return sent, inner_calls
+
+
+def _event(seq, event_type="plan_ready"):
+    return {"seq": seq, "ts": 0.0, "type": event_type, "source": "manager", "data": {}}
+
+
+class TestFormatSSE:
+    def test_format(self):
+        from src.infra.events import format_sse
+
+        raw = format_sse(_event(3)).decode()
+        lines = raw.splitlines()
+        assert lines[0] == "id: 3"
+        assert lines[1] == "event: plan_ready"
+        assert json.loads(lines[2].removeprefix("data: "))["seq"] == 3
+        assert raw.endswith("\n\n")
+
+
+class TestSSEApp:
+    def test_other_paths_go_to_inner_app(self):
+        sent, inner_calls = _run_sse("/manager/p1/handle_task", read_events=None)
+        assert inner_calls == ["/manager/p1/handle_task"]
+        assert sent == []
+
+    def test_streams_until_terminal_event(self):
+        batches = [[_event(1)], [], [_event(2, "code_generated"), _event(3, "task_finished")]]
+        calls = []
+
+        async def read_events(project_id, after, invocation_id=None):
+            calls.append((project_id, after))
+            return batches.pop(0) if batches else []
+
+        sent, _ = _run_sse("/sse/p1", read_events)
+        assert sent[0]["status"] == 200
+        assert (b"content-type", b"text/event-stream") in sent[0]["headers"]
+        bodies = b"".join(m.get("body", b"") for m in sent[1:])
+        assert [line for line in bodies.decode().splitlines() if line.startswith("id:")] == [
+            "id: 1", "id: 2", "id: 3",
+        ]
+        assert sent[-1]["more_body"] is False
+        # No after: the log starts the stream at the current task
+        assert calls == [("p1", None), ("p1", 1), ("p1", 1)]
+
+    def test_resumes_from_last_event_id(self):
+        calls = []
+
+        async def read_events(project_id, after, invocation_id=None):
+            calls.append(after)
+            return [_event(after + 1, "task_finished")]
+
+        _run_sse("/sse/p1", read_events, headers=[(b"last-event-id", b"7")])
+        assert calls == [7]
+        _run_sse("/sse/p1", read_events, query=b"after=4")
+        assert calls == [7, 4]
+
+    def test_stops_on_client_disconnect(self):
+        async def read_events(project_id, after, invocation_id=None):
+            return []
+
+        sent, _ = _run_sse("/sse/p1", read_events, disconnect_after=0.05)
+        assert sent[0]["status"] == 200
+        # No closing body is sent to a client that has gone away
+        assert all(m.get("more_body", True) for m in sent[1:])
+
+    def test_scopes_stream_to_invocation(self):
+        calls = []
+
+        async def read_events(project_id, after, invocation_id=None):
+            calls.append((after, invocation_id))
+            return [] if len(calls) < 2 else [_event(5, "task_finished")]
+
+        _run_sse("/sse/p1", read_events, query=b"invocation_id=inv_2")
+        # Waits for that invocation's task to start
+        assert calls == [(None, "inv_2"), (None, "inv_2")]
+
+
+class _StateCtx:
+    """In-memory stand-in for the events object's state."""
+
+    def __init__(self):
+        self.state = {}
+        self.now = 0.0
+
+    async def get(self, key):
+        return self.state.get(key)
+
+    def set(self, key, value):
+        self.state[key] = value
+
+    def clear(self, key):
+        self.state.pop(key, None)
+
+    async def time(self):
+        self.now += 1
+        return self.now
+
+
+def _publish(ctx, event_type, **data):
+    from src.infra.events import publish
+
+    return asyncio.run(publish(ctx, {"type": event_type, "source": "manager", "data": data}))
+
+
+def _read(ctx, req=None):
+    from src.infra.events import read
+
+    return asyncio.run(read(ctx, req))
+
+
+class TestEventLog:
+    def _two_tasks(self):
+        ctx = _StateCtx()
+        _publish(ctx, "task_started", invocation_id="inv_1")
+        _publish(ctx, "task_finished", status="success")
+        _publish(ctx, "task_started", invocation_id="inv_2")
+        _publish(ctx, "plan_ready", plan="p")
+        return ctx
+
+    def test_default_read_starts_at_latest_task(self):
+        events = _read(self._two_tasks())["events"]
+        assert [e["seq"] for e in events] == [3, 4]
+
+    def test_read_by_invocation_and_after(self):
+        ctx = self._two_tasks()
+        assert [e["seq"] for e in _read(ctx, {"invocation_id": "inv_1"})["events"]] == [1, 2, 3, 4]
+        assert _read(ctx, {"invocation_id": "inv_9"})["events"] == []
+        assert [e["seq"] for e in _read(ctx, {"after": 0})["events"]] == [1, 2, 3, 4]
+
+    def test_old_events_are_dropped(self, monkeypatch):
+        monkeypatch.setattr("src.infra.events._MAX_EVENTS", 3)
+        ctx = self._two_tasks()
+        assert "event:1" not in ctx.state
+        assert [e["seq"] for e in _read(ctx, {"after": 0})["events"]] == [2, 3, 4]
+
+    def test_task_keys_leave_with_their_start_event(self, monkeypatch):
+        monkeypatch.setattr("src.infra.events._MAX_EVENTS", 3)
+        ctx = _StateCtx()
+        for i in range(10):
+            _publish(ctx, "task_started", invocation_id=f"inv_{i}")
+            _publish(ctx, "task_finished", status="success")
+        task_keys = sorted(k for k in ctx.state if k.startswith("task:"))
+        assert task_keys == ["task:inv_9"]
+        assert [e["seq"] for e in _read(ctx, {"invocation_id": "inv_9"})["events"]] == [19, 20]
+
+    def test_large_fields_are_capped(self):
+        ctx = _StateCtx()
+        _publish(ctx, "code_generated", code="x" * 10_000, filename="main.py")
+        data = _read(ctx)["events"][0]["data"]
+        assert len(data["code"]) < 4100
+        assert data["code"].endswith("[6000 chars truncated]")
+        assert data["filename"] == "main.py"
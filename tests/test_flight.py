@@ -0,0 +1,66 @@
+"""Tests for src.infra.flight leader leases."""
+
+import asyncio
+
+from src.infra.flight import LEASE_GRACE_S, complete, join, lease_until, leave, status
+
+
+class _FlightCtx:
+    """In-memory stand-in for a flight object's state and clock."""
+
+    def __init__(self):
+        self.state = {}
+        self.now = 100.0
+        self.resolved = {}
+
+    async def get(self, key):
+        return self.state.get(key)
+
+    def set(self, key, value):
+        self.state[key] = value
+
+    def clear_all(self):
+        self.state.clear()
+
+    async def time(self):
+        return self.now
+
+    def resolve_awakeable(self, awakeable_id, value):
+        self.resolved[awakeable_id] = value
+
+
+def _join(ctx, project_id, expires_at):
+    req = {"project_id": project_id, "awakeable_id": f"aw_{project_id}", "expires_at": expires_at}
+    return asyncio.run(join(ctx, req))
+
+
+class TestLease:
+    def test_lease_until(self):
+        assert lease_until(500.0, 100.0, 1800) == 500.0 + LEASE_GRACE_S
+        assert lease_until(None, 100.0, 1800) == 1900.0
+
+    def test_follower_sees_leader_lease(self):
+        ctx = _FlightCtx()
+        assert _join(ctx, "a", 200.0) == {"role": "leader"}
+        assert _join(ctx, "b", 300.0) == {"role": "follower", "leader": "a", "expires_at": 200.0}
+
+    def test_expired_leader_is_taken_over(self):
+        ctx = _FlightCtx()
+        _join(ctx, "a", 200.0)
+        _join(ctx, "b", 300.0)
+        _join(ctx, "c", 300.0)
+        ctx.now = 201.0
+        # "b" stopped waiting when the lease ran out and joins again
+        assert _join(ctx, "b", 400.0) == {"role": "leader"}
+        assert asyncio.run(status(ctx)) == {"leader": "b", "waiters": ["c"]}
+        # The killed leader's late completion is ignored; the new one releases "c"
+        assert asyncio.run(complete(ctx, {"project_id": "a", "result": {"x": 1}})) == 0
+        assert asyncio.run(complete(ctx, {"project_id": "b", "result": {"x": 2}})) == 1
+        assert ctx.resolved == {"aw_c": {"x": 2}}
+
+    def test_leave_drops_waiter(self):
+        ctx = _FlightCtx()
+        _join(ctx, "a", 200.0)
+        _join(ctx, "b", 300.0)
+        asyncio.run(leave(ctx, {"project_id": "b"}))
+        assert asyncio.run(status(ctx)) == {"leader": "a", "waiters": []}
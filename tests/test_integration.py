@@ -179,7 +179,7 @@ class TestSandboxViaRestate:
 
 
 class TestCoderViaRestate:
-    """Test coder virtual object through the Restate ingress."""
+    """Test the coder service through the Restate ingress."""
 
     def test_generate_code(self, ensure_app):
         """Coder should call LLM and write code to sandbox."""
@@ -195,8 +195,12 @@ class TestCoderViaRestate:
 
         # Call coder
         r = httpx.post(
-            f"{RESTATE_INGRESS}/coder/{project_id}/generate_code",
-            json={"task": "写一个Python函数计算斐波那契数列前10个数并打印", "reference": ""},
+            f"{RESTATE_INGRESS}/coder/generate_code",
+            json={
+                "project_id": project_id,
+                "task": "写一个Python函数计算斐波那契数列前10个数并打印",
+                "reference": "",
+            },
             headers={"content-type": "application/json"},
             timeout=60,  # LLM call may take a while
         )
@@ -223,7 +227,7 @@ class TestCoderViaRestate:
 
 
 class TestTesterViaRestate:
-    """Test tester virtual object through the Restate ingress."""
+    """Test the tester service through the Restate ingress."""
 
     def test_run_test_pass(self, ensure_app):
         project_id = "tester_test"
@@ -245,7 +249,7 @@ class TestTesterViaRestate:
         )
 
         r = httpx.post(
-            f"{RESTATE_INGRESS}/tester/{project_id}/run_test",
+            f"{RESTATE_INGRESS}/tester/run_test",
             json={"project_id": project_id, "filename": "ok.py"},
             headers={"content-type": "application/json"},
             timeout=60,  # Tester now calls LLM for analysis
@@ -274,7 +278,7 @@ class TestTesterViaRestate:
         )
 
         r = httpx.post(
-            f"{RESTATE_INGRESS}/tester/{project_id}/run_test",
+            f"{RESTATE_INGRESS}/tester/run_test",
             json={"project_id": project_id, "filename": "bad.py"},
             headers={"content-type": "application/json"},
             timeout=60,  # Tester now calls LLM for analysis
@@ -324,6 +328,91 @@ class TestManagerViaRestate:
             assert r2.json()["returncode"] == 0
 
 
+    def test_submit_then_poll_status(self, ensure_app):
+        """Async submission returns at once; get_status reports progress until done."""
+        project_id = f"e2e_poll_{int(time.time())}"
+
+        r = httpx.post(
+            f"{RESTATE_INGRESS}/manager/{project_id}/handle_task/send",
+            json={"task": "打印 1 到 5 的平方"},
+            headers={"content-type": "application/json"},
+            timeout=10,
+        )
+        assert r.status_code in (200, 202)
+
+        status = {}
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            status = httpx.post(
+                f"{RESTATE_INGRESS}/manager/{project_id}/get_status", timeout=5,
+            ).json()
+            if status["status"] in ("success", "failed", "cancelled"):
+                break
+            time.sleep(1)
+
+        assert status["status"] in ("success", "failed")
+        assert status["result"]["project_id"] == project_id
+        assert status["attempt"] >= 1
+        assert {"plan", "code", "test"} <= set(status["timings"])
+
+
+    def test_identical_concurrent_tasks_are_coalesced(self, ensure_app):
+        """Two keys submitting the same task share one run."""
+        stamp = int(time.time())
+        keys = [f"e2e_coalesce_a_{stamp}", f"e2e_coalesce_b_{stamp}"]
+        task = f"打印数字 {stamp} 的各位数字之和"
+        for key in keys:
+            r = httpx.post(
+                f"{RESTATE_INGRESS}/manager/{key}/handle_task/send",
+                json={"task": task},
+                headers={"content-type": "application/json"},
+                timeout=10,
+            )
+            assert r.status_code in (200, 202)
+
+        statuses = {}
+        deadline = time.time() + 180
+        while time.time() < deadline and len(statuses) < 2:
+            for key in keys:
+                status = httpx.post(f"{RESTATE_INGRESS}/manager/{key}/get_status", timeout=5).json()
+                if status["status"] in ("success", "failed"):
+                    statuses[key] = status
+            time.sleep(1)
+
+        assert len(statuses) == 2
+        followers = [s for s in statuses.values() if s["result"].get("coalesced_with")]
+        assert len(followers) == 1
+        results = [s["result"] for s in statuses.values()]
+        assert results[0]["code"] == results[1]["code"]
+
+    def test_follow_up_edits_previous_program(self, ensure_app):
+        """A follow-up task starts from the key's last passing program."""
+        project_id = f"e2e_follow_{int(time.time())}"
+        headers = {"content-type": "application/json"}
+
+        r = httpx.post(
+            f"{RESTATE_INGRESS}/manager/{project_id}/handle_task",
+            json={"task": "写一个函数求列表的和，并打印 [1, 2, 3] 的结果"},
+            headers=headers,
+            timeout=120,
+        )
+        assert r.status_code == 200
+        if r.json()["status"] != "success":
+            pytest.skip("base task did not pass")
+
+        r = httpx.post(
+            f"{RESTATE_INGRESS}/manager/{project_id}/handle_task",
+            json={"task": "再打印 [-1, -2] 的结果", "follow_up": True},
+            headers=headers,
+            timeout=120,
+        )
+        assert r.status_code == 200
+        assert r.json()["status"] in ("success", "failed")
+        status = httpx.post(f"{RESTATE_INGRESS}/manager/{project_id}/get_status", timeout=5).json()
+        assert status.get("follow_up") is True
+        assert "retrieve" in status["timings"]
+
+
 # ---------------------------------------------------------------------------
 # Cleanup
 # ---------------------------------------------------------------------------
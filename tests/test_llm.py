@@ -1,5 +1,7 @@
 """Tests for src.infra.llm module."""
 
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -22,7 +24,7 @@ class TestLLMClient:
         from src.infra.llm import LLMClient
 
         LLMClient(base_url="http://x", api_key="key", model="m")
-        mock_cls.assert_called_once_with(base_url="http://x", api_key="key")
+        mock_cls.assert_called_once_with(base_url="http://x", api_key="key", max_retries=0)
 
     @patch("src.infra.llm.Anthropic")
     def test_chat_calls_messages_create(self, mock_cls):
@@ -73,3 +75,580 @@ class TestLLMClient:
 
         client = LLMClient(base_url="http://x", api_key="k", model="my-model")
         assert client._model == "my-model"
+
+
+class TestLLMClientPromptCache:
+    def _mock_response(self, mock_cls, text="ok", usage=None):
+        mock_instance = MagicMock()
+        mock_cls.return_value = mock_instance
+        mock_content = MagicMock()
+        mock_content.text = text
+        mock_instance.messages.create.return_value = MagicMock(content=[mock_content], usage=usage)
+        return mock_instance
+
+    @patch("src.infra.llm.Anthropic")
+    def test_context_prepended_without_cache(self, mock_cls):
+        from src.infra.llm import LLMClient
+
+        mock_instance = self._mock_response(mock_cls)
+        LLMClient("http://x", "k", "m").chat("sys", "usr", context="ctx")
+
+        kwargs = mock_instance.messages.create.call_args.kwargs
+        assert kwargs["system"] == "sys"
+        assert kwargs["messages"] == [{"role": "user", "content": "ctx\n\nusr"}]
+
+    @patch("src.infra.llm.Anthropic")
+    def test_cache_breakpoints_on_system_and_context(self, mock_cls):
+        from src.infra.llm import LLMClient
+
+        mock_instance = self._mock_response(mock_cls)
+        LLMClient("http://x", "k", "m", prompt_cache=True).chat("sys", "usr", context="ctx")
+
+        kwargs = mock_instance.messages.create.call_args.kwargs
+        assert kwargs["system"] == [
+            {"type": "text", "text": "sys", "cache_control": {"type": "ephemeral"}},
+        ]
+        assert kwargs["messages"][0]["content"] == [
+            {"type": "text", "text": "ctx", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "usr"},
+        ]
+
+    @patch("src.infra.llm.Anthropic")
+    def test_cache_without_context_has_single_block(self, mock_cls):
+        from src.infra.llm import LLMClient
+
+        mock_instance = self._mock_response(mock_cls)
+        LLMClient("http://x", "k", "m", prompt_cache=True).chat("sys", "usr")
+
+        content = mock_instance.messages.create.call_args.kwargs["messages"][0]["content"]
+        assert content == [{"type": "text", "text": "usr"}]
+
+    @patch("src.infra.llm.Anthropic")
+    def test_reports_cache_usage(self, mock_cls):
+        from src.infra.llm import LLMClient
+
+        usage = MagicMock(
+            input_tokens=12,
+            output_tokens=34,
+            cache_read_input_tokens=1000,
+            cache_creation_input_tokens=0,
+        )
+        self._mock_response(mock_cls, usage=usage)
+        client = LLMClient("http://x", "k", "m", prompt_cache=True)
+        client.chat("sys", "usr")
+
+        assert client.last_usage == {
+            "input_tokens": 12,
+            "output_tokens": 34,
+            "cache_read_input_tokens": 1000,
+            "cache_creation_input_tokens": 0,
+        }
+
+    @patch("src.infra.llm.Anthropic")
+    def test_missing_cache_usage_reported_as_zero(self, mock_cls):
+        from src.infra.llm import LLMClient
+
+        usage = MagicMock(input_tokens=5, output_tokens=6, cache_read_input_tokens=None)
+        self._mock_response(mock_cls, usage=usage)
+        client = LLMClient("http://x", "k", "m")
+        client.chat("sys", "usr")
+
+        assert client.last_usage["cache_read_input_tokens"] == 0
+        assert client.last_usage["input_tokens"] == 5
+
+
+class TestLLMProfiles:
+    def _cfg(self, monkeypatch, **overrides):
+        mock_cfg = MagicMock(
+            llm_base_url="http://x",
+            llm_api_key="k",
+            llm_model_name="big",
+            llm_fast_model_name="",
+            llm_profiles="",
+            llm_prompt_cache=False,
+            llm_hedge=False,
+            llm_max_retries=0,
+            llm_endpoints="",
+            llm_endpoint_failure_threshold=3,
+            llm_endpoint_cooldown_s=30.0,
+        )
+        for name, value in overrides.items():
+            setattr(mock_cfg, name, value)
+        monkeypatch.setattr("src.infra.llm.cfg", mock_cfg)
+        monkeypatch.setattr("src.infra.llm._pool", None)
+        return mock_cfg
+
+    def test_defaults_use_main_model(self, monkeypatch):
+        from src.infra.llm import PHASES, load_profiles
+
+        self._cfg(monkeypatch)
+        profiles = load_profiles()
+        assert set(profiles) == set(PHASES)
+        assert {p.model for p in profiles.values()} == {"big"}
+        assert profiles["code"].max_tokens == 4096
+        assert profiles["test_analysis"].stop_sequences == ("VERDICT: PASS", "VERDICT: FAIL")
+
+    def test_fast_model_for_analysis_phases(self, monkeypatch):
+        from src.infra.llm import load_profiles
+
+        self._cfg(monkeypatch, llm_fast_model_name="small")
+        profiles = load_profiles()
+        assert profiles["plan"].model == "big"
+        assert profiles["test_analysis"].model == "small"
+        assert profiles["error_analysis"].model == "small"
+
+    def test_json_overrides(self, monkeypatch):
+        from src.infra.llm import load_profiles
+
+        self._cfg(
+            monkeypatch,
+            llm_profiles='{"plan": {"model": "planner", "max_tokens": 512, "stop_sequences": ["END"]}}',
+        )
+        plan = load_profiles()["plan"]
+        assert plan.model == "planner"
+        assert plan.max_tokens == 512
+        assert plan.stop_sequences == ("END",)
+
+    def test_unknown_phase_rejected(self, monkeypatch):
+        from src.infra.llm import load_profiles
+
+        self._cfg(monkeypatch, llm_profiles='{"review": {"model": "x"}}')
+        with pytest.raises(ValueError, match="unknown phase"):
+            load_profiles()
+
+    @patch("src.infra.llm.Anthropic")
+    def test_for_phase_sends_profile_settings(self, mock_cls, monkeypatch):
+        from src.infra.llm import LLMClient
+
+        self._cfg(monkeypatch, llm_fast_model_name="small")
+        mock_instance = MagicMock()
+        mock_cls.return_value = mock_instance
+        mock_content = MagicMock()
+        mock_content.text = "Looks fine.\n"
+        mock_instance.messages.create.return_value = MagicMock(
+            content=[mock_content], stop_reason="stop_sequence", stop_sequence="VERDICT: PASS",
+        )
+
+        text = LLMClient.for_phase("test_analysis").chat("sys", "usr")
+
+        kwargs = mock_instance.messages.create.call_args.kwargs
+        assert kwargs["model"] == "small"
+        assert kwargs["max_tokens"] == 1024
+        assert kwargs["temperature"] == 0.0
+        assert kwargs["stop_sequences"] == ["VERDICT: PASS", "VERDICT: FAIL"]
+        # The matched stop sequence is restored so the verdict stays parseable
+        assert text == "Looks fine.\nVERDICT: PASS"
+
+
+class TestRateLimitScheduler:
+    def test_unlimited_never_waits(self):
+        from src.infra.llm import RateLimitScheduler
+
+        scheduler = RateLimitScheduler(rpm=0, tpm=0)
+        start = time.monotonic()
+        for _ in range(100):
+            scheduler.acquire(priority=2, tokens=10_000)
+        assert time.monotonic() - start < 0.5
+
+    def test_acquire_times_out_and_leaves_queue(self):
+        from src.infra.llm import RateLimitScheduler
+
+        scheduler = RateLimitScheduler(rpm=1, tpm=0)
+        scheduler.acquire(priority=0, tokens=1)
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            scheduler.acquire(priority=0, tokens=1, timeout=0.1)
+        assert time.monotonic() - start < 1
+        assert scheduler._queue == []
+
+    def test_token_bucket_wait_time(self):
+        from src.infra.llm import _TokenBucket
+
+        bucket = _TokenBucket(per_minute=60, now=0.0)
+        bucket.take(60)
+        bucket.refill(now=0.0)
+        assert bucket.wait_time(1) == pytest.approx(1.0)
+        bucket.refill(now=2.0)
+        assert bucket.tokens == pytest.approx(2.0)
+        assert bucket.wait_time(1) == 0.0
+
+    def test_oversized_request_is_capped_to_capacity(self):
+        from src.infra.llm import _TokenBucket
+
+        bucket = _TokenBucket(per_minute=100, now=0.0)
+        assert bucket.wait_time(10_000) == 0.0
+
+    def test_settle_refunds_unused_tokens(self):
+        from src.infra.llm import RateLimitScheduler
+
+        scheduler = RateLimitScheduler(rpm=0, tpm=1000)
+        scheduler.acquire(priority=2, tokens=800)
+        scheduler.settle(reserved=800, used=100)
+        assert scheduler._tokens.tokens == pytest.approx(900, abs=5)
+
+    def test_higher_priority_admitted_first(self):
+        from src.infra.llm import RateLimitScheduler
+
+        scheduler = RateLimitScheduler(rpm=600, tpm=0)  # one request per 0.1s
+        scheduler._requests.tokens = 0
+        order = []
+
+        def _worker(name, priority):
+            scheduler.acquire(priority=priority, tokens=1)
+            order.append(name)
+
+        low = threading.Thread(target=_worker, args=("plan", 3))
+        low.start()
+        time.sleep(0.02)
+        high = threading.Thread(target=_worker, args=("verdict", 0))
+        high.start()
+        low.join(timeout=5)
+        high.join(timeout=5)
+
+        assert order == ["verdict", "plan"]
+
+    def test_pause_delays_admission(self):
+        from src.infra.llm import RateLimitScheduler
+
+        scheduler = RateLimitScheduler(rpm=0, tpm=0)
+        scheduler.pause(0.2)
+        start = time.monotonic()
+        scheduler.acquire(priority=0, tokens=1)
+        assert time.monotonic() - start >= 0.15
+
+
+class TestLLMClientRetries:
+    def _rate_limit_error(self, retry_after="0"):
+        import anthropic
+        import httpx
+
+        response = httpx.Response(
+            429,
+            headers={"retry-after": retry_after},
+            request=httpx.Request("POST", "http://test.llm/v1/messages"),
+        )
+        return anthropic.RateLimitError("rate limited", response=response, body=None)
+
+    @patch("src.infra.llm.time.sleep")
+    @patch("src.infra.llm.Anthropic")
+    def test_retries_rate_limit_then_succeeds(self, mock_cls, mock_sleep):
+        from src.infra.llm import LLMClient
+
+        mock_instance = MagicMock()
+        mock_cls.return_value = mock_instance
+        mock_content = MagicMock()
+        mock_content.text = "ok"
+        mock_instance.messages.create.side_effect = [
+            self._rate_limit_error("2"),
+            MagicMock(content=[mock_content]),
+        ]
+
+        assert LLMClient("http://x", "k", "m").chat("sys", "usr") == "ok"
+        assert mock_instance.messages.create.call_count == 2
+        delay = mock_sleep.call_args.args[0]
+        assert 2.0 <= delay <= 2.5
+
+    @patch("src.infra.llm.time.sleep")
+    @patch("src.infra.llm.Anthropic")
+    def test_gives_up_after_max_retries(self, mock_cls, mock_sleep, monkeypatch):
+        import anthropic
+
+        from src.infra.llm import LLMClient
+
+        monkeypatch.setattr("src.infra.llm.cfg", MagicMock(llm_max_retries=2, llm_hedge=False))
+        mock_instance = MagicMock()
+        mock_cls.return_value = mock_instance
+        mock_instance.messages.create.side_effect = self._rate_limit_error()
+
+        with pytest.raises(anthropic.RateLimitError):
+            LLMClient("http://x", "k", "m").chat("sys", "usr")
+        assert mock_instance.messages.create.call_count == 3
+
+    @patch("src.infra.llm.time.sleep")
+    @patch("src.infra.llm.Anthropic")
+    def test_timeout_bounds_request_and_retries(self, mock_cls, mock_sleep):
+        import anthropic
+
+        from src.infra.llm import LLMClient
+
+        mock_instance = MagicMock()
+        mock_cls.return_value = mock_instance
+        mock_instance.messages.create.side_effect = self._rate_limit_error("30")
+
+        with pytest.raises(anthropic.RateLimitError):
+            LLMClient("http://x", "k", "m").chat("sys", "usr", timeout=10)
+        # The 30 s Retry-After does not fit in the budget: no retry
+        assert mock_instance.messages.create.call_count == 1
+        assert 1.0 <= mock_instance.messages.create.call_args.kwargs["timeout"] <= 10
+        mock_sleep.assert_not_called()
+
+    def test_retry_delay_without_header_is_jittered(self):
+        from src.infra.llm import _retry_delay
+
+        delays = {_retry_delay(RuntimeError("x"), attempt=3) for _ in range(20)}
+        assert all(0 <= d <= 8 for d in delays)
+        assert len(delays) > 1
+
+
+class TestLLMPool:
+    def test_runs_on_dedicated_threads(self):
+        import asyncio
+        import inspect
+
+        from src.infra.llm import in_llm_pool
+
+        action = in_llm_pool(lambda: threading.current_thread().name)
+        # ctx.run awaits async actions instead of using the default executor
+        assert inspect.iscoroutinefunction(action)
+        assert asyncio.run(action()).startswith("llm")
+
+    def test_blocked_llm_calls_leave_default_executor_free(self):
+        import asyncio
+
+        from src.infra.llm import in_llm_pool
+
+        release = threading.Event()
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            blocked = [asyncio.ensure_future(in_llm_pool(release.wait)()) for _ in range(40)]
+            try:
+                # Sandbox / OV work still gets a default-executor thread right away
+                name = await asyncio.wait_for(
+                    loop.run_in_executor(None, lambda: threading.current_thread().name), 5,
+                )
+            finally:
+                release.set()
+                await asyncio.gather(*blocked)
+            return name
+
+        assert not asyncio.run(main()).startswith("llm")
+
+
+class TestHedging:
+    def test_threshold_needs_min_samples(self):
+        from src.infra.llm import HedgeTracker
+
+        tracker = HedgeTracker()
+        for i in range(10):
+            tracker.record_latency("code", float(i))
+        assert tracker.threshold("code", 95, min_samples=20) is None
+        assert tracker.threshold("code", 50, min_samples=5) == 5.0
+        assert tracker.threshold("plan", 50, min_samples=1) is None
+
+    def test_budget_limits_hedge_fraction(self):
+        from src.infra.llm import HedgeTracker
+
+        tracker = HedgeTracker()
+        spent = 0
+        for _ in range(100):
+            tracker.count_request("code")
+            spent += tracker.try_spend("code", budget=0.1)
+        assert spent == 10
+        assert tracker.stats()["code"]["hedged"] == 10
+
+    def test_fast_primary_is_not_hedged(self):
+        from src.infra.llm import _hedged_call
+
+        hedge = MagicMock()
+        result, hedge_won = _hedged_call(
+            lambda cancel: "primary", hedge, threshold=1.0, allow_hedge=lambda: True,
+        )
+        assert (result, hedge_won) == ("primary", False)
+        hedge.assert_not_called()
+
+    def test_finished_hedge_beats_stalled_primary(self):
+        from src.infra.llm import _hedged_call
+
+        def _stalled(cancel):
+            # No stream events for 3 s, so the cancel flag is not seen until then
+            time.sleep(3)
+            return "primary"
+
+        start = time.monotonic()
+        result, hedge_won = _hedged_call(
+            _stalled, lambda cancel: "hedge", threshold=0.1, allow_hedge=lambda: True,
+        )
+        assert (result, hedge_won) == ("hedge", True)
+        assert time.monotonic() - start < 1.0
+
+    def test_busy_hedge_pool_does_not_trigger_hedge(self, monkeypatch):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from src.infra.llm import _hedged_call
+
+        busy = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        busy.submit(release.wait)
+        monkeypatch.setattr("src.infra.llm._hedge_pool", busy)
+
+        def _quick(cancel):
+            time.sleep(0.05)
+            return "primary"
+
+        hedge = MagicMock()
+        allow = MagicMock(return_value=True)
+        try:
+            # The threshold starts when the primary runs, not while it would queue
+            result, hedge_won = _hedged_call(_quick, hedge, threshold=0.3, allow_hedge=allow)
+        finally:
+            release.set()
+            busy.shutdown()
+        assert (result, hedge_won) == ("primary", False)
+        allow.assert_not_called()
+
+    def test_slow_primary_loses_to_hedge_and_is_cancelled(self):
+        from src.infra.llm import _hedged_call
+
+        primary_cancelled = threading.Event()
+
+        def _slow(cancel):
+            if cancel.wait(timeout=5):
+                primary_cancelled.set()
+                raise RuntimeError("cancelled")
+            return "primary"
+
+        result, hedge_won = _hedged_call(
+            _slow, lambda cancel: "hedge", threshold=0.05, allow_hedge=lambda: True,
+        )
+        assert (result, hedge_won) == ("hedge", True)
+        assert primary_cancelled.wait(timeout=1)
+
+    def test_no_budget_waits_for_primary(self):
+        from src.infra.llm import _hedged_call
+
+        def _slow(cancel):
+            time.sleep(0.1)
+            return "primary"
+
+        hedge = MagicMock()
+        result, hedge_won = _hedged_call(
+            _slow, hedge, threshold=0.01, allow_hedge=lambda: False,
+        )
+        assert (result, hedge_won) == ("primary", False)
+        hedge.assert_not_called()
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        from src.infra.llm import _hedged_call
+
+        def _slow(cancel):
+            time.sleep(0.1)
+            return "primary"
+
+        def _broken(cancel):
+            raise RuntimeError("secondary down")
+
+        result, hedge_won = _hedged_call(
+            _slow, _broken, threshold=0.01, allow_hedge=lambda: True,
+        )
+        assert (result, hedge_won) == ("primary", False)
+
+    def test_both_failing_raises_primary_error(self):
+        from src.infra.llm import _hedged_call
+
+        def _slow_fail(cancel):
+            time.sleep(0.1)
+            raise ValueError("primary failed")
+
+        def _fast_fail(cancel):
+            raise RuntimeError("hedge failed")
+
+        with pytest.raises(ValueError, match="primary failed"):
+            _hedged_call(_slow_fail, _fast_fail, threshold=0.01, allow_hedge=lambda: True)
+
+
+class TestEndpointPool:
+    def _server_error(self):
+        import anthropic
+        import httpx
+
+        response = httpx.Response(503, request=httpx.Request("POST", "http://test.llm/v1/messages"))
+        return anthropic.InternalServerError("unavailable", response=response, body=None)
+
+    def _pool(self, *weights, clock=None):
+        from src.infra.llm import Endpoint, EndpointPool
+
+        with patch("src.infra.llm.Anthropic"):
+            endpoints = [Endpoint(f"http://e{i}", "k", w) for i, w in enumerate(weights)]
+        kwargs = {"clock": clock} if clock else {}
+        return EndpointPool(endpoints, failure_threshold=2, cooldown_s=10.0, **kwargs)
+
+    def test_least_outstanding_respects_weights(self):
+        pool = self._pool(2.0, 1.0)
+        picked = [pool.acquire().base_url for _ in range(3)]
+        assert sorted(picked) == ["http://e0", "http://e0", "http://e1"]
+
+    def test_release_frees_capacity(self):
+        pool = self._pool(1.0, 1.0)
+        first = pool.acquire()
+        pool.release(first)
+        assert pool.acquire() is first
+
+    def test_circuit_opens_after_failures_and_probes_after_cooldown(self):
+        now = [0.0]
+        pool = self._pool(1.0, 1.0, clock=lambda: now[0])
+        bad, good = pool.endpoints
+        for _ in range(2):
+            pool.release(pool.acquire(avoid=(good,)), self._server_error())
+        assert pool.stats()[0]["open"]
+        assert {pool.acquire().base_url for _ in range(3)} == {"http://e1"}
+
+        now[0] = 11.0
+        probe = pool.acquire(avoid=(good,))
+        assert probe is bad
+        # Only one probe while half-open
+        assert pool.acquire(avoid=(good,)) is good
+        pool.release(probe)
+        assert not pool.stats()[0]["open"]
+        assert bad.failures == 0
+
+    def test_client_errors_do_not_trip_breaker(self):
+        pool = self._pool(1.0)
+        for _ in range(3):
+            pool.release(pool.acquire(), ValueError("bad request"))
+        assert pool.endpoints[0].failures == 0
+
+    def test_all_open_falls_back_to_first_recovering(self):
+        now = [0.0]
+        pool = self._pool(1.0, 1.0, clock=lambda: now[0])
+        a, b = pool.endpoints
+        for _ in range(2):
+            pool.release(pool.acquire(avoid=(b,)), self._server_error())
+        now[0] = 5.0
+        for _ in range(2):
+            pool.release(pool.acquire(avoid=(a,)), self._server_error())
+        assert pool.acquire() is a
+
+    @patch("src.infra.llm.time.sleep")
+    def test_client_fails_over_without_backoff(self, mock_sleep):
+        from src.infra.llm import Endpoint, EndpointPool, LLMClient
+
+        with patch("src.infra.llm.Anthropic") as mock_cls:
+            mock_cls.side_effect = lambda **kw: MagicMock(name=kw["base_url"])
+            primary, secondary = Endpoint("http://a", "k"), Endpoint("http://b", "k")
+            client = LLMClient("http://a", "k", "m", pool=EndpointPool([primary, secondary]))
+        mock_content = MagicMock()
+        mock_content.text = "ok"
+        primary.client.messages.create.side_effect = self._server_error()
+        secondary.client.messages.create.return_value = MagicMock(content=[mock_content])
+
+        assert client.chat("sys", "usr") == "ok"
+        mock_sleep.assert_not_called()
+        assert primary.failures == 1
+        assert (primary.outstanding, secondary.outstanding) == (0, 0)
+
+    def test_load_endpoints_from_config(self, monkeypatch):
+        from src.infra.llm import load_endpoints
+
+        monkeypatch.setattr(
+            "src.infra.llm.cfg",
+            MagicMock(
+                llm_api_key="default-key",
+                llm_endpoints='[{"base_url": "http://a", "weight": 3}, {"base_url": "http://b", "api_key": "kb"}]',
+            ),
+        )
+        with patch("src.infra.llm.Anthropic") as mock_cls:
+            endpoints = load_endpoints()
+        assert [(e.base_url, e.weight) for e in endpoints] == [("http://a", 3.0), ("http://b", 1.0)]
+        assert mock_cls.call_args_list[0].kwargs["api_key"] == "default-key"
+        assert mock_cls.call_args_list[1].kwargs["api_key"] == "kb"
@@ -0,0 +1,125 @@
+"""Tests for src.infra.maintenance pruning and the OVMeta usage tracking behind it."""
+
+import time
+
+import pytest
+
+from src.infra.maintenance import run_maintenance, store_bytes
+from src.infra.ov_meta import OVMeta
+
+DAY = 86400
+
+
+class FakeClient:
+    def __init__(self, fail=()):
+        self.removed = []
+        self.fail = set(fail)
+
+    def remove(self, uri):
+        if uri in self.fail:
+            raise RuntimeError("store busy")
+        self.removed.append(uri)
+
+
+@pytest.fixture
+def meta_path(tmp_path):
+    return str(tmp_path / "meta.sqlite3")
+
+
+@pytest.fixture
+def meta(meta_path):
+    m = OVMeta(meta_path)
+    yield m
+    m.close()
+
+
+def _archive(meta, uri, code, fingerprint=None, task="task"):
+    canonical, content_hash, signature = meta.find_duplicate(code, 0.9)
+    meta.record_resource(uri, content_hash, signature, canonical)
+    meta.index_document(canonical or uri, task, code)
+    if fingerprint:
+        meta.record_solution(fingerprint, task, canonical or uri, code)
+
+
+class TestPruneCandidates:
+    def test_superseded_archive(self, meta):
+        _archive(meta, "viking://code/p1/main.py", "print('v1')\n" * 5, "fp")
+        _archive(meta, "viking://code/p2/main.py", "x = [i for i in range(9)]\n" * 5, "fp")
+        candidates = meta.prune_candidates(min_age_s=DAY)
+        assert candidates == [{"uri": "viking://code/p1/main.py", "reason": "superseded"}]
+
+    def test_unused_after_min_age(self, meta):
+        _archive(meta, "viking://code/p1/main.py", "print('old')\n" * 5)
+        assert meta.prune_candidates(min_age_s=DAY) == []
+        later = time.time() + 2 * DAY
+        assert meta.prune_candidates(min_age_s=DAY, now=later) == [
+            {"uri": "viking://code/p1/main.py", "reason": "unused"},
+        ]
+
+    def test_imported_docs_are_never_unused(self, meta):
+        _archive(meta, "viking://library/numpy/intro.md", "numpy docs\n" * 5)
+        assert meta.prune_candidates(min_age_s=DAY, now=time.time() + 2 * DAY) == []
+
+    def test_hit_keeps_resource(self, meta):
+        _archive(meta, "viking://code/p1/main.py", "print('used')\n" * 5)
+        meta.record_hit("viking://code/p1/main.py")
+        meta.record_hit("viking://code/p1/main.py")
+        assert meta.hit_count("viking://code/p1/main.py") == 2
+        assert meta.prune_candidates(min_age_s=DAY, now=time.time() + 2 * DAY) == []
+
+    def test_duplicate_links_are_not_candidates(self, meta):
+        _archive(meta, "viking://code/p1/main.py", "print('same')\n" * 5)
+        _archive(meta, "viking://code/p2/main.py", "print('same')\n" * 5)
+        uris = [c["uri"] for c in meta.prune_candidates(0, now=time.time() + 1)]
+        assert uris == ["viking://code/p1/main.py"]
+
+
+class TestRunMaintenance:
+    def test_prunes_and_forgets(self, tmp_path, meta, meta_path):
+        _archive(meta, "viking://code/p1/main.py", "print('v1')\n" * 5, "fp", "sort numbers")
+        _archive(meta, "viking://code/p2/main.py", "y = sorted(range(9))\n" * 5, "fp", "sort")
+        client = FakeClient()
+        report = run_maintenance(meta, client, str(tmp_path / "store"), meta_path, min_age_s=DAY)
+        assert client.removed == report["pruned"] == ["viking://code/p1/main.py"]
+        assert all(h["uri"] != "viking://code/p1/main.py" for h in meta.search("sort"))
+        assert meta.prune_candidates(min_age_s=DAY) == []
+        assert report["bytes_after"] > 0
+
+    def test_dry_run_changes_nothing(self, tmp_path, meta, meta_path):
+        _archive(meta, "viking://code/p1/main.py", "print('v1')\n" * 5, "fp")
+        _archive(meta, "viking://code/p2/main.py", "y = sorted(range(9))\n" * 5, "fp")
+        report = run_maintenance(
+            meta, None, str(tmp_path / "store"), meta_path, min_age_s=DAY, dry_run=True,
+        )
+        assert report["pruned"] == []
+        assert len(report["candidates"]) == 1
+        assert len(meta.prune_candidates(min_age_s=DAY)) == 1
+
+    def test_failed_removal_is_retried_later(self, tmp_path, meta, meta_path):
+        _archive(meta, "viking://code/p1/main.py", "print('v1')\n" * 5, "fp")
+        _archive(meta, "viking://code/p2/main.py", "y = sorted(range(9))\n" * 5, "fp")
+        client = FakeClient(fail={"viking://code/p1/main.py"})
+        report = run_maintenance(meta, client, str(tmp_path / "store"), meta_path, min_age_s=DAY)
+        assert report["failed"] == ["viking://code/p1/main.py"]
+        assert len(meta.prune_candidates(min_age_s=DAY)) == 1
+
+    def test_forget_drops_linked_duplicates(self, meta):
+        _archive(meta, "viking://code/p1/main.py", "print('same')\n" * 5)
+        _archive(meta, "viking://code/p2/main.py", "print('same')\n" * 5)
+        meta.forget("viking://code/p1/main.py")
+        # The copy is no longer a duplicate of anything
+        assert meta.find_duplicate("print('same')\n" * 5, 0.9)[0] is None
+
+    def test_forget_drops_solutions_of_the_uri(self, meta):
+        _archive(meta, "viking://code/p1/main.py", "print('v1')\n" * 5, "fp")
+        meta.forget("viking://code/p1/main.py")
+        assert meta.lookup_solution("fp") is None
+        # A new archive of the task does not bring the removed URI back
+        _archive(meta, "viking://code/p2/main.py", "y = sorted(range(9))\n" * 5, "fp")
+        assert meta.prune_candidates(min_age_s=DAY) == []
+
+    def test_store_bytes_counts_store_and_sidecar(self, tmp_path, meta, meta_path):
+        store = tmp_path / "store"
+        (store / "sub").mkdir(parents=True)
+        (store / "sub" / "f").write_bytes(b"x" * 100)
+        assert store_bytes(str(store), meta_path) >= 100 + 1
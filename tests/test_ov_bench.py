@@ -0,0 +1,88 @@
+"""Tests for src.tools.ov_bench pure helpers and the embedding stand-in."""
+
+import httpx
+
+from src.tools.ov_bench import (
+    StandInServer,
+    in_fresh_process,
+    percentile,
+    recall_at,
+    stub_embedding,
+    synthetic_corpus,
+)
+
+
+def _cos(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class TestStubEmbedding:
+    def test_deterministic_unit_vectors(self):
+        vec = stub_embedding("sort the invoice rows")
+        assert vec == stub_embedding("sort the invoice rows")
+        assert abs(_cos(vec, vec) - 1.0) < 1e-9
+
+    def test_shared_words_score_higher(self):
+        query = stub_embedding("merge the invoice ledger data by region")
+        related = stub_embedding("def merge_invoice_ledger_region(invoice_rows, region_key)")
+        unrelated = stub_embedding("def count_sensor_weather_week(sensor_rows, week_key)")
+        assert _cos(query, related) > _cos(query, unrelated)
+
+    def test_empty_text(self):
+        assert stub_embedding("") == [0.0] * len(stub_embedding("x"))
+
+
+class TestCorpus:
+    def test_deterministic_and_unique(self):
+        corpus = synthetic_corpus(500)
+        assert [r.code for r in corpus] == [r.code for r in synthetic_corpus(500)]
+        assert len({r.uri for r in corpus}) == len({r.code for r in corpus}) == 500
+
+    def test_query_names_the_topic(self):
+        resource = synthetic_corpus(1)[0]
+        assert all(word in resource.code for word in resource.query.split()[2:4])
+
+
+class TestMetrics:
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([], 95) == 0.0
+
+    def test_recall_at_k(self):
+        results = [["viking://bench/r0.py", "x"], ["x", "viking://bench/r1.py"], []]
+        expected = ["viking://bench/r0.py", "viking://bench/r1.py", "viking://bench/r2.py"]
+        assert recall_at(results, expected, 1) == 1 / 3
+        assert recall_at(results, expected, 2) == 2 / 3
+
+    def test_recall_matches_by_file_name(self):
+        results = [["viking://resources/r7.py"], ["viking://resources/r17.py"]]
+        expected = ["viking://bench/r7.py", "viking://bench/r1.py"]
+        assert recall_at(results, expected, 1) == 0.5
+
+
+class TestFreshProcess:
+    def test_runs_in_another_process(self):
+        import os
+
+        assert in_fresh_process(os.getpid) != os.getpid()
+        assert in_fresh_process(percentile, [1, 2, 3], 50) == 2
+
+
+class TestStandInServer:
+    def test_serves_openai_embeddings(self):
+        with StandInServer(dim=32) as server:
+            r = httpx.post(f"{server.api_base}/embeddings", json={"input": ["a b", "c"]})
+        data = r.json()["data"]
+        assert [d["index"] for d in data] == [0, 1]
+        assert data[0]["embedding"] == stub_embedding("a b", 32)
+        assert server.ov_conf()["embedding"]["dense"]["dimension"] == 32
+
+    def test_serves_chat_completions(self):
+        with StandInServer() as server:
+            r = httpx.post(
+                f"{server.api_base}/chat/completions",
+                json={"messages": [{"role": "user", "content": "summarize this"}]},
+            )
+        assert r.json()["choices"][0]["message"]["content"] == "summarize this"
@@ -172,3 +172,32 @@ class TestOVClient:
         client = OVClient("/data")
         client.close()
         mock_instance.close.assert_called_once()
+
+    @patch("src.infra.ov_client.time.sleep")
+    @patch("src.infra.ov_client._ensure_ov_conf")
+    @patch("src.infra.ov_client.ov.SyncOpenViking")
+    def test_add_many_queues_all_then_waits_once(self, mock_ov_cls, mock_conf, mock_sleep):
+        mock_instance = MagicMock()
+        mock_ov_cls.return_value = mock_instance
+        seen = {}
+
+        def _add_resource(path, target):
+            with open(path) as f:
+                seen[target] = f.read()
+            if target.endswith("bad.py"):
+                raise RuntimeError("rejected")
+
+        mock_instance.add_resource.side_effect = _add_resource
+
+        from src.infra.ov_client import OVClient
+
+        client = OVClient("/data")
+        failed = client.add_many(
+            [("a = 1", "viking://lib/a.py"), ("b = 2", "viking://lib/bad.py")], workers=2,
+        )
+
+        assert failed == ["viking://lib/bad.py"]
+        assert seen == {"viking://lib/a.py": "a = 1", "viking://lib/bad.py": "b = 2"}
+        # a.py once, bad.py retried until it gives up
+        assert mock_instance.add_resource.call_count == 1 + 5
+        mock_instance.wait_processed.assert_called_once_with(timeout=600)
@@ -0,0 +1,121 @@
+"""Tests for src.tools.ov_import bulk import."""
+
+import json
+
+import pytest
+
+from src.infra.ov_meta import OVMeta
+from src.tools.ov_import import Checkpoint, Doc, chunk, iter_documents, run_import
+
+
+class FakeClient:
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    def add_many(self, docs, workers=4, timeout=600):
+        self.batches.append([uri for _, uri in docs])
+        return [uri for _, uri in docs if uri in self.fail]
+
+
+@pytest.fixture
+def meta(tmp_path):
+    m = OVMeta(str(tmp_path / "meta.sqlite3"))
+    yield m
+    m.close()
+
+
+def _docs(n):
+    return [
+        Doc(f"viking://library/f{i}.py", f"def f{i}():\n    return {i} * {i} + {i}\n", f"f{i}")
+        for i in range(n)
+    ]
+
+
+class TestChunk:
+    def test_small_text_is_one_chunk(self):
+        assert chunk("x = 1\n", 100) == ["x = 1\n"]
+
+    def test_splits_at_top_level_defs(self):
+        text = "".join(f"def f{i}():\n    return {i}\n\n" for i in range(10))
+        parts = chunk(text, 60)
+        assert "".join(parts) == text
+        assert all(len(p) <= 60 for p in parts)
+        assert all(p.startswith("def ") for p in parts)
+
+    def test_decorator_stays_with_definition(self):
+        text = "y = 2\n" * 10 + "@cache\ndef f():\n    return 1\n"
+        parts = chunk(text, 40)
+        assert any(p.startswith("@cache\ndef f") for p in parts)
+
+    def test_oversized_block_splits_at_lines(self):
+        text = "def big():\n" + "    x = 1\n" * 50
+        parts = chunk(text, 100)
+        assert "".join(parts) == text
+        assert len(parts) > 1
+
+
+class TestIterDocuments:
+    def test_walks_directory(self, tmp_path):
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg" / "a.py").write_text("a = 1\n")
+        (tmp_path / "b.py").write_text("b = 2\n")
+        (tmp_path / "notes.txt").write_text("skip")
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "c.py").write_text("skip")
+        uris = [d.uri for d in iter_documents(str(tmp_path))]
+        assert uris == ["viking://library/b.py", "viking://library/pkg/a.py"]
+
+    def test_reads_jsonl(self, tmp_path):
+        path = tmp_path / "snippets.jsonl"
+        path.write_text("\n".join([
+            json.dumps({"content": "x = 1", "task": "set x", "uri": "viking://lib/x.py"}),
+            "not json",
+            json.dumps({"content": "y = 2"}),
+        ]))
+        docs = list(iter_documents(str(path)))
+        assert [(d.uri, d.title) for d in docs] == [
+            ("viking://lib/x.py", "set x"),
+            ("viking://library/snippet_3.py", "viking://library/snippet_3.py"),
+        ]
+
+    def test_chunked_uris_are_numbered(self, tmp_path):
+        (tmp_path / "big.py").write_text("".join(f"def f{i}():\n    pass\n" for i in range(5)))
+        uris = [d.uri for d in iter_documents(str(tmp_path), max_chars=30)]
+        assert uris[0] == "viking://library/big__0.py"
+        assert len(uris) == len(set(uris)) > 1
+
+
+class TestRunImport:
+    def test_batches_and_checkpoints(self, tmp_path, meta):
+        client = FakeClient()
+        ckpt = Checkpoint(str(tmp_path / "ckpt"))
+        stats = run_import(_docs(5), client, meta, ckpt, batch_size=2)
+        assert [len(b) for b in client.batches] == [2, 2, 1]
+        assert stats.imported == 5
+        assert len(Checkpoint(str(tmp_path / "ckpt")).done) == 5
+        assert meta.search("f3")[0]["uri"] == "viking://library/f3.py"
+
+    def test_resumes_from_checkpoint(self, tmp_path):
+        ckpt_path = str(tmp_path / "ckpt")
+        run_import(_docs(3), FakeClient(), None, Checkpoint(ckpt_path))
+        client = FakeClient()
+        stats = run_import(_docs(5), client, None, Checkpoint(ckpt_path))
+        assert stats.resumed == 3
+        assert client.batches == [["viking://library/f3.py", "viking://library/f4.py"]]
+
+    def test_failed_docs_are_retried_next_run(self, tmp_path):
+        ckpt_path = str(tmp_path / "ckpt")
+        stats = run_import(_docs(3), FakeClient(fail={"viking://library/f1.py"}), None,
+                           Checkpoint(ckpt_path))
+        assert (stats.imported, stats.failed) == (2, 1)
+        client = FakeClient()
+        run_import(_docs(3), client, None, Checkpoint(ckpt_path))
+        assert client.batches == [["viking://library/f1.py"]]
+
+    def test_skips_duplicates(self, tmp_path, meta):
+        docs = _docs(2) + [Doc("viking://library/copy.py", _docs(1)[0].content, "copy")]
+        client = FakeClient()
+        stats = run_import(docs, client, meta, Checkpoint(str(tmp_path / "ckpt")))
+        assert stats.duplicates == 1
+        assert "viking://library/copy.py" not in client.batches[0]
@@ -0,0 +1,105 @@
+"""Tests for src.infra.ov_meta sidecar index."""
+
+import pytest
+
+from src.infra.ov_meta import OVMeta
+
+
+@pytest.fixture
+def meta(tmp_path):
+    m = OVMeta(str(tmp_path / "sub" / "meta.sqlite3"))
+    yield m
+    m.close()
+
+
+class TestSolutionIndex:
+    def test_lookup_miss(self, meta):
+        assert meta.lookup_solution("nope") is None
+
+    def test_record_and_lookup(self, meta):
+        meta.record_solution("fp1", "sort a list", "viking://code/p1/main.py", "print(1)")
+        hit = meta.lookup_solution("fp1")
+        assert hit["uri"] == "viking://code/p1/main.py"
+        assert hit["code"] == "print(1)"
+        assert hit["verdict"] == "pass"
+
+    def test_record_replaces(self, meta):
+        meta.record_solution("fp1", "t", "viking://code/p1/main.py", "v1")
+        meta.record_solution("fp1", "t", "viking://code/p2/main.py", "v2")
+        assert meta.lookup_solution("fp1")["code"] == "v2"
+
+    def test_set_verdict(self, meta):
+        meta.record_solution("fp1", "t", "viking://code/p1/main.py", "v1")
+        meta.set_verdict("fp1", "stale")
+        assert meta.lookup_solution("fp1")["verdict"] == "stale"
+
+    def test_persists_across_connections(self, tmp_path):
+        path = str(tmp_path / "meta.sqlite3")
+        first = OVMeta(path)
+        first.record_solution("fp1", "t", "viking://code/p1/main.py", "v1")
+        first.close()
+        second = OVMeta(path)
+        assert second.lookup_solution("fp1")["code"] == "v1"
+        second.close()
+
+
+class TestDedup:
+    CODE = "def add(a, b):\n    return a + b\n\n\nprint(add(1, 2))\n" * 3
+
+    def _register(self, meta, uri, code):
+        canonical, content_hash, signature = meta.find_duplicate(code, 0.9)
+        meta.record_resource(uri, content_hash, signature, canonical)
+        return canonical
+
+    def test_first_copy_is_canonical(self, meta):
+        assert self._register(meta, "viking://code/p1/main.py", self.CODE) is None
+
+    def test_exact_duplicate_links_to_canonical(self, meta):
+        self._register(meta, "viking://code/p1/main.py", self.CODE)
+        reformatted = "# copy\n" + self.CODE.replace("a + b", "a+b")
+        assert self._register(meta, "viking://code/p2/main.py", reformatted) == (
+            "viking://code/p1/main.py"
+        )
+        # A third copy resolves to the canonical, not to the link
+        assert self._register(meta, "viking://code/p3/main.py", self.CODE) == (
+            "viking://code/p1/main.py"
+        )
+
+    def test_unrelated_code_is_not_duplicate(self, meta):
+        self._register(meta, "viking://code/p1/main.py", self.CODE)
+        other = "import os\n\nfor name in sorted(os.listdir('.')):\n    print(name.upper())\n"
+        assert self._register(meta, "viking://code/p2/main.py", other) is None
+
+    def test_near_duplicate_links_to_canonical(self, meta):
+        code = "".join(f"def f{i}(x):\n    return x * {i} + {i}\n\n" for i in range(30))
+        self._register(meta, "viking://code/p1/main.py", code)
+        edited = code.replace("return x * 29 + 29", "return x * 29 - 1")
+        assert self._register(meta, "viking://code/p2/main.py", edited) == (
+            "viking://code/p1/main.py"
+        )
+
+
+class TestLexicalIndex:
+    def test_search_ranks_matching_task_first(self, meta):
+        meta.index_document("viking://code/p1/main.py", "sort a list of numbers", "sorted(x)")
+        meta.index_document("viking://code/p2/main.py", "parse a json file", "json.load(f)")
+        hits = meta.search("sort numbers")
+        assert hits[0]["uri"] == "viking://code/p1/main.py"
+        assert hits[0]["code"] == "sorted(x)"
+        assert all(h["uri"] != "viking://code/p2/main.py" for h in hits)
+
+    def test_search_matches_code(self, meta):
+        meta.index_document(
+            "viking://code/p1/main.py", "task", "import heapq\nheapq.heappush(h, 1)",
+        )
+        assert meta.search("heapq")[0]["uri"] == "viking://code/p1/main.py"
+
+    def test_one_hit_per_uri(self, meta):
+        meta.index_document("viking://code/p1/main.py", "sort a list", "sorted(x)")
+        meta.index_document("viking://code/p1/main.py", "sort the list please", "sorted(x)")
+        assert len(meta.search("sort list")) == 1
+
+    def test_query_syntax_is_escaped(self, meta):
+        meta.index_document("viking://code/p1/main.py", "count words", "x")
+        assert meta.search('count AND "words" NOT (')[0]["uri"] == "viking://code/p1/main.py"
+        assert meta.search("?!") == []
@@ -0,0 +1,82 @@
+"""Tests for src.infra.preflight static checks."""
+
+import sys
+
+import pytest
+
+from src.infra.preflight import advisories, check
+
+
+class TestPreflightSyntax:
+    def test_clean_code(self):
+        code = (
+            "import math\n"
+            "from collections import Counter\n"
+            "def area(r):\n"
+            "    return math.pi * r ** 2\n"
+            "print(area(2), Counter('aab'), [x for x in range(3)], __name__)\n"
+        )
+        assert check(code) == []
+        assert advisories(code) == []
+
+    def test_syntax_error_reports_line(self):
+        problems = check("x = 1\ndef f(:\n    pass\n")
+        assert len(problems) == 1
+        assert problems[0].startswith("main.py:2: SyntaxError")
+
+    def test_compile_only_errors(self):
+        # Parses fine but is rejected by the compiler
+        problems = check("x = 1\nreturn x\n")
+        assert problems and "SyntaxError" in problems[0]
+
+
+class TestPreflightUndefinedNames:
+    def test_undefined_name(self):
+        problems = advisories("def main():\n    print(helper(3))\nmain()\n")
+        assert problems == ["main.py:2: undefined name 'helper'"]
+
+    def test_each_name_reported_once(self):
+        assert len(advisories("print(foo)\nprint(foo)\n")) == 1
+
+    def test_names_bound_in_any_scope_count(self):
+        code = (
+            "class A:\n"
+            "    def m(self, n, *args, **kw):\n"
+            "        try:\n"
+            "            total = sum(i for i in range(n))\n"
+            "        except ValueError as err:\n"
+            "            print(err)\n"
+            "        with open(__file__) as fh:\n"
+            "            data = fh.read()\n"
+            "        if (k := len(data)) > 0:\n"
+            "            return lambda y: y + k + total\n"
+            "        return super().__init__ or __class__\n"
+        )
+        assert advisories(code) == []
+
+    def test_star_import_disables_advisories(self):
+        assert advisories("from os.path import *\nprint(join('a', 'b'))\n") == []
+
+
+class TestPreflightStdlibImports:
+    def test_missing_name_from_stdlib_module(self):
+        problems = advisories("from collections import Mapping\n")
+        assert problems == ["main.py:1: cannot import name 'Mapping' from 'collections'"]
+
+    def test_missing_stdlib_submodule(self):
+        assert advisories("import os.nonexistent\n") == ["main.py:1: no module named 'os.nonexistent'"]
+
+    def test_submodule_import_from_package(self):
+        assert advisories("from concurrent import futures\nprint(futures)\n") == []
+
+    def test_third_party_imports_are_not_checked(self):
+        assert advisories("from numpy import definitely_missing\nprint(definitely_missing)\n") == []
+
+    def test_unloaded_modules_are_not_imported(self):
+        if "mailbox" in sys.modules:
+            pytest.skip("mailbox already imported in this process")
+        assert advisories("from mailbox import definitely_missing\n") == []
+        assert "mailbox" not in sys.modules
+
+    def test_no_advisories_for_code_that_does_not_compile(self):
+        assert advisories("def f(:\n") == []
@@ -0,0 +1,130 @@
+"""Tests for src.infra.retrieval hybrid retrieval."""
+
+import threading
+import time
+
+from src.infra.retrieval import coverage, hybrid_retrieve, rrf_fuse
+
+
+def _hit(uri, task, code="print(1)"):
+    return {"uri": uri, "task": task, "code": code, "score": 1.0}
+
+
+class TestFusion:
+    def test_rrf_rewards_agreement(self):
+        fused = rrf_fuse(["a", "b", "c"], ["b", "d"])
+        assert fused[0] == "b"
+        assert set(fused) == {"a", "b", "c", "d"}
+
+    def test_rrf_single_ranking_keeps_order(self):
+        assert rrf_fuse(["x", "y", "z"]) == ["x", "y", "z"]
+
+    def test_coverage(self):
+        assert coverage("sort a list", "Sort a list of ints") == 1.0
+        assert coverage("sort a list", "parse json") == 0.0
+        assert coverage("", "anything") == 0.0
+
+
+class TestHybridRetrieve:
+    def test_strong_local_hit_skips_vector_search(self):
+        def vector(_query):
+            raise AssertionError("vector search should not run")
+
+        out = hybrid_retrieve("sort a list", [_hit("u1", "sort a list of numbers")], vector)
+        assert out["source"] == "local"
+        assert out["uri"] == "u1"
+        assert "print(1)" in out["reference"]
+
+    def test_fuses_local_and_vector(self):
+        local = [_hit("u1", "parse a csv file"), _hit("u2", "read csv rows")]
+        out = hybrid_retrieve(
+            "load csv into dicts", local, lambda q: (["u2", "u3"], {"u2": "overview of u2"}),
+        )
+        assert out == {"reference": "overview of u2", "source": "hybrid", "uri": "u2"}
+
+    def test_vector_only(self):
+        out = hybrid_retrieve("anything", [], lambda q: (["u9"], {"u9": "ov"}))
+        assert out["source"] == "vector"
+        assert out["reference"] == "ov"
+
+    def test_vector_failure_falls_back_to_local(self):
+        def vector(_query):
+            raise ConnectionError("embedding endpoint down")
+
+        out = hybrid_retrieve("load csv into dicts", [_hit("u1", "parse a csv file")], vector)
+        assert out["source"] == "local"
+        assert out["uri"] == "u1"
+
+    def test_vector_timeout_falls_back_to_local(self):
+        release = threading.Event()
+
+        def vector(_query):
+            release.wait(5)
+            return ["late"], {"late": "too late"}
+
+        try:
+            out = hybrid_retrieve(
+                "load csv into dicts", [_hit("u1", "parse a csv file")], vector,
+                vector_timeout_s=0.05,
+            )
+        finally:
+            release.set()
+        assert out["uri"] == "u1"
+
+    def test_nothing_found(self):
+        out = hybrid_retrieve("anything", [], lambda q: ([], {}))
+        assert out == {"reference": "", "source": "none", "uri": None}
+
+    def test_opening_the_store_is_not_timed(self):
+        closed = []
+
+        def _open():
+            time.sleep(0.2)
+            return lambda: closed.append(True)
+
+        out = hybrid_retrieve(
+            "anything", [], lambda q: (["u9"], {"u9": "ov"}),
+            vector_timeout_s=0.05, open_store=_open,
+        )
+        assert out["uri"] == "u9"
+        assert closed == [True]
+
+    def test_failed_open_falls_back_to_local(self):
+        def _open():
+            raise OSError("store locked")
+
+        def vector(_query):
+            raise AssertionError("vector search should not run")
+
+        out = hybrid_retrieve(
+            "load csv into dicts", [_hit("u1", "parse a csv file")], vector, open_store=_open,
+        )
+        assert out["uri"] == "u1"
+
+    def test_hung_searches_use_bounded_threads_and_still_close(self):
+        from src.infra import retrieval
+
+        release = threading.Event()
+        closed = []
+        names = set()
+
+        def vector(_query):
+            names.add(threading.current_thread().name)
+            release.wait(5)
+            return [], {}
+
+        try:
+            for _ in range(3 * retrieval._SEARCH_WORKERS):
+                hybrid_retrieve(
+                    "anything", [], vector, vector_timeout_s=0.01,
+                    open_store=lambda: (lambda: closed.append(True)),
+                )
+        finally:
+            release.set()
+        retrieval._search_pool.submit(lambda: None).result(timeout=5)
+        deadline = time.monotonic() + 5
+        while len(closed) < 3 * retrieval._SEARCH_WORKERS and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(names) <= retrieval._SEARCH_WORKERS
+        # Every opened store is closed, including searches abandoned in the queue
+        assert len(closed) == 3 * retrieval._SEARCH_WORKERS
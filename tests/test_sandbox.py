@@ -119,3 +119,331 @@ class TestSandboxExec:
         assert "stderr" in out
         assert "returncode" in out
         assert out["returncode"] == 0
+
+
+class TestSandboxTemplates:
+    def _template(self, tmp_path):
+        tpl = tmp_path / "templates" / "basic"
+        (tpl / "data").mkdir(parents=True)
+        (tpl / "README.md").write_text("scaffold\n")
+        (tpl / "data" / "input.txt").write_text("1 2 3\n")
+        return tpl
+
+    def test_materialize_copies_tree(self, tmp_path):
+        from src.infra.sandbox import _materialize_template
+
+        tpl = self._template(tmp_path)
+        dest = tmp_path / "proj"
+        count = _materialize_template(str(tpl), str(dest), "copy")
+
+        assert count == 2
+        assert (dest / "README.md").read_text() == "scaffold\n"
+        assert (dest / "data" / "input.txt").read_text() == "1 2 3\n"
+
+    def test_hardlink_mode_shares_inode(self, tmp_path):
+        from src.infra.sandbox import _materialize_template
+
+        tpl = self._template(tmp_path)
+        dest = tmp_path / "proj"
+        _materialize_template(str(tpl), str(dest), "hardlink")
+
+        assert (dest / "README.md").stat().st_ino == (tpl / "README.md").stat().st_ino
+        # Shared inode: made read-only so an in-place write cannot reach the template
+        assert not (dest / "README.md").stat().st_mode & 0o222
+
+    def test_auto_mode_clones_content(self, tmp_path):
+        from src.infra.sandbox import _materialize_template
+
+        tpl = self._template(tmp_path)
+        dest = tmp_path / "proj"
+        _materialize_template(str(tpl), str(dest), "auto")
+
+        assert (dest / "data" / "input.txt").read_text() == "1 2 3\n"
+
+    def test_auto_mode_in_place_write_leaves_template_unchanged(self, tmp_path):
+        from src.infra.sandbox import _materialize_template
+
+        tpl = self._template(tmp_path)
+        dest = tmp_path / "proj"
+        _materialize_template(str(tpl), str(dest), "auto")
+        with open(dest / "data" / "input.txt", "a") as f:
+            f.write("4 5 6\n")
+
+        assert (dest / "data" / "input.txt").read_text() == "1 2 3\n4 5 6\n"
+        assert (tpl / "data" / "input.txt").read_text() == "1 2 3\n"
+
+    def test_atomic_write_does_not_touch_template(self, tmp_path):
+        from src.infra.sandbox import _atomic_write, _materialize_template
+
+        tpl = self._template(tmp_path)
+        dest = tmp_path / "proj"
+        _materialize_template(str(tpl), str(dest), "hardlink")
+        _atomic_write(str(dest / "README.md"), "changed\n")
+
+        assert (dest / "README.md").read_text() == "changed\n"
+        assert (tpl / "README.md").read_text() == "scaffold\n"
+
+    def test_rematerialize_over_existing_project(self, tmp_path):
+        from src.infra.sandbox import _materialize_template
+
+        tpl = self._template(tmp_path)
+        dest = tmp_path / "proj"
+        _materialize_template(str(tpl), str(dest), "hardlink")
+        _materialize_template(str(tpl), str(dest), "copy")
+
+        assert (tpl / "README.md").read_text() == "scaffold\n"
+        assert (dest / "README.md").read_text() == "scaffold\n"
+
+    def test_template_name_rejects_traversal(self):
+        from restate import TerminalError
+
+        from src.infra.sandbox import _template_dir
+
+        for bad in ("../etc", "a/b", ".hidden", ""):
+            with pytest.raises(TerminalError):
+                _template_dir(bad)
+
+
+class TestSandboxReaper:
+    def _project(self, base, name, size=0, finished=False, age_s=0.0, now=1_000_000.0):
+        path = base / name
+        path.mkdir(parents=True)
+        if size:
+            (path / "blob.bin").write_bytes(b"x" * size)
+        if finished:
+            (path / ".lbg_finished").write_text("")
+        os.utime(path, (now - age_s, now - age_s))
+        return path
+
+    def test_project_usage_counts_files(self, tmp_path):
+        from src.infra.sandbox import _project_usage
+
+        path = self._project(tmp_path, "p1", size=8192)
+        usage = _project_usage(str(path))
+        assert usage["bytes"] >= 8192
+        assert usage["inodes"] == 1
+
+    def test_project_usage_apportions_hardlinks(self, tmp_path):
+        from src.infra.sandbox import _project_usage
+
+        shared = tmp_path / "shared.bin"
+        shared.write_bytes(b"x" * 8192)
+        proj = tmp_path / "proj"
+        proj.mkdir()
+        os.link(shared, proj / "shared.bin")
+
+        full = shared.stat().st_blocks * 512
+        assert _project_usage(str(proj))["bytes"] == full // 2
+
+    def test_reap_evicts_expired_finished(self, tmp_path):
+        from src.infra.sandbox import _reap
+
+        now = 1_000_000.0
+        self._project(tmp_path, "old_done", finished=True, age_s=7200, now=now)
+        self._project(tmp_path, "new_done", finished=True, age_s=60, now=now)
+        self._project(tmp_path, "old_active", age_s=7200, now=now)
+
+        report = _reap(str(tmp_path), ttl_s=3600, idle_ttl_s=86400, quota_bytes=0, now=now)
+
+        assert report["evicted"] == ["old_done"]
+        assert not (tmp_path / "old_done").exists()
+        assert (tmp_path / "new_done").exists()
+        assert (tmp_path / "old_active").exists()
+
+    def test_reap_evicts_abandoned_active(self, tmp_path):
+        from src.infra.sandbox import _reap
+
+        now = 1_000_000.0
+        self._project(tmp_path, "abandoned", age_s=100_000, now=now)
+
+        report = _reap(str(tmp_path), ttl_s=3600, idle_ttl_s=86400, quota_bytes=0, now=now)
+        assert report["evicted"] == ["abandoned"]
+
+    def test_reap_quota_evicts_lru_finished_only(self, tmp_path):
+        from src.infra.sandbox import _reap
+
+        now = 1_000_000.0
+        self._project(tmp_path, "lru", size=64 * 1024, finished=True, age_s=300, now=now)
+        self._project(tmp_path, "mru", size=64 * 1024, finished=True, age_s=10, now=now)
+        self._project(tmp_path, "active", size=64 * 1024, age_s=500, now=now)
+
+        report = _reap(
+            str(tmp_path), ttl_s=3600, idle_ttl_s=86400, quota_bytes=150 * 1024, now=now,
+        )
+
+        assert report["evicted"] == ["lru"]
+        assert (tmp_path / "mru").exists()
+        assert (tmp_path / "active").exists()
+
+    def test_reap_missing_base(self, tmp_path):
+        from src.infra.sandbox import _reap
+
+        report = _reap(str(tmp_path / "nope"), ttl_s=1, idle_ttl_s=1, quota_bytes=1)
+        assert report == {"evicted": [], "freed_bytes": 0, "total_bytes": 0}
+
+
+class TestSandboxStreamingExec:
+    def _run(self, tmp_path, code, timeout=10, abort_patterns=(), grace_s=0.2):
+        from src.infra.sandbox import _run_command
+
+        (tmp_path / "main.py").write_text(code)
+        log_path = str(tmp_path / ".lbg_exec" / "x.log")
+        result = _run_command(
+            "python main.py", str(tmp_path), None, timeout, list(abort_patterns), grace_s, log_path,
+        )
+        return result, log_path
+
+    def test_normal_exit(self, tmp_path):
+        code = "import sys\nprint('out')\nprint('err', file=sys.stderr)"
+        result, log_path = self._run(tmp_path, code)
+        assert result["stdout"] == "out\n"
+        assert result["stderr"] == "err\n"
+        assert result["returncode"] == 0
+        assert not result["aborted"] and not result["timed_out"]
+        with open(log_path) as f:
+            assert sorted(f.read().splitlines()) == ["stderr| err", "stdout| out"]
+        assert os.path.exists(log_path + ".done")
+
+    def test_abort_pattern_kills_hanging_program(self, tmp_path):
+        import time
+
+        code = (
+            "import threading, time\n"
+            "def boom():\n"
+            "    raise RuntimeError('worker died')\n"
+            "t = threading.Thread(target=boom); t.start(); t.join()\n"
+            "time.sleep(60)\n"
+        )
+        start = time.monotonic()
+        result, _ = self._run(tmp_path, code, abort_patterns=[r"^Traceback"])
+        assert time.monotonic() - start < 5
+        assert result["aborted"]
+        assert result["abort_match"].startswith("Traceback")
+        # The rest of the traceback arrived during the grace period
+        assert "RuntimeError: worker died" in result["stderr"]
+        assert result["returncode"] != 0
+
+    def test_timeout_returns_partial_output(self, tmp_path):
+        code = "import time\nprint('started', flush=True)\ntime.sleep(60)\n"
+        result, _ = self._run(tmp_path, code, timeout=0.5)
+        assert result["timed_out"]
+        assert result["stdout"] == "started\n"
+        assert "timeout" in result["stderr"]
+
+    def test_pattern_without_hang_is_not_an_abort(self, tmp_path):
+        code = "import sys\nprint('Traceback (most recent call last):', file=sys.stderr)\n"
+        result, _ = self._run(tmp_path, code, abort_patterns=[r"^Traceback"], grace_s=2)
+        assert not result["aborted"]
+        assert result["returncode"] == 0
+
+    def test_exec_log_path_requires_uuid(self):
+        import uuid
+
+        from restate import TerminalError
+
+        from src.infra.sandbox import _exec_log_path
+
+        exec_id = str(uuid.uuid4())
+        assert _exec_log_path("/tmp/lbg/p", exec_id).endswith(f"/{exec_id}.log")
+        for bad in ("../../etc/passwd", "x", exec_id.upper(), "", None):
+            with pytest.raises(TerminalError):
+                _exec_log_path("/tmp/lbg/p", bad)
+
+
+class _RunCtx:
+    """Runs ctx.run actions the way the SDK does: plain functions in a thread."""
+
+    async def time(self):
+        import time
+
+        return time.time()
+
+    async def run(self, name, fn):
+        import asyncio
+        import inspect
+
+        if inspect.iscoroutinefunction(fn):
+            return await fn()
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+
+
+def _slow(result):
+    def _fn(*args, **kwargs):
+        import time
+
+        time.sleep(0.5)
+        return result
+
+    return _fn
+
+
+def _ticks_during(call):
+    """Run *call()* (a coroutine) and count how often the loop ran another task."""
+    import asyncio
+
+    async def main():
+        ticks = 0
+
+        async def _tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(_tick())
+        result = await call()
+        ticker.cancel()
+        return result, ticks
+
+    return asyncio.run(main())
+
+
+class TestSandboxHandlersOffLoop:
+    def test_prepare_env_does_not_block_event_loop(self, monkeypatch):
+        from src.infra import deps
+        from src.infra.sandbox import prepare_env
+
+        monkeypatch.setattr(deps, "find_requirements", lambda base: ["requests"])
+        monkeypatch.setattr(deps, "ensure_env", _slow("e1"))
+
+        result, ticks = _ticks_during(lambda: prepare_env(_RunCtx(), {"project_id": "p"}))
+        assert result["env_id"] == "e1"
+        # The loop kept running other coroutines during the install
+        assert ticks >= 10
+
+    def test_usage_and_reap_do_not_block_event_loop(self, monkeypatch):
+        import importlib
+
+        # src.infra re-exports the Service under the module's name
+        sandbox = importlib.import_module("src.infra.sandbox")
+
+        monkeypatch.setattr(sandbox, "_scan_projects", _slow([]))
+        monkeypatch.setattr(
+            sandbox, "_reap", _slow({"evicted": [], "freed_bytes": 0, "total_bytes": 0}),
+        )
+        _, ticks = _ticks_during(lambda: sandbox.usage(_RunCtx()))
+        assert ticks >= 10
+        _, ticks = _ticks_during(lambda: sandbox.reap(_RunCtx()))
+        assert ticks >= 10
+
+    def test_create_and_delete_do_not_block_event_loop(self, tmp_path, monkeypatch):
+        import importlib
+
+        # src.infra re-exports the Service under the module's name
+        sandbox = importlib.import_module("src.infra.sandbox")
+
+        (tmp_path / "templates" / "basic").mkdir(parents=True)
+        monkeypatch.setattr(sandbox, "_BASE", str(tmp_path / "lbg"))
+        monkeypatch.setattr(
+            sandbox, "_template_dir", lambda name: str(tmp_path / "templates" / name),
+        )
+        monkeypatch.setattr(sandbox, "_materialize_template", _slow(0))
+        monkeypatch.setattr(sandbox, "_project_usage", _slow({"bytes": 0}))
+
+        req = {"project_id": "p", "template": "basic"}
+        result, ticks = _ticks_during(lambda: sandbox.create_project(_RunCtx(), req))
+        assert result["path"] == str(tmp_path / "lbg" / "p")
+        assert ticks >= 10
+        result, ticks = _ticks_during(lambda: sandbox.delete_project(_RunCtx(), "p"))
+        assert result["deleted"]
+        assert ticks >= 10
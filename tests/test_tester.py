@@ -65,3 +65,67 @@ class TestParseVerdict:
     def test_verdict_in_middle_of_text(self):
         response = "Analysis: code failed.\nVERDICT: FAIL\nEnd of report."
         assert _parse_verdict(response) is False
+
+
+class _FakeCtx:
+    """Just enough of a Restate context to drive run_test."""
+
+    def __init__(self, now: float, deadline: float) -> None:
+        self.now = now
+        self.deadline = deadline
+
+    async def service_call(self, fn, arg):
+        if fn.__name__ == "prepare_env":
+            return {"env_id": None, "requirements": [], "error": ""}
+        # The program hangs until the exec timeout, sized to end at the deadline
+        self.now = max(self.now, self.deadline)
+        return {"stdout": "", "stderr": "[sandbox] killed after 5s timeout", "returncode": -9}
+
+    def uuid(self):
+        import uuid
+
+        return uuid.UUID(int=1)
+
+    def object_send(self, *args, **kwargs):
+        pass
+
+    async def time(self):
+        return self.now
+
+    async def run(self, name, fn):
+        import inspect
+
+        # Like the SDK: async actions are awaited, plain functions run in a thread
+        if inspect.iscoroutinefunction(fn):
+            return await fn()
+        return fn()
+
+
+class TestRunTestDeadline:
+    def _run(self, ctx, deadline, monkeypatch):
+        import asyncio
+
+        from src.agents.tester import run_test
+
+        def _no_llm(phase):
+            raise AssertionError("no LLM call once the deadline has passed")
+
+        monkeypatch.setattr("src.infra.llm.LLMClient.for_phase", _no_llm)
+        req = {"project_id": "p", "filename": "main.py", "deadline": deadline}
+        return asyncio.run(run_test(ctx, req))
+
+    def test_exec_ending_at_deadline_gets_heuristic_verdict(self, monkeypatch):
+        result = self._run(_FakeCtx(now=100.0, deadline=160.0), 160.0, monkeypatch)
+        assert result["passed"] is False
+        assert result["deadline_exceeded"] is True
+        assert "killed after" in result["output"]
+
+    def test_llm_call_started_after_deadline_falls_back(self, monkeypatch):
+        import time
+
+        # The handler's journaled clock says there is time left, the wall clock does not
+        deadline = time.time() - 1
+        ctx = _FakeCtx(now=deadline - 100, deadline=deadline - 50)
+        result = self._run(ctx, deadline, monkeypatch)
+        assert result["passed"] is False
+        assert result["deadline_exceeded"] is True